@@ -0,0 +1,356 @@
+"""
+Pruebas de rendimiento del proceso de captura, análisis y guardado.
+
+Mide calculate_db con cada formato y tamaño de bloque, el guardado de tramos
+con save_recording en memoria (tmpfs) y en disco, y el bucle de grabación
+completo alimentado por un origen sintético a la máxima velocidad. No
+necesita micrófono: el audio lo genera audio_sources. Ejemplos:
+
+    python -m audio_benchmark
+    python -m audio_benchmark --quick --output benchmark.json
+
+Los resultados se escriben como JSON (en la salida estándar o en --output)
+para comparar versiones; el resumen legible va a la salida de error.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from audio_capture import SAMPLE_FORMATS
+from audio_sources import SyntheticSource, SyntheticStream
+from recorder_core import RecorderCore
+
+BENCHMARK_VERSION = 1
+SAMPLE_WIDTHS = (2, 3, 4)
+CHANNEL_COUNTS = (1, 2)
+CHUNK_SIZES = (256, 512, 1024, 2048, 4096, 8192)
+# Formatos del bucle completo: (frecuencia, ancho de muestra, canales)
+PIPELINE_FORMATS = ((44100, 2, 1), (48000, 3, 2), (96000, 4, 2), (48000, 3, 8))
+
+
+class BenchmarkRecorder(RecorderCore):
+    """Grabador sin salida: los avisos se cuentan en lugar de mostrarse"""
+
+    def __init__(self, config_file):
+        self.notifications = []
+        super().__init__(config_file)
+
+    def notify(self, title, message, message_type="info"):
+        self.notifications.append((message_type, title))
+
+
+class CountingSyntheticSource(SyntheticSource):
+    """Origen sintético que cuenta los frames entregados y el tiempo que tarda en generarlos.
+
+    El tiempo de generación se descuenta al calcular lo que sostiene el
+    grabador: con un micrófono las muestras llegan ya hechas.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.streams = []
+        self.generate_seconds = 0.0
+
+    def open(self, *args, **kwargs):
+        stream = super().open(*args, **kwargs)
+        generate = stream.generate
+
+        def timed_generate(num_frames):
+            start = time.perf_counter()
+            try:
+                return generate(num_frames)
+            finally:
+                self.generate_seconds += time.perf_counter() - start
+
+        stream.generate = timed_generate
+        self.streams.append(stream)
+        return stream
+
+    @property
+    def frames_delivered(self):
+        return sum(stream.frames_delivered for stream in self.streams)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Descarta los mensajes del grabador para no medir la escritura en la consola"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def make_recorder(work_dir):
+    """Grabador con la configuración por defecto y los archivos dentro de work_dir"""
+    with quiet():
+        recorder = BenchmarkRecorder(os.path.join(work_dir, 'config.ini'))
+    recorder.output_dir = os.path.join(work_dir, 'grabaciones')
+    os.makedirs(recorder.output_dir, exist_ok=True)
+    return recorder
+
+
+def synthetic_block(sample_width, channels, frames, rate=48000):
+    """Bloque PCM de ráfagas sintéticas con el formato indicado"""
+    stream = SyntheticStream(sample_width, channels, rate, realtime=False, signal='bursts',
+                             burst_seconds=0.5, burst_interval=1.0)
+    return stream.generate(frames)
+
+
+def time_repeated(function, min_seconds):
+    """Ejecuta function hasta sumar min_seconds y devuelve (repeticiones, segundos)"""
+    repeats = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        function()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+    return repeats, elapsed
+
+
+def bench_calculate_db(recorder, min_seconds):
+    """calculate_db con cada ancho de muestra, número de canales y tamaño de bloque"""
+    results = []
+    for sample_width in SAMPLE_WIDTHS:
+        for channels in CHANNEL_COUNTS:
+            for chunk in CHUNK_SIZES:
+                recorder.FORMAT = SAMPLE_FORMATS[sample_width]
+                recorder.CHANNELS = channels
+                recorder.CHUNK = chunk
+                recorder.level_meter = None
+                data = synthetic_block(sample_width, channels, chunk)
+                recorder.calculate_db(data)  # Crear el medidor fuera de la medida
+                repeats, elapsed = time_repeated(lambda: recorder.calculate_db(data), min_seconds)
+                samples_per_second = repeats * chunk * channels / elapsed
+                results.append({
+                    'bits': sample_width * 8,
+                    'channels': channels,
+                    'chunk': chunk,
+                    'microseconds_per_chunk': round(elapsed / repeats * 1e6, 3),
+                    'samples_per_second': round(samples_per_second),
+                    # Veces más rápido que el tiempo real a 48 kHz con esos canales
+                    'realtime_factor_48k': round(samples_per_second / (48000 * channels), 1),
+                })
+    return results
+
+
+def bench_save_recording(recorder, targets, segment_seconds, min_seconds):
+    """save_recording de tramos de segment_seconds en cada directorio de destino"""
+    results = []
+    formats = ((44100, 2, 1), (48000, 3, 2), (96000, 4, 2))
+    for target_name, target_dir in targets:
+        for rate, sample_width, channels in formats:
+            out_dir = tempfile.mkdtemp(prefix='audio_benchmark_', dir=target_dir)
+            recorder.output_dir = out_dir
+            # El tramo se entrega en bloques, como las vistas del buffer circular
+            block = synthetic_block(sample_width, channels, rate, rate)
+            frames = [memoryview(block)] * max(1, int(segment_seconds))
+            segment_bytes = len(block) * len(frames)
+            base_time = datetime(2000, 1, 1)
+            saved = 0
+
+            def save():
+                nonlocal saved
+                # Un nombre distinto por tramo, como en una grabación real
+                recorder.save_recording(frames, base_time + timedelta(seconds=saved), sample_width, channels, rate)
+                saved += 1
+
+            try:
+                with quiet():
+                    repeats, elapsed = time_repeated(save, min_seconds)
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+            results.append({
+                'target': target_name,
+                'directory': target_dir,
+                'rate': rate,
+                'bits': sample_width * 8,
+                'channels': channels,
+                'segment_seconds': len(frames),
+                'segments': repeats,
+                'milliseconds_per_segment': round(elapsed / repeats * 1000, 3),
+                'megabytes_per_second': round(segment_bytes * repeats / elapsed / 1e6, 1),
+                'realtime_factor': round(len(frames) * repeats / elapsed, 1),
+            })
+    return results
+
+
+def bench_pipeline(recorder, work_dir, run_seconds, segment_seconds):
+    """Bucle de grabación completo con un origen sintético sin esperar al tiempo real.
+
+    El bucle de captura y análisis corre en un solo hilo, así que las muestras
+    procesadas por segundo de CPU dan el máximo de frecuencia × canales que un
+    núcleo sostiene antes de que los bloques se retrasen respecto al tiempo real.
+    """
+    results = []
+    for rate, sample_width, channels in PIPELINE_FORMATS:
+        source = CountingSyntheticSource(realtime=False, signal='bursts', level_db=-20.0,
+                                         burst_seconds=segment_seconds / 2, burst_interval=segment_seconds * 2)
+        recorder.audio_source = source
+        recorder.RATE = rate
+        recorder.FORMAT = SAMPLE_FORMATS[sample_width]
+        recorder.CHANNELS = channels
+        recorder.CHUNK = 1024
+        recorder.record_duration = segment_seconds
+        recorder.threshold_db = -40.0
+        recorder.sample_ring = None
+        recorder.level_meter = None
+        recorder.recordings_saved_count = 0
+        recorder.recordings_deleted_count = 0
+        recorder.output_dir = tempfile.mkdtemp(prefix='pipeline_', dir=work_dir)
+
+        try:
+            with quiet():
+                cpu_start = time.process_time()
+                wall_start = time.perf_counter()
+                recorder.start_recording()
+                time.sleep(run_seconds)
+                recorder.stop_recording()
+                wall_seconds = time.perf_counter() - wall_start
+                cpu_seconds = time.process_time() - cpu_start
+        finally:
+            shutil.rmtree(recorder.output_dir, ignore_errors=True)
+
+        samples = source.frames_delivered * channels
+        # CPU del grabador sin la generación de la señal de prueba
+        recorder_cpu_seconds = max(cpu_seconds - source.generate_seconds, 1e-9)
+        samples_per_cpu_second = samples / recorder_cpu_seconds
+        results.append({
+            'rate': rate,
+            'bits': sample_width * 8,
+            'channels': channels,
+            'audio_seconds': round(source.frames_delivered / rate, 1),
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'source_seconds': round(source.generate_seconds, 3),
+            'segments_saved': recorder.recordings_saved_count,
+            'segments_deleted': recorder.recordings_deleted_count,
+            'samples_per_second': round(samples / wall_seconds),
+            'samples_per_cpu_second': round(samples_per_cpu_second),
+            'realtime_factor': round(source.frames_delivered / rate / wall_seconds, 1),
+            # Máximo de frecuencia × canales que sostiene un núcleo en tiempo real
+            'max_rate_x_channels_per_core': round(samples_per_cpu_second),
+        })
+    return results
+
+
+def default_targets(disk_dir):
+    """Directorios para el guardado: tmpfs (si existe) y disco"""
+    targets = []
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        targets.append(('tmpfs', '/dev/shm'))
+    targets.append(('disk', disk_dir))
+    return targets
+
+
+def run_benchmarks(args):
+    work_dir = tempfile.mkdtemp(prefix='audio_benchmark_', dir=args.disk_dir)
+    try:
+        recorder = make_recorder(work_dir)
+        results = {}
+        if 'calculate_db' in args.only:
+            print("Midiendo calculate_db...", file=sys.stderr)
+            results['calculate_db'] = bench_calculate_db(recorder, args.min_seconds)
+        if 'save' in args.only:
+            print("Midiendo save_recording...", file=sys.stderr)
+            targets = default_targets(args.disk_dir)
+            if args.tmpfs_dir:
+                targets = [('tmpfs', args.tmpfs_dir), ('disk', args.disk_dir)]
+            results['save_recording'] = bench_save_recording(recorder, targets, args.segment_seconds,
+                                                             args.min_seconds * 2)
+        if 'pipeline' in args.only:
+            print("Midiendo el bucle de grabación completo...", file=sys.stderr)
+            results['pipeline'] = bench_pipeline(recorder, work_dir, args.pipeline_seconds, args.segment_seconds)
+        with quiet():
+            recorder.shutdown()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = {}
+    if results.get('pipeline'):
+        summary['max_rate_x_channels_per_core'] = min(r['max_rate_x_channels_per_core'] for r in results['pipeline'])
+        summary['max_48k_channels_per_core'] = summary['max_rate_x_channels_per_core'] // 48000
+    return {
+        'version': BENCHMARK_VERSION,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {
+            'min_seconds': args.min_seconds,
+            'segment_seconds': args.segment_seconds,
+            'pipeline_seconds': args.pipeline_seconds,
+        },
+        'results': results,
+        'summary': summary,
+    }
+
+
+def print_summary(report, stream):
+    results = report['results']
+    for row in results.get('calculate_db', []):
+        if row['chunk'] in (256, 1024, 8192):
+            print(f"calculate_db {row['bits']}bit {row['channels']}ch bloque {row['chunk']}: "
+                  f"{row['microseconds_per_chunk']} µs, x{row['realtime_factor_48k']} tiempo real", file=stream)
+    for row in results.get('save_recording', []):
+        print(f"save_recording {row['target']} {row['rate']}Hz {row['bits']}bit {row['channels']}ch: "
+              f"{row['megabytes_per_second']} MB/s, x{row['realtime_factor']} tiempo real", file=stream)
+    for row in results.get('pipeline', []):
+        print(f"bucle completo {row['rate']}Hz {row['bits']}bit {row['channels']}ch: "
+              f"x{row['realtime_factor']} tiempo real, {row['samples_per_cpu_second']} muestras por segundo de CPU",
+              file=stream)
+    summary = report['summary']
+    if summary:
+        print(f"Máximo sostenible por núcleo: {summary['max_rate_x_channels_per_core']} muestras/s "
+              f"(≈ {summary['max_48k_channels_per_core']} canales a 48 kHz)", file=stream)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m audio_benchmark',
+                                     description="Pruebas de rendimiento de la captura, el análisis y el guardado")
+    parser.add_argument('--output', help="archivo JSON de resultados (por defecto la salida estándar)")
+    parser.add_argument('--only', default='calculate_db,save,pipeline',
+                        help="pruebas a ejecutar, separadas por comas: calculate_db, save, pipeline")
+    parser.add_argument('--quick', action='store_true', help="mediciones más cortas y menos precisas")
+    parser.add_argument('--min-seconds', type=float, default=0.5,
+                        help="tiempo mínimo de cada medición de calculate_db (el guardado usa el doble)")
+    parser.add_argument('--segment-seconds', type=float, default=10.0, help="duración de los tramos guardados")
+    parser.add_argument('--pipeline-seconds', type=float, default=3.0,
+                        help="tiempo de ejecución del bucle completo por formato")
+    parser.add_argument('--disk-dir', default=tempfile.gettempdir(), help="directorio en disco para el guardado")
+    parser.add_argument('--tmpfs-dir', help="directorio en memoria para el guardado (por defecto /dev/shm)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.only = {name.strip() for name in args.only.split(',') if name.strip()}
+    if args.quick:
+        args.min_seconds = min(args.min_seconds, 0.05)
+        args.segment_seconds = min(args.segment_seconds, 2.0)
+        args.pipeline_seconds = min(args.pipeline_seconds, 0.5)
+
+    report = run_benchmarks(args)
+    print_summary(report, sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,850 @@
+"""
+Motores de captura de audio del grabador.
+
+Este módulo no depende de Kivy: contiene solo la parte de adquisición de
+muestras, de modo que pueda reutilizarse fuera de la interfaz gráfica y
+cargarse en el proceso de captura dedicado.
+"""
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pyaudio
+
+from audio_sources import AudioSource
+from audio_spawn import main_module_hidden
+
+# Formato PyAudio de cada ancho de muestra en bytes
+SAMPLE_FORMATS = {2: pyaudio.paInt16, 3: pyaudio.paInt24, 4: pyaudio.paInt32}
+
+# Cabecera del buffer compartido: enteros de 64 bits en estas posiciones, seguidos
+# de una tabla circular de huecos (posición, bytes perdidos justo antes de ella)
+_GAP_SLOTS = 64
+_HEADER_BYTES = 64 + _GAP_SLOTS * 16
+_WRITE_POS, _READ_POS, _RESERVE, _DROPPED, _OVERFLOWS, _STATE, _GAP_COUNT = range(7)
+_GAP_TABLE = 8
+
+# Estados del proceso de captura publicados en la cabecera
+CAPTURE_STARTING, CAPTURE_RUNNING, CAPTURE_STOPPED, CAPTURE_FAILED = range(4)
+
+
+class AudioBackend:
+    """Instancia de PyAudio que se mantiene inicializada durante toda la aplicación.
+    
+    Inicializar PortAudio es caro (enumera todos los dispositivos), así que se
+    hace una vez y se reutiliza en cada grabación. Además recuerda, para cada
+    dispositivo y configuración pedida, qué alternativa abrió el stream la
+    última vez, de modo que las siguientes aperturas empiezan por ella en lugar
+    de volver a fallar en las anteriores.
+    """
+    
+    def __init__(self):
+        self._audio = None
+        self._lock = threading.Lock()
+        self.remembered = {}  # clave de dispositivo y configuración -> nombre de la alternativa
+        self.stream_opens = 0
+        self.failed_opens = 0
+    
+    @property
+    def audio(self):
+        """Instancia de PyAudio, creada en el primer uso"""
+        with self._lock:
+            if self._audio is None:
+                self._audio = pyaudio.PyAudio()
+            return self._audio
+    
+    def reinitialize(self):
+        """Reinicia PortAudio para que aparezcan los dispositivos conectados después"""
+        self.terminate()
+        self.remembered.clear()
+        return self.audio
+    
+    def open_input(self, key, candidates, open_stream):
+        """Abre el stream con la primera alternativa que funcione.
+        
+        candidates es una lista de (nombre, argumentos de open_stream) en orden
+        de preferencia; si para esta clave ya funcionó una, se prueba primero.
+        Devuelve (stream, nombre, argumentos).
+        """
+        remembered = self.remembered.get(key)
+        ordered = sorted(candidates, key=lambda candidate: candidate[0] != remembered)
+        last_error = None
+        for name, params in ordered:
+            try:
+                stream = open_stream(**params)
+            except Exception as e:
+                self.failed_opens += 1
+                last_error = e
+                print(f"Error abriendo stream ({name}): {e}")
+                continue
+            self.stream_opens += 1
+            self.remembered[key] = name
+            return stream, name, params
+        raise Exception(f"No se pudo abrir ningún stream de audio: {last_error}")
+    
+    def terminate(self):
+        with self._lock:
+            if self._audio is not None:
+                self._audio.terminate()
+                self._audio = None
+
+
+class BlockingCaptureStream:
+    """Stream de lectura bloqueante de PyAudio con detección de audio perdido.
+
+    Con exception_on_overflow=False PyAudio no avisa de los desbordamientos, y
+    con True el bloque leído se pierde junto con la excepción. En su lugar se
+    compara el audio entregado más el pendiente de leer con el tiempo que ha
+    avanzado el reloj del stream. La deriva lenta entre el reloj del stream y
+    el de muestreo se absorbe sin contarse como pérdida.
+
+    Algunas APIs de host informan del audio pendiente por periodos mayores que
+    un bloque, y una lectura tardía también descuadra la cuenta un momento. Por
+    eso la tolerancia es el mayor entre un bloque y la latencia de entrada del
+    stream, más TIMING_JITTER_SECONDS, y un exceso solo se cuenta como audio
+    perdido si se mantiene durante CONFIRM_READS lecturas seguidas: el audio
+    que PortAudio descarta no vuelve, mientras que un desfase de la medida se
+    corrige en la lectura siguiente. La pérdida se anota en la lectura que la
+    confirma, como mucho CONFIRM_READS - 1 bloques después del hueco real.
+    """
+
+    # Margen por la imprecisión de las marcas de tiempo del stream
+    TIMING_JITTER_SECONDS = 0.005
+    # Lecturas seguidas con exceso necesarias para dar por perdido el audio
+    CONFIRM_READS = 3
+
+    def __init__(self, audio, format, channels, rate, frames_per_buffer, input_device_index=None):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.input_overflows = 0
+        self.dropped_frames = 0
+        self._frames_read = 0
+        self._start_time = None
+        self._baseline = 0.0  # Diferencia entre reloj y audio ya explicada (deriva y pérdidas)
+        self._excess = []  # Excesos sobre la tolerancia de las últimas lecturas seguidas
+        self._stream = audio.open(format=format,
+                                  channels=channels,
+                                  rate=rate,
+                                  input=True,
+                                  input_device_index=input_device_index,
+                                  frames_per_buffer=frames_per_buffer)
+        try:
+            latency = self._stream.get_input_latency()
+        except Exception:
+            latency = 0.0
+        self.tolerance_frames = (max(frames_per_buffer, int(rate * latency))
+                                 + int(rate * self.TIMING_JITTER_SECONDS))
+        # No todas las APIs de host informan del tiempo del stream
+        self._timed = hasattr(self._stream, 'get_time') and hasattr(self._stream, 'get_read_available')
+
+    @property
+    def backlog_frames(self):
+        """Frames capturados que el bucle de grabación aún no ha leído"""
+        if not self._timed:
+            return None
+        try:
+            return self._stream.get_read_available()
+        except Exception:
+            return None
+
+    def read(self, num_frames, exception_on_overflow=False):
+        data = self._stream.read(num_frames, exception_on_overflow=False)
+        self._frames_read += num_frames
+        if self._timed:
+            self._check_timing()
+        return data
+
+    def _check_timing(self):
+        try:
+            now = self._stream.get_time()
+            captured = self._frames_read + self._stream.get_read_available()
+        except Exception:
+            self._timed = False
+            return
+        if now <= 0:
+            # El host no mantiene el reloj del stream
+            self._timed = False
+            return
+        if self._start_time is None:
+            self._start_time = now - captured / self.rate
+            return
+        missing = (now - self._start_time) * self.rate - captured
+        excess = missing - self._baseline
+        if excess <= self.tolerance_frames:
+            # Dentro de la tolerancia: deriva o un desfase ya corregido
+            self._excess = []
+            self._baseline = missing
+            return
+        self._excess.append(excess)
+        if len(self._excess) >= self.CONFIRM_READS:
+            # Solo cuenta la parte del exceso que se ha mantenido en todas las lecturas
+            self.input_overflows += 1
+            self.dropped_frames += int(min(self._excess))
+            self._excess = []
+            self._baseline = missing
+
+    def stop_stream(self):
+        self._stream.stop_stream()
+
+    def close(self):
+        self._stream.close()
+
+
+class CallbackCaptureStream:
+    """Stream de entrada en modo callback (no bloqueante) con cola acotada.
+
+    El callback de PortAudio solo copia cada bloque recibido a una cola de
+    tamaño fijo y nunca espera: el análisis, la interfaz y el guardado se hacen
+    aguas abajo, en el hilo que llama a read(). Si la cola se llena, el bloque
+    se descarta y se contabiliza en dropped_blocks en lugar de bloquear la captura.
+    Los frames descartados se anotan en el siguiente bloque encolado, de modo
+    que dropped_frames aumenta justo al leer el audio que sigue al hueco.
+
+    Expone la misma interfaz que un stream de PyAudio (read, stop_stream, close)
+    para poder sustituirlo sin cambios en el bucle de grabación.
+    """
+
+    def __init__(self, audio, format, channels, rate, frames_per_buffer,
+                 input_device_index=None, queue_seconds=10.0, read_timeout=2.0):
+        self.channels = channels
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.frame_bytes = audio.get_sample_size(format) * channels
+        self.read_timeout = read_timeout
+
+        # Cola acotada: capacidad expresada en segundos de audio
+        max_blocks = max(1, int(queue_seconds * rate / frames_per_buffer))
+        self._queue = queue.Queue(maxsize=max_blocks)
+        # Resto del último bloque cuando read() pide menos muestras que un bloque
+        self._pending = b''
+
+        # Contadores de integridad de la captura
+        self.blocks_captured = 0
+        self.dropped_blocks = 0
+        self.dropped_frames = 0  # Frames descartados antes de los ya leídos
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self._reported_drops = 0
+        self._gap_frames = 0  # Descartados que aún no se han anotado en un bloque
+
+        self._stream = audio.open(format=format,
+                                  channels=channels,
+                                  rate=rate,
+                                  input=True,
+                                  input_device_index=input_device_index,
+                                  frames_per_buffer=frames_per_buffer,
+                                  stream_callback=self._callback)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """Callback de PortAudio: solo encola el bloque, sin cálculo ni E/S"""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        if status & pyaudio.paInputUnderflow:
+            self.input_underflows += 1
+        try:
+            self._queue.put_nowait((self._gap_frames, in_data))
+            self.blocks_captured += 1
+            self._gap_frames = 0
+        except queue.Full:
+            self.dropped_blocks += 1
+            self._gap_frames += frame_count
+        return (None, pyaudio.paContinue)
+
+    @property
+    def queue_depth(self):
+        """Número de bloques pendientes de consumir"""
+        return self._queue.qsize()
+
+    @property
+    def backlog_frames(self):
+        """Frames capturados que el bucle de grabación aún no ha leído"""
+        return self._queue.qsize() * self.frames_per_buffer + len(self._pending) // self.frame_bytes
+
+    def read(self, num_frames, exception_on_overflow=False):
+        """Devuelve exactamente num_frames muestras, esperando a que lleguen si hace falta.
+
+        exception_on_overflow se acepta por compatibilidad con PyAudio; los
+        descartes se registran en los contadores en lugar de lanzar excepción.
+        """
+        needed = num_frames * self.frame_bytes
+        parts = []
+        have = 0
+
+        if self._pending:
+            take = self._pending[:needed]
+            self._pending = self._pending[needed:]
+            parts.append(take)
+            have = len(take)
+
+        while have < needed:
+            try:
+                gap_frames, block = self._queue.get(timeout=self.read_timeout)
+            except queue.Empty:
+                raise IOError("Tiempo de espera agotado esperando audio del dispositivo")
+            self.dropped_frames += gap_frames
+            missing = needed - have
+            if len(block) > missing:
+                self._pending = block[missing:]
+                block = block[:missing]
+            parts.append(block)
+            have += len(block)
+
+        if self.dropped_blocks != self._reported_drops:
+            print(f"Aviso: cola de captura llena, {self.dropped_blocks - self._reported_drops} bloques descartados")
+            self._reported_drops = self.dropped_blocks
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def stop_stream(self):
+        self._stream.stop_stream()
+
+    def close(self):
+        self._stream.close()
+        self._pending = b''
+
+
+class SampleRing:
+    """Buffer circular de muestras PCM preasignado.
+
+    Todo el audio capturado se copia en un único bytearray de tamaño fijo, de
+    modo que la memoria en régimen estable es constante y no se crea un objeto
+    por cada bloque. Las posiciones son absolutas (bytes escritos desde el
+    inicio) y los tramos se exponen como memoryview sobre el buffer, sin copias.
+    """
+
+    def __init__(self, capacity_bytes, frame_bytes, segment_bytes=None):
+        # La capacidad se redondea a un número entero de frames
+        self.frame_bytes = frame_bytes
+        self.capacity = max(frame_bytes, capacity_bytes - capacity_bytes % frame_bytes)
+        # Tramo más largo que se puede entregar: el buffer se dimensiona para que
+        # quepan varios de este tamaño sin que se sobrescriban los pendientes
+        self.segment_bytes = segment_bytes or self.capacity
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        self.write_pos = 0
+
+    @classmethod
+    def for_segment(cls, rate, channels, sample_width, seconds, segments=1, extra_frames=0):
+        """Crea un buffer con capacidad para `segments` tramos de `seconds` segundos (más extra_frames)"""
+        frame_bytes = channels * sample_width
+        segment_bytes = (int(rate * seconds) + extra_frames) * frame_bytes
+        return cls(segment_bytes * segments, frame_bytes, segment_bytes)
+
+    def write(self, data):
+        """Copia un bloque en el buffer, dando la vuelta al llegar al final"""
+        data = memoryview(data).cast('B')
+        size = len(data)
+        if size > self.capacity:
+            # Solo cabe la parte final del bloque
+            self.write_pos += size - self.capacity
+            data = data[size - self.capacity:]
+            size = self.capacity
+
+        offset = self.write_pos % self.capacity
+        first = min(size, self.capacity - offset)
+        self._view[offset:offset + first] = data[:first]
+        if first < size:
+            self._view[0:size - first] = data[first:]
+        self.write_pos += size
+
+    @property
+    def oldest_pos(self):
+        """Posición absoluta del byte más antiguo que sigue disponible"""
+        return max(0, self.write_pos - self.capacity)
+
+    def views(self, start, end=None):
+        """Devuelve el rango absoluto [start, end) como una lista de 1 o 2 memoryview"""
+        if end is None:
+            end = self.write_pos
+        if start < self.oldest_pos or end > self.write_pos or start > end:
+            raise ValueError("El rango solicitado ya no está en el buffer circular")
+        if end - start > self.segment_bytes:
+            # Las vistas de un tramo mayor que el previsto podrían quedar sobrescritas
+            # mientras el hilo escritor aún las guarda
+            raise ValueError("El tramo supera el tamaño previsto al dimensionar el buffer circular")
+        if start == end:
+            return []
+
+        offset = start % self.capacity
+        size = end - start
+        first = min(size, self.capacity - offset)
+        views = [self._view[offset:offset + first]]
+        if first < size:
+            views.append(self._view[0:size - first])
+        return views
+
+
+def insert_silence(views, gaps):
+    """Intercala bloques de ceros en un tramo expresado como lista de vistas.
+
+    gaps es una lista ordenada de (offset, nbytes): nbytes de silencio que se
+    insertan en la posición offset del tramo original, medida en bytes desde
+    su inicio. Las vistas se parten sin copiar las muestras.
+    """
+    result = []
+    position = 0
+    pending = list(gaps)
+    for view in views:
+        cut = 0
+        end = position + len(view)
+        while pending and pending[0][0] < end:
+            offset, nbytes = pending.pop(0)
+            local = max(0, offset - position)
+            if local > cut:
+                result.append(view[cut:local])
+                cut = local
+            result.append(bytes(nbytes))
+        if cut < len(view):
+            result.append(view[cut:])
+        position = end
+    # Huecos al final del tramo
+    result.extend(bytes(nbytes) for offset, nbytes in pending)
+    return result
+
+
+class TriggerSegmenter:
+    """Segmentación por umbral (activación por voz) sobre posiciones del buffer circular.
+
+    Un tramo se abre cuando un bloque supera el umbral e incluye hasta
+    pre_roll_seconds de audio anterior; se cierra tras hangover_seconds por
+    debajo del umbral o al alcanzar max_seconds. Trabaja con posiciones
+    absolutas en bytes, de modo que el audio del tramo se recupera después con
+    SampleRing.views(start, end) sin copias.
+    """
+
+    def __init__(self, frame_bytes, rate, pre_roll_seconds, hangover_seconds, max_seconds):
+        self.frame_bytes = frame_bytes
+        self.rate = rate
+        self.pre_roll_bytes = int(rate * pre_roll_seconds) * frame_bytes
+        self.hangover_bytes = int(rate * hangover_seconds) * frame_bytes
+        self.max_bytes = max(frame_bytes, int(rate * max_seconds) * frame_bytes)
+
+        self.start = None  # Inicio del tramo abierto (None si no hay evento)
+        self.last_active_end = 0  # Fin del último bloque por encima del umbral
+        self.last_end = 0  # Fin del último tramo cerrado, para no solapar el pre-roll
+        self.max_db = -60.0
+
+    @property
+    def is_open(self):
+        return self.start is not None
+
+    def seconds(self, nbytes):
+        """Convierte una longitud en bytes a segundos"""
+        return nbytes / (self.frame_bytes * self.rate)
+
+    def process(self, chunk_start, chunk_end, level_db, active, oldest_pos=0):
+        """Procesa un bloque; devuelve (inicio, fin) cuando se cierra un tramo"""
+        if self.start is None:
+            if not active:
+                return None
+            self.start = max(chunk_start - self.pre_roll_bytes, oldest_pos, self.last_end)
+            self.last_active_end = chunk_end
+            self.max_db = level_db
+        else:
+            self.max_db = max(self.max_db, level_db)
+            if active:
+                self.last_active_end = chunk_end
+
+        if (chunk_end - self.last_active_end >= self.hangover_bytes
+                or chunk_end - self.start >= self.max_bytes):
+            return self.close(chunk_end)
+        return None
+
+    def close(self, end):
+        """Cierra el tramo abierto en la posición indicada"""
+        segment = (self.start, end)
+        self.last_end = end
+        self.start = None
+        return segment
+
+
+class SharedSampleRing:
+    """Buffer circular en memoria compartida entre el proceso de captura y el principal.
+    
+    El proceso de captura es el único que escribe muestras y avanza write_pos;
+    el proceso principal consume desde read_pos y publica hasta dónde ha leído.
+    La captura nunca sobrescribe audio sin leer ni los reserve_bytes anteriores
+    a read_pos (tramos aún pendientes de guardar): si no hay hueco descarta el
+    bloque y lo suma a dropped_bytes, igual que la cola del modo callback. Al
+    volver a escribir anota en la tabla de huecos la posición y los bytes
+    perdidos, para que el lector sepa exactamente dónde falta audio.
+    """
+    
+    def __init__(self, capacity_bytes, frame_bytes, reserve_bytes=0, name=None):
+        self.frame_bytes = frame_bytes
+        self.capacity = max(frame_bytes, capacity_bytes - capacity_bytes % frame_bytes)
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + self.capacity)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._header = self._shm.buf[:_HEADER_BYTES].cast('q')
+        self._view = self._shm.buf[_HEADER_BYTES:_HEADER_BYTES + self.capacity]
+        self._pending_gap = 0  # Bytes descartados aún sin anotar (solo en el proceso de captura)
+        if self._owner:
+            for i in range(len(self._header)):
+                self._header[i] = 0
+            self._header[_RESERVE] = reserve_bytes
+    
+    @property
+    def write_pos(self):
+        return self._header[_WRITE_POS]
+    
+    @property
+    def read_pos(self):
+        return self._header[_READ_POS]
+    
+    @read_pos.setter
+    def read_pos(self, value):
+        self._header[_READ_POS] = value
+    
+    @property
+    def oldest_pos(self):
+        return max(0, self.write_pos - self.capacity)
+    
+    @property
+    def reserve_bytes(self):
+        return self._header[_RESERVE]
+    
+    @property
+    def dropped_bytes(self):
+        return self._header[_DROPPED]
+    
+    @property
+    def input_overflows(self):
+        return self._header[_OVERFLOWS]
+    
+    def count_overflow(self):
+        self._header[_OVERFLOWS] += 1
+    
+    @property
+    def gap_count(self):
+        return self._header[_GAP_COUNT]
+    
+    def gaps(self, first, last):
+        """Huecos anotados con índice en [first, last) como (posición, bytes); los sobrescritos se omiten"""
+        first = max(first, last - _GAP_SLOTS)
+        result = []
+        for index in range(first, last):
+            slot = _GAP_TABLE + 2 * (index % _GAP_SLOTS)
+            result.append((self._header[slot], self._header[slot + 1]))
+        return result
+    
+    @property
+    def state(self):
+        return self._header[_STATE]
+    
+    @state.setter
+    def state(self, value):
+        self._header[_STATE] = value
+    
+    def write(self, data):
+        """Copia un bloque (solo desde el proceso de captura); False si no cabe y se descarta"""
+        data = memoryview(data).cast('B')
+        size = len(data)
+        write_pos = self._header[_WRITE_POS]
+        limit = self._header[_READ_POS] - self._header[_RESERVE]
+        if write_pos + size - self.capacity > limit:
+            self._header[_DROPPED] += size
+            self._pending_gap += size
+            return False
+        if self._pending_gap:
+            # El hueco se anota antes de publicar las muestras que lo siguen
+            count = self._header[_GAP_COUNT]
+            slot = _GAP_TABLE + 2 * (count % _GAP_SLOTS)
+            self._header[slot] = write_pos
+            self._header[slot + 1] = self._pending_gap
+            self._header[_GAP_COUNT] = count + 1
+            self._pending_gap = 0
+        
+        offset = write_pos % self.capacity
+        first = min(size, self.capacity - offset)
+        self._view[offset:offset + first] = data[:first]
+        if first < size:
+            self._view[0:size - first] = data[first:]
+        # La posición se publica después de copiar las muestras
+        self._header[_WRITE_POS] = write_pos + size
+        return True
+    
+    def views(self, start, end):
+        """Devuelve el rango absoluto [start, end) como una lista de 1 o 2 memoryview"""
+        if start < self.oldest_pos or end > self.write_pos or start > end:
+            raise ValueError("El rango solicitado ya no está en el buffer compartido")
+        if start == end:
+            return []
+        
+        offset = start % self.capacity
+        size = end - start
+        first = min(size, self.capacity - offset)
+        views = [self._view[offset:offset + first]]
+        if first < size:
+            views.append(self._view[0:size - first])
+        return views
+    
+    def close(self):
+        """Libera la memoria compartida; el proceso que la creó además la elimina"""
+        if self._shm is None:
+            return
+        if self._owner:
+            self._shm.unlink()
+        try:
+            self._header.release()
+            self._view.release()
+            self._shm.close()
+            self._shm = None
+        except BufferError:
+            # Aún hay vistas de tramos pendientes; la memoria se libera al recogerlas
+            pass
+
+
+class SharedRingReader:
+    """Lado lector del buffer compartido, con la interfaz de SampleRing.
+    
+    write_pos es la posición consumida por el proceso principal, de modo que el
+    bucle de grabación trata este buffer igual que su buffer circular propio.
+    write() no copia nada: las muestras ya las escribió el proceso de captura.
+    """
+    
+    def __init__(self, shared_ring):
+        self.shared = shared_ring
+        self.capacity = shared_ring.capacity
+        self.frame_bytes = shared_ring.frame_bytes
+        self.reserve_bytes = shared_ring.reserve_bytes
+        self.dropped_bytes = 0  # Bytes perdidos antes de lo ya consumido
+        self._gap_index = 0
+    
+    @property
+    def write_pos(self):
+        return self.shared.read_pos
+    
+    @property
+    def oldest_pos(self):
+        return self.shared.oldest_pos
+    
+    def write(self, data):
+        pass
+    
+    def views(self, start, end=None):
+        if end is None:
+            end = self.shared.read_pos
+        return self.shared.views(start, end)
+    
+    def consume(self, nbytes):
+        """Avanza la posición de lectura y devuelve el bloque sin copiarlo si es contiguo"""
+        start = self.shared.read_pos
+        views = self.shared.views(start, start + nbytes)
+        # Huecos anotados dentro del bloque consumido: se atribuyen a este bloque
+        gap_count = self.shared.gap_count
+        self._gap_index = max(self._gap_index, gap_count - _GAP_SLOTS)
+        for position, gap_bytes in self.shared.gaps(self._gap_index, gap_count):
+            if position >= start + nbytes:
+                break
+            self.dropped_bytes += gap_bytes
+            self._gap_index += 1
+        self.shared.read_pos = start + nbytes
+        return views[0] if len(views) == 1 else b''.join(views)
+
+
+def run_capture_process(ring_name, capacity, frame_bytes, format, channels, rate,
+                        frames_per_buffer, input_device_index, stop_event, errors):
+    """Proceso de captura: lee del dispositivo y escribe en el buffer compartido.
+    
+    No hace análisis ni toca la interfaz, así que su ritmo no depende de la
+    carga del proceso principal.
+    """
+    # Ctrl+C llega a todo el grupo de procesos: el cierre lo decide el proceso principal.
+    # Un SIGTERM al grupo detiene la captura de forma ordenada, sin cortar la escritura
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    ring = SharedSampleRing(capacity, frame_bytes, name=ring_name)
+    audio = None
+    stream = None
+    try:
+        audio = pyaudio.PyAudio()
+        stream = audio.open(format=format,
+                            channels=channels,
+                            rate=rate,
+                            input=True,
+                            input_device_index=input_device_index,
+                            frames_per_buffer=frames_per_buffer)
+        ring.state = CAPTURE_RUNNING
+        while not stop_event.is_set():
+            try:
+                data = stream.read(frames_per_buffer, exception_on_overflow=True)
+            except IOError as e:
+                if e.errno == pyaudio.paInputOverflowed:
+                    ring.count_overflow()
+                    continue
+                raise
+            ring.write(data)
+        ring.state = CAPTURE_STOPPED
+    except Exception as e:
+        errors.put(str(e))
+        ring.state = CAPTURE_FAILED
+    finally:
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except Exception:
+                pass
+        if audio is not None:
+            audio.terminate()
+        ring.close()
+
+
+class ProcessCaptureStream:
+    """Stream de entrada servido por un proceso de captura dedicado.
+    
+    El proceso hijo lee el dispositivo y escribe PCM en un SharedSampleRing; este
+    objeto expone la interfaz de un stream de PyAudio (read, stop_stream,
+    close) y el buffer como `ring`, para que el análisis y el guardado trabajen
+    directamente sobre la memoria compartida sin copias. El proceso se crea con
+    'spawn' para no heredar PortAudio ni los hilos del proceso principal, y se
+    arranca con main_module_hidden para que no cargue la interfaz.
+    """
+    
+    # Espera máxima a que el proceso hijo abra el dispositivo
+    START_TIMEOUT_SECONDS = 15
+    
+    def __init__(self, format, channels, rate, frames_per_buffer, input_device_index=None,
+                 reserve_seconds=60.0, headroom_seconds=10.0, read_timeout=2.0):
+        self.channels = channels
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.frame_bytes = pyaudio.get_sample_size(format) * channels
+        self.read_timeout = read_timeout
+        # Tiempo entre comprobaciones mientras se espera audio: un cuarto de bloque
+        self._poll_seconds = max(0.001, frames_per_buffer / rate / 4)
+        
+        reserve_bytes = int(rate * reserve_seconds) * self.frame_bytes
+        headroom_bytes = max(int(rate * headroom_seconds), 2 * frames_per_buffer) * self.frame_bytes
+        shared = SharedSampleRing(reserve_bytes + headroom_bytes, self.frame_bytes, reserve_bytes)
+        self.ring = SharedRingReader(shared)
+        
+        context = multiprocessing.get_context('spawn')
+        self._stop_event = context.Event()
+        self._errors = context.Queue()
+        self._process = context.Process(target=run_capture_process,
+                                        args=(shared.name, shared.capacity, self.frame_bytes, format,
+                                              channels, rate, frames_per_buffer, input_device_index,
+                                              self._stop_event, self._errors),
+                                        name="AudioCapture", daemon=True)
+        with main_module_hidden():
+            self._process.start()
+        
+        deadline = time.monotonic() + self.START_TIMEOUT_SECONDS
+        while shared.state == CAPTURE_STARTING:
+            if not self._process.is_alive() or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        if shared.state != CAPTURE_RUNNING:
+            error = self._last_error() or "el proceso de captura no arrancó"
+            self.close()
+            raise IOError(f"No se pudo abrir el dispositivo en el proceso de captura: {error}")
+    
+    def _last_error(self):
+        try:
+            return self._errors.get_nowait()
+        except queue.Empty:
+            return None
+    
+    @property
+    def input_overflows(self):
+        return self.ring.shared.input_overflows
+    
+    @property
+    def dropped_blocks(self):
+        """Bloques descartados por no caber en el buffer compartido"""
+        return self.ring.shared.dropped_bytes // (self.frames_per_buffer * self.frame_bytes)
+    
+    @property
+    def dropped_frames(self):
+        """Frames descartados antes del audio ya leído"""
+        return self.ring.dropped_bytes // self.frame_bytes
+    
+    @property
+    def backlog_frames(self):
+        """Frames escritos por el proceso de captura que aún no se han leído"""
+        shared = self.ring.shared
+        return (shared.write_pos - shared.read_pos) // self.frame_bytes
+    
+    def read(self, num_frames, exception_on_overflow=False):
+        """Espera a que el proceso de captura haya escrito num_frames muestras y las devuelve.
+        
+        exception_on_overflow se acepta por compatibilidad con PyAudio.
+        """
+        needed = num_frames * self.frame_bytes
+        shared = self.ring.shared
+        deadline = time.monotonic() + self.read_timeout
+        while shared.write_pos - shared.read_pos < needed:
+            if shared.state == CAPTURE_FAILED:
+                raise IOError(f"El proceso de captura ha fallado: {self._last_error()}")
+            if time.monotonic() > deadline:
+                raise IOError("Tiempo de espera agotado esperando audio del proceso de captura")
+            time.sleep(self._poll_seconds)
+        return self.ring.consume(needed)
+    
+    def stop_stream(self):
+        self._stop_event.set()
+    
+    def close(self):
+        """Detiene el proceso de captura y libera el buffer compartido"""
+        self._stop_event.set()
+        self._process.join(timeout=self.read_timeout + 1)
+        if self._process.is_alive():
+            print("El proceso de captura no terminó a tiempo, se fuerza su cierre")
+            self._process.terminate()
+            self._process.join()
+        self.ring.shared.close()
+
+
+class PyAudioSource(AudioSource):
+    """Origen de audio de los dispositivos de entrada reales, con el motor de captura configurado.
+    
+    'blocking' usa la lectura bloqueante de PyAudio, 'callback' una cola
+    acotada alimentada por el callback de PortAudio y 'process' un proceso de
+    captura dedicado con buffer en memoria compartida.
+    """
+    
+    is_device = True
+    name = "PyAudio"
+    
+    def __init__(self, backend, capture_mode='blocking', queue_seconds=10.0):
+        self.backend = backend
+        self.capture_mode = capture_mode
+        self.queue_seconds = queue_seconds
+    
+    def open(self, sample_width, channels, rate, frames_per_buffer, input_device_index=None, reserve_seconds=60.0):
+        format = SAMPLE_FORMATS[sample_width]
+        if self.capture_mode == 'process':
+            # Un proceso aparte lee el dispositivo y escribe en memoria compartida; el
+            # buffer reserva los tramos que pueden estar pendientes de guardar
+            return ProcessCaptureStream(format=format,
+                                        channels=channels,
+                                        rate=rate,
+                                        frames_per_buffer=frames_per_buffer,
+                                        input_device_index=input_device_index,
+                                        reserve_seconds=reserve_seconds,
+                                        headroom_seconds=self.queue_seconds)
+        audio = self.backend.audio
+        if self.capture_mode == 'callback':
+            # La captura solo encola bloques; el análisis se hace en el hilo de grabación
+            return CallbackCaptureStream(audio,
+                                         format=format,
+                                         channels=channels,
+                                         rate=rate,
+                                         frames_per_buffer=frames_per_buffer,
+                                         input_device_index=input_device_index,
+                                         queue_seconds=self.queue_seconds)
+        return BlockingCaptureStream(audio,
+                                     format=format,
+                                     channels=channels,
+                                     rate=rate,
+                                     frames_per_buffer=frames_per_buffer,
+                                     input_device_index=input_device_index)
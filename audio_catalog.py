@@ -0,0 +1,346 @@
+"""
+Catálogo SQLite de las grabaciones guardadas.
+
+El grabador añade una fila por tramo guardado con su ruta, inicio, duración,
+formato, niveles máximo y medio, audio perdido y tamaño, de modo que buscar
+grabaciones por fecha o por nivel no obliga a recorrer el directorio ni a
+volver a leer los WAV. Las filas se escriben desde un hilo propio, agrupadas
+en transacciones. Para catalogar un directorio ya existente, o rehacer el
+catálogo, y para consultarlo:
+
+    python -m audio_catalog rebuild grabaciones
+    python -m audio_catalog query --from 2026-10-13 --to 2026-10-14 --min-db -20
+
+La reconstrucción analiza los archivos en paralelo en un pool de procesos,
+con la misma medida que audio_triage. Este módulo no depende de Kivy ni de
+PyAudio.
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from audio_storage import COMPRESSED_FORMATS, read_wav_comment
+from audio_triage import analyze_wav, find_recordings
+
+# Columnas de cada grabación, además del identificador
+COLUMNS = ('path', 'start_time', 'duration_seconds', 'format', 'sample_rate', 'channels', 'bits',
+           'max_db', 'mean_db', 'dropped_frames', 'size_bytes', 'device')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    start_time TEXT NOT NULL,
+    duration_seconds REAL,
+    format TEXT,
+    sample_rate INTEGER,
+    channels INTEGER,
+    bits INTEGER,
+    max_db REAL,
+    mean_db REAL,
+    dropped_frames INTEGER,
+    size_bytes INTEGER,
+    device TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_start_time ON recordings (start_time);
+CREATE INDEX IF NOT EXISTS recordings_max_db ON recordings (max_db, start_time);
+"""
+
+# Un valor nulo no sobrescribe uno conocido: al reconstruir, un archivo
+# comprimido conserva los niveles y el audio perdido que anotó el grabador
+UPSERT_SQL = (f"INSERT INTO recordings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+              f"ON CONFLICT (path) DO UPDATE SET "
+              + ', '.join(f"{column} = COALESCE(excluded.{column}, recordings.{column})" for column in COLUMNS[1:]))
+
+DROPPED_FRAMES_PATTERN = re.compile(r'dropped_frames=(\d+)')
+
+
+def format_time(timestamp):
+    """Marca de tiempo en el formato de start_time, que SQLite entiende y ordena como texto"""
+    return timestamp.isoformat(sep=' ', timespec='milliseconds')
+
+
+def open_catalog(path):
+    """Abre (o crea) el catálogo; en modo WAL se puede consultar mientras se graba"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def upsert_recordings(conn, records):
+    """Inserta o actualiza grabaciones (diccionarios con las columnas) en una transacción"""
+    with conn:
+        conn.executemany(UPSERT_SQL, [tuple(record.get(column) for column in COLUMNS) for record in records])
+
+
+class RecordingCatalog:
+    """Escritura del catálogo en un hilo propio.
+
+    add, rename y remove solo encolan la operación, así que se pueden llamar
+    desde el hilo escritor o desde el pool de codificación sin esperar al
+    disco. El hilo del catálogo agrupa lo que llega durante commit_interval
+    segundos (o MAX_BATCH operaciones) en una sola transacción.
+    """
+
+    MAX_BATCH = 256
+
+    def __init__(self, path, commit_interval=2.0):
+        self.path = path
+        self.commit_interval = max(0.0, commit_interval)
+        self.rows_written = 0
+        self.errors = 0
+        self._conn = open_catalog(path)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="Catalogo", daemon=True)
+        self._thread.start()
+
+    def add(self, record):
+        """Cataloga una grabación recién guardada"""
+        self._queue.put(('upsert', record))
+
+    def rename(self, old_path, new_path, output_format, size_bytes):
+        """Actualiza una grabación que se ha codificado a otro formato"""
+        self._queue.put(('rename', (os.path.abspath(new_path), output_format, size_bytes,
+                                    os.path.abspath(old_path))))
+
+    def remove(self, path):
+        """Quita una grabación borrada"""
+        self._queue.put(('remove', (os.path.abspath(path),)))
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+        self._conn.close()
+
+    def _apply(self, batch):
+        try:
+            with self._conn:
+                for operation, args in batch:
+                    if operation == 'upsert':
+                        self._conn.execute(UPSERT_SQL, tuple(args.get(column) for column in COLUMNS))
+                    elif operation == 'rename':
+                        self._conn.execute("UPDATE OR REPLACE recordings SET path = ?, format = ?, size_bytes = ? "
+                                           "WHERE path = ?", args)
+                    else:
+                        self._conn.execute("DELETE FROM recordings WHERE path = ?", args)
+            self.rows_written += len(batch)
+        except sqlite3.Error as e:
+            self.errors += len(batch)
+            print(f"Error escribiendo en el catálogo {self.path}: {e}")
+
+    def close(self):
+        """Escribe lo pendiente y cierra el catálogo"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def parse_start_time(path, filename_format):
+    """Inicio de una grabación según su nombre de archivo, o None si no sigue el formato"""
+    pattern = os.path.splitext(os.path.basename(filename_format))[0]
+    try:
+        return datetime.strptime(os.path.splitext(os.path.basename(path))[0], pattern)
+    except ValueError:
+        return None
+
+
+def inspect_recording(path, chunk_frames, filename_format):
+    """Fila del catálogo de un archivo existente, o un diccionario con el error.
+
+    Se ejecuta en los procesos del pool. Los WAV se miden como en
+    audio_triage; de los comprimidos solo se leen duración y formato, y solo si
+    está instalado soundfile.
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    try:
+        stat = os.stat(path)
+        record = {'path': os.path.abspath(path), 'size_bytes': stat.st_size}
+        if extension == 'wav':
+            result = analyze_wav(path, chunk_frames)
+            if result['error'] is not None:
+                return {'path': path, 'error': result['error']}
+            comment = read_wav_comment(path) or ''
+            match = DROPPED_FRAMES_PATTERN.search(comment)
+            record.update(format='wav', duration_seconds=result['seconds'], sample_rate=result['rate'],
+                          channels=result['channels'], bits=result['bits'], max_db=result['max_db'],
+                          mean_db=result['mean_db'], dropped_frames=int(match.group(1)) if match else 0)
+        else:
+            import soundfile as sf
+            info = sf.info(path)
+            record.update(format=extension, duration_seconds=round(info.duration, 3),
+                          sample_rate=info.samplerate, channels=info.channels)
+        # Sin el formato de nombre, el archivo se cerró al terminar el tramo
+        start = parse_start_time(path, filename_format)
+        if start is None:
+            start = datetime.fromtimestamp(stat.st_mtime) - timedelta(seconds=record['duration_seconds'])
+        record['start_time'] = format_time(start)
+        return record
+    except ImportError:
+        return {'path': path, 'error': "Se necesita soundfile para leer archivos comprimidos"}
+    except (OSError, RuntimeError, ValueError) as e:
+        return {'path': path, 'error': str(e)}
+
+
+def rebuild(catalog_path, directory, chunk_frames=1024, filename_format='grabacion_%Y%m%d_%H%M%S.wav',
+            workers=None, emit=print):
+    """Cataloga todas las grabaciones de un directorio y quita las filas de archivos que ya no existen"""
+    wav_files, others = find_recordings(directory)
+    compressed = [path for path in others
+                  if os.path.splitext(path)[1].lower().lstrip('.') in COMPRESSED_FORMATS]
+    paths = wav_files + compressed
+    conn = open_catalog(catalog_path)
+    counts = {'indexed': 0, 'errors': 0, 'removed': 0}
+    found = set()
+    batch = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for record in pool.map(inspect_recording, paths, [chunk_frames] * len(paths),
+                                   [filename_format] * len(paths), chunksize=16):
+                if 'error' in record:
+                    counts['errors'] += 1
+                    emit(f"[error] {record['path']}: {record['error']}")
+                    continue
+                found.add(record['path'])
+                batch.append(record)
+                if len(batch) >= RecordingCatalog.MAX_BATCH:
+                    upsert_recordings(conn, batch)
+                    counts['indexed'] += len(batch)
+                    batch = []
+        if batch:
+            upsert_recordings(conn, batch)
+            counts['indexed'] += len(batch)
+
+        prefix = os.path.join(os.path.abspath(directory), '')
+        cataloged = {row[0] for row in conn.execute(
+            "SELECT path FROM recordings WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+        missing = cataloged - found
+        with conn:
+            conn.executemany("DELETE FROM recordings WHERE path = ?", [(path,) for path in missing])
+        counts['removed'] = len(missing)
+    finally:
+        conn.close()
+    return counts
+
+
+def query(catalog_path, start=None, end=None, min_db=None, max_db=None, device=None, limit=None):
+    """Grabaciones que cumplen los filtros, en orden de inicio"""
+    conditions = []
+    params = []
+    for condition, value in (("start_time >= ?", start), ("start_time < ?", end),
+                             ("max_db >= ?", min_db), ("max_db <= ?", max_db), ("device = ?", device)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM recordings"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY start_time"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = open_catalog(catalog_path)
+    try:
+        return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def recording_levels(catalog_path):
+    """Nivel máximo de cada grabación catalogada, por ruta"""
+    conn = open_catalog(catalog_path)
+    try:
+        return dict(conn.execute("SELECT path, max_db FROM recordings WHERE max_db IS NOT NULL"))
+    finally:
+        conn.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m audio_catalog',
+                                     description="Catálogo SQLite de las grabaciones guardadas")
+    parser.add_argument('--catalog', default='catalogo.sqlite', help="archivo del catálogo (por defecto catalogo.sqlite)")
+    parser.add_argument('--json', action='store_true', help="escribir los resultados como líneas JSON")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild_parser = commands.add_parser('rebuild', help="catalogar un directorio de grabaciones existente")
+    rebuild_parser.add_argument('directory', nargs='?', default='grabaciones',
+                                help="directorio de grabaciones (por defecto grabaciones)")
+    rebuild_parser.add_argument('--chunk', type=int, default=1024,
+                                help="frames por bloque de medida; debe coincidir con CHUNK_SIZE (por defecto 1024)")
+    rebuild_parser.add_argument('--filename-format', default='grabacion_%Y%m%d_%H%M%S.wav',
+                                help="FILENAME_FORMAT con el que se nombraron los archivos, para leer su inicio")
+    rebuild_parser.add_argument('--workers', type=int, help="procesos de análisis (por defecto uno por núcleo)")
+
+    query_parser = commands.add_parser('query', help="buscar grabaciones por fecha, nivel o dispositivo")
+    query_parser.add_argument('--from', dest='start', help="inicio mínimo (2026-10-13 o 2026-10-13T08:00)")
+    query_parser.add_argument('--to', dest='end', help="inicio máximo, excluido")
+    query_parser.add_argument('--min-db', type=float, help="nivel máximo del tramo de al menos estos dB")
+    query_parser.add_argument('--max-db', type=float, help="nivel máximo del tramo de como mucho estos dB")
+    query_parser.add_argument('--device', help="nombre del dispositivo")
+    query_parser.add_argument('--limit', type=int, help="número máximo de resultados")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'rebuild':
+        if not os.path.isdir(args.directory):
+            print(f"No existe el directorio {args.directory}", file=sys.stderr)
+            return 2
+        started = time.perf_counter()
+
+        def emit(text):
+            if not args.json:
+                print(text, flush=True)
+
+        counts = rebuild(args.catalog, args.directory, args.chunk, args.filename_format, args.workers, emit)
+        elapsed = time.perf_counter() - started
+        if args.json:
+            print(json.dumps(dict(counts, status='summary', seconds=round(elapsed, 2)), ensure_ascii=False))
+        else:
+            print(f"Catalogados {counts['indexed']} archivos en {elapsed:.1f} s en {args.catalog}: "
+                  f"{counts['errors']} errores, {counts['removed']} filas de archivos que ya no existen")
+        return 1 if counts['errors'] else 0
+
+    # Las fechas se comparan como texto con start_time (AAAA-MM-DD HH:MM:SS.mmm)
+    start = args.start.replace('T', ' ') if args.start else None
+    end = args.end.replace('T', ' ') if args.end else None
+    rows = query(args.catalog, start, end, args.min_db, args.max_db, args.device, args.limit)
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            level = f"{row['max_db']:.1f} dB" if row['max_db'] is not None else "? dB"
+            print(f"{row['start_time']}  {row['duration_seconds'] or 0:7.1f} s  {level:>9}  {row['path']}")
+    if not args.json:
+        print(f"{len(rows)} grabaciones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Grabador de audio sin interfaz gráfica.
+
+Ejecuta el mismo proceso de captura, umbral y guardado que la aplicación
+Kivy, pero sin importar Kivy, para servidores sin pantalla. Ejemplos:
+
+    python -m audio_cli devices
+    python -m audio_cli record --device 2 --threshold -40
+    python -m audio_cli --json record > eventos.jsonl
+
+Con --json cada evento se escribe como una línea JSON en la salida estándar
+y los mensajes de diagnóstico van a la salida de error.
+"""
+
+import time
+_START_TIME = time.perf_counter()  # Para comparar el arranque con la interfaz gráfica
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+
+from recorder_core import RecorderCore, peak_memory_mb
+from audio_sources import SIGNAL_TYPES, SOURCE_TYPES
+from audio_storage import OUTPUT_FORMATS
+from audio_profiling import PROFILE_MODES
+from audio_retention import RETENTION_POLICIES
+
+
+class HeadlessRecorder(RecorderCore):
+    """Grabador que informa de los eventos por la salida estándar en texto o JSON"""
+
+    def __init__(self, config_file="config.ini", json_output=False, log_stream=None):
+        self.json_output = json_output
+        self.log_stream = log_stream or sys.stdout
+        self._log_lock = threading.Lock()
+        super().__init__(config_file)
+
+    def emit(self, event, message="", **fields):
+        """Escribe un evento en el registro"""
+        with self._log_lock:
+            if self.json_output:
+                record = {'time': datetime.now().isoformat(timespec='milliseconds'), 'event': event}
+                if message:
+                    record['message'] = message
+                record.update(fields)
+                self.log_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            else:
+                details = ' '.join(f"{key}={value}" for key, value in fields.items())
+                line = f"{datetime.now():%Y-%m-%d %H:%M:%S} [{event}] {message} {details}".rstrip()
+                self.log_stream.write(line + '\n')
+            self.log_stream.flush()
+
+    def notify(self, title, message, message_type="info"):
+        self.emit(message_type, f"{title}: {message}")
+
+    def set_status(self, status_text):
+        super().set_status(status_text)
+        self.emit('status', status_text)
+
+    def on_segment_result(self, kept, max_volume):
+        self.emit('segment', "Tramo guardado" if kept else "Tramo descartado",
+                  kept=kept, max_db=round(max_volume, 1), dropped_frames=self.segment_dropped_frames,
+                  saved=self.recordings_saved_count, deleted=self.recordings_deleted_count)
+
+    def on_device_segment_result(self, pipeline, kept, max_volume):
+        self.emit('segment', "Tramo guardado" if kept else "Tramo descartado",
+                  device=pipeline.selected_device_name, kept=kept, max_db=round(max_volume, 1),
+                  dropped_frames=pipeline.segment_dropped_frames, saved=pipeline.recordings_saved_count, deleted=pipeline.recordings_deleted_count)
+        
+    def emit_device_stats(self):
+        for stats in self.device_stats():
+            self.emit('device_stats', **stats)
+        
+    def emit_level(self):
+        """Informa del pico de volumen desde el último aviso y de los contadores"""
+        self.collect_device_levels()
+        peak_db = self.display_peak_db
+        self.display_peak_db = -60.0
+        channel_peaks = self.display_channel_peak_db
+        self.display_channel_peak_db = None
+        fields = {}
+        if channel_peaks is not None and len(channel_peaks) > 1:
+            fields['channel_db'] = [round(float(level), 1) for level in channel_peaks]
+        self.emit('level', peak_db=round(peak_db, 1), segment_max_db=round(self.current_max_volume, 1),
+                  saved=self.recordings_saved_count, deleted=self.recordings_deleted_count, **fields)
+        self.emit_device_stats()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m audio_cli',
+                                     description="Grabador de audio con detección de volumen, sin interfaz gráfica")
+    parser.add_argument('--config', default='config.ini', help="archivo de configuración (por defecto config.ini)")
+    parser.add_argument('--json', action='store_true', help="escribir los eventos como líneas JSON")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    devices = subparsers.add_parser('devices', help="listar los dispositivos de entrada compatibles")
+    devices.add_argument('--probe', action='store_true', help="volver a probar todos los dispositivos, sin usar la caché")
+
+    record = subparsers.add_parser('record', help="grabar en bucle hasta Ctrl+C o SIGTERM")
+    record.add_argument('--device', type=int, help="índice PyAudio del dispositivo de entrada")
+    record.add_argument('--threshold', type=float, help="umbral en dB (por defecto el de config.ini)")
+    record.add_argument('--channels', type=int, help="número de canales a capturar")
+    record.add_argument('--channel-thresholds',
+                        help="umbral en dB de cada canal, separados por comas (activa THRESHOLD_POLICY = per_channel)")
+    record.add_argument('--duration', type=float, help="duración de cada tramo en segundos")
+    record.add_argument('--output', help="directorio de salida")
+    record.add_argument('--format', choices=OUTPUT_FORMATS, help="formato de salida")
+    record.add_argument('--devices', help="grabar varios dispositivos a la vez: índices o nombres separados por comas")
+    record.add_argument('--thresholds', help="umbral en dB de cada dispositivo de --devices, separados por comas")
+    record.add_argument('--trigger', action='store_true', help="grabación por eventos (pre-roll y hangover)")
+    record.add_argument('--source', choices=SOURCE_TYPES, help="origen del audio (por defecto el de config.ini)")
+    record.add_argument('--source-file', help="WAV que se reproduce como origen (implica --source file)")
+    record.add_argument('--signal', choices=SIGNAL_TYPES, help="señal del origen sintético")
+    record.add_argument('--level-db', type=float, help="nivel RMS en dBFS de la señal sintética")
+    record.add_argument('--fast', action='store_true',
+                        help="entregar el audio de file o synthetic lo más rápido posible, sin esperar al tiempo real")
+    record.add_argument('--zero-fill', action='store_true',
+                        help="rellenar con silencio el audio perdido por desbordamientos")
+    record.add_argument('--metrics-file', help="archivo JSON donde publicar las métricas de la grabación")
+    record.add_argument('--metrics-port', type=int, help="puerto HTTP local donde servir las métricas (GET /metrics)")
+    record.add_argument('--profile', nargs='?', const='sampling', choices=PROFILE_MODES,
+                        help="perfilar la grabación (por defecto por muestreo) y guardar el perfil en el directorio de salida")
+    record.add_argument('--profile-seconds', type=float, help="duración de la ventana de perfilado en segundos")
+    record.add_argument('--max-size-mb', type=float, help="tamaño máximo de las grabaciones; se borran las que sobren")
+    record.add_argument('--max-age-days', type=float, help="borrar las grabaciones más antiguas que estos días")
+    record.add_argument('--min-free-mb', type=float, help="espacio libre mínimo que se deja en el disco")
+    record.add_argument('--retention-policy', choices=RETENTION_POLICIES,
+                        help="qué grabaciones se borran primero: oldest o quietest")
+    record.add_argument('--status-interval', type=float, default=10.0,
+                        help="segundos entre avisos de nivel (0 para desactivar)")
+    return parser
+
+
+def list_devices(recorder, args):
+    if args.probe:
+        recorder.refresh_audio_devices(force_probe=True)
+    if recorder.device_probe_thread is not None:
+        # Esperar a que termine la comprobación de dispositivos en segundo plano
+        recorder.device_probe_thread.join()
+    for device in recorder.audio_devices:
+        recorder.emit('device', device['display_name'], index=device['index'],
+                      channels=device['channels'], sample_rate=device['sample_rate'])
+    return 0
+
+
+def record(recorder, args):
+    # Las opciones de la línea de comandos no se guardan en config.ini
+    if args.device is not None and not recorder.select_device(args.device):
+        recorder.emit('error', f"El dispositivo {args.device} no existe o no es compatible")
+        return 2
+    if args.threshold is not None:
+        recorder.threshold_db = args.threshold
+    if args.channels is not None:
+        recorder.CHANNELS = args.channels
+    if args.channel_thresholds:
+        recorder.config_threshold_policy = 'per_channel'
+        recorder.config_channel_thresholds = [float(t) for t in args.channel_thresholds.split(',') if t.strip()]
+    if args.duration is not None:
+        recorder.record_duration = args.duration
+    if args.output:
+        recorder.output_dir = args.output
+        os.makedirs(recorder.output_dir, exist_ok=True)
+    if args.format:
+        recorder.config_output_format = args.format
+    if args.trigger:
+        recorder.config_trigger_enabled = True
+    if args.devices:
+        recorder.config_multi_device_enabled = True
+        recorder.config_multi_devices = [d.strip() for d in args.devices.split(',') if d.strip()]
+    if args.thresholds:
+        recorder.config_multi_thresholds = [float(t) for t in args.thresholds.split(',') if t.strip()]
+    if args.source_file:
+        recorder.config_source_type = 'file'
+        recorder.config_source_file = args.source_file
+    if args.source:
+        recorder.config_source_type = args.source
+    if args.signal:
+        recorder.config_source_signal = args.signal
+    if args.level_db is not None:
+        recorder.config_source_level_db = args.level_db
+    if args.fast:
+        recorder.config_source_realtime = False
+    if args.zero_fill:
+        recorder.config_zero_fill_drops = True
+    if args.metrics_file:
+        recorder.config_metrics_file = os.path.abspath(args.metrics_file)
+    if args.metrics_port is not None:
+        recorder.config_metrics_http_port = args.metrics_port
+    if args.profile:
+        recorder.config_profiling_enabled = True
+        recorder.config_profiling_mode = args.profile
+    if args.profile_seconds is not None:
+        recorder.config_profiling_seconds = args.profile_seconds
+    if args.max_size_mb is not None:
+        recorder.config_retention_max_size_mb = args.max_size_mb
+    if args.max_age_days is not None:
+        recorder.config_retention_max_age_days = args.max_age_days
+    if args.min_free_mb is not None:
+        recorder.config_retention_min_free_mb = args.min_free_mb
+    if args.retention_policy:
+        recorder.config_retention_policy = args.retention_policy
+    if args.source or args.source_file or args.signal or args.level_db is not None or args.fast:
+        recorder.audio_source = recorder.create_audio_source()
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    device = recorder.selected_device_name
+    if recorder.config_multi_device_enabled:
+        device = ', '.join(recorder.config_multi_devices)
+    recorder.emit('start', "Grabando", device=device,
+                  threshold_db=recorder.threshold_db, rate=recorder.RATE,
+                  channels=recorder.CHANNELS, output_dir=recorder.output_dir)
+    recorder.start_recording()
+
+    last_level_time = time.monotonic()
+    while not stop_event.wait(1.0):
+        if not recorder.recording_alive():
+            if not recorder.capture_finished():
+                recorder.emit('error', "El hilo de grabación ha terminado")
+            break
+        if args.status_interval > 0 and time.monotonic() - last_level_time >= args.status_interval:
+            recorder.emit_level()
+            last_level_time = time.monotonic()
+
+    recorder.stop_recording()
+    recorder.shutdown()
+    recorder.emit('stop', "Grabación detenida",
+                  saved=recorder.recordings_saved_count, deleted=recorder.recordings_deleted_count)
+    recorder.emit_device_stats()
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # En modo JSON la salida estándar queda reservada para los eventos
+    log_stream = sys.stdout
+    if args.json:
+        sys.stdout = sys.stderr
+
+    recorder = HeadlessRecorder(args.config, json_output=args.json, log_stream=log_stream)
+
+    memory_mb = peak_memory_mb()
+    recorder.emit('startup', "Grabador listo",
+                  seconds=round(time.perf_counter() - _START_TIME, 3),
+                  peak_memory_mb=round(memory_mb, 1) if memory_mb is not None else None)
+
+    if args.command == 'devices':
+        return list_devices(recorder, args)
+    return record(recorder, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
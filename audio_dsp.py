@@ -0,0 +1,179 @@
+"""
+Utilidades de procesado de muestras PCM del grabador.
+
+Este módulo no depende de Kivy ni de PyAudio para que lo puedan usar por
+igual el medidor de volumen, el guardado y las herramientas fuera de línea.
+Los formatos se identifican por el ancho de muestra en bytes (2, 3 o 4).
+"""
+
+import math
+
+import numpy as np
+
+# Valor máximo positivo de cada formato entero con signo, por ancho en bytes
+FULL_SCALE = {
+    2: 32767.0,
+    3: 8388607.0,  # 2^23 - 1
+    4: 2147483647.0,  # 2^31 - 1
+}
+
+
+def decode_pcm24(data):
+    """Decodifica PCM de 24 bits little endian a un array int32 sin bucles de Python.
+
+    Cada muestra de 3 bytes se coloca en los 3 bytes altos de un int32 y se
+    desplaza 8 bits a la derecha: el desplazamiento aritmético extiende el signo.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    n_samples = len(raw) // 3
+    padded = np.zeros((n_samples, 4), dtype=np.uint8)
+    padded[:, 1:] = raw[:n_samples * 3].reshape(n_samples, 3)
+    return padded.view('<i4').reshape(n_samples) >> 8
+
+
+def decode_pcm(data, sample_width):
+    """Devuelve las muestras de un buffer PCM entero con signo como array de numpy"""
+    if sample_width == 2:
+        return np.frombuffer(data, dtype='<i2')
+    if sample_width == 3:
+        return decode_pcm24(data)
+    if sample_width == 4:
+        return np.frombuffer(data, dtype='<i4')
+    raise ValueError(f"Ancho de muestra no soportado: {sample_width} bytes")
+
+
+def chunk_power_stats(data, sample_width, channels, chunk_frames):
+    """Devuelve (potencia del bloque y canal más fuertes, suma de potencias, muestras).
+
+    Las potencias son medias de cuadrados normalizadas a 1. La primera
+    equivale a medir con LevelMeter cada bloque de chunk_frames frames, como
+    hace el bucle de grabación, y quedarse con el canal y el bloque más
+    fuertes, pero reduce todos los bloques de data en una sola operación. Un
+    resto de menos de chunk_frames frames al final se mide como un bloque más
+    corto, igual que el último bloque recortado de un tramo. La suma de
+    cuadrados de todas las muestras, dividida entre su número, da el nivel
+    medio del audio.
+    """
+    samples = decode_pcm(data, sample_width)
+    n_frames = len(samples) // channels
+    if n_frames == 0:
+        return 0.0, 0.0, 0
+    samples = samples[:n_frames * channels].astype(np.float64).reshape(n_frames, channels)
+    n_full = n_frames // chunk_frames
+    peak = 0.0
+    total = 0.0
+    if n_full:
+        blocks = samples[:n_full * chunk_frames].reshape(n_full, chunk_frames, channels)
+        # Suma de cuadrados de cada canal de cada bloque: forma (bloques, canales)
+        sums = np.einsum('ijk,ijk->ik', blocks, blocks)
+        peak = float(sums.max()) / chunk_frames
+        total = float(sums.sum())
+    rest = samples[n_full * chunk_frames:]
+    if len(rest):
+        rest_sums = np.einsum('ij,ij->j', rest, rest)
+        peak = max(peak, float(rest_sums.max()) / len(rest))
+        total += float(rest_sums.sum())
+    scale = FULL_SCALE[sample_width] ** 2
+    return peak / scale, total / scale, n_frames * channels
+
+
+def power_to_db(power, floor_db=-60.0):
+    """Convierte una potencia media normalizada a dB, con el suelo del medidor"""
+    if power <= 0.0:
+        return floor_db
+    return max(10.0 * math.log10(power), floor_db)
+
+
+def encode_pcm(samples, sample_width):
+    """Convierte muestras float en [-1, 1] a bytes PCM entero con signo little endian"""
+    if sample_width not in FULL_SCALE:
+        raise ValueError(f"Ancho de muestra no soportado: {sample_width} bytes")
+    scaled = np.clip(samples, -1.0, 1.0) * FULL_SCALE[sample_width]
+    if sample_width == 2:
+        return np.rint(scaled).astype('<i2').tobytes()
+    integers = np.rint(scaled).astype('<i4')
+    if sample_width == 4:
+        return integers.tobytes()
+    # 24 bits: los 3 bytes bajos de cada int32 little endian
+    return integers.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+class LevelMeter:
+    """Medidor de nivel RMS por canal que no reserva memoria en cada bloque.
+
+    Las muestras se convierten a float64 sobre un buffer de trabajo
+    preasignado con forma (frames, canales) y la suma de cuadrados por canal se
+    obtiene en una única reducción. Los buffers solo crecen si llega un bloque
+    mayor que el previsto.
+    """
+
+    def __init__(self, sample_width, channels, max_frames=1024, floor_db=-60.0):
+        if sample_width not in FULL_SCALE:
+            raise ValueError(f"Ancho de muestra no soportado: {sample_width} bytes")
+        self.sample_width = sample_width
+        self.channels = channels
+        self.frame_bytes = sample_width * channels
+        self.floor_db = floor_db
+        self._dtype = {2: '<i2', 4: '<i4'}.get(sample_width)
+        # En 24 bits las muestras se leen como int32 desplazadas 8 bits: se corrige
+        # la escala sobre la suma de cuadrados en lugar de muestra a muestra
+        self._square_scale = 1.0 / (FULL_SCALE[sample_width] ** 2)
+        if sample_width == 3:
+            self._square_scale /= 65536.0
+        self.sums = np.zeros(channels, dtype=np.float64)
+        self.last_frames = 0
+        # Nivel por canal del último bloque y potencia equivalente al suelo en dB
+        self._levels = np.empty(channels, dtype=np.float64)
+        self._floor_power = 10.0 ** (floor_db / 10.0)
+        self._allocate(max_frames)
+
+    def _allocate(self, max_frames):
+        self.max_frames = max_frames
+        self._samples = np.empty((max_frames, self.channels), dtype=np.float64)
+        if self.sample_width == 3:
+            # El byte bajo de cada int32 queda siempre a cero
+            self._padded = np.zeros((max_frames * self.channels, 4), dtype=np.uint8)
+
+    def measure(self, data):
+        """Devuelve el nivel en dB del canal más fuerte del bloque"""
+        n_frames = len(data) // self.frame_bytes
+        self.last_frames = n_frames
+        if n_frames == 0:
+            self.sums[:] = 0.0
+            return self.floor_db
+        if n_frames > self.max_frames:
+            self._allocate(n_frames)
+
+        samples = self._samples[:n_frames]
+        count = n_frames * self.channels
+        if self.sample_width == 3:
+            padded = self._padded[:count]
+            padded[:, 1:] = np.frombuffer(data, dtype=np.uint8, count=count * 3).reshape(count, 3)
+            np.copyto(samples, padded.view('<i4').reshape(n_frames, self.channels))
+        else:
+            np.copyto(samples, np.frombuffer(data, dtype=self._dtype, count=count).reshape(n_frames, self.channels))
+
+        # Suma de cuadrados por canal en una sola pasada, sin temporales
+        np.einsum('ij,ij->j', samples, samples, out=self.sums)
+
+        mean_square = float(self.sums.max()) * self._square_scale / n_frames
+        if mean_square <= 0.0:
+            return self.floor_db
+        # 10*log10(media de cuadrados) == 20*log10(RMS)
+        return max(10.0 * math.log10(mean_square), self.floor_db)
+
+    def channel_levels_db(self):
+        """Devuelve el nivel en dB de cada canal del último bloque medido.
+
+        Se calcula sobre las sumas de cuadrados de measure() en el buffer interno,
+        que se sobrescribe en la siguiente llamada: quien lo conserve debe copiarlo.
+        """
+        levels = self._levels
+        if self.last_frames == 0:
+            levels.fill(self.floor_db)
+            return levels
+        np.multiply(self.sums, self._square_scale / self.last_frames, out=levels)
+        np.maximum(levels, self._floor_power, out=levels)
+        np.log10(levels, out=levels)
+        levels *= 10.0
+        return levels
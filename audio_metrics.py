@@ -0,0 +1,242 @@
+"""
+Métricas de funcionamiento del grabador.
+
+La captura, el análisis y el guardado actualizan contadores, valores
+instantáneos e histogramas en un MetricsRegistry. MetricsExporter publica
+periódicamente una instantánea en un archivo JSON y la sirve por HTTP en una
+dirección local, de modo que se puede vigilar si un grabador empieza a
+quedarse por detrás del tiempo real.
+
+Este módulo no depende de Kivy ni de PyAudio.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites superiores (milisegundos) de los intervalos de los histogramas de tiempos
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Histograma de intervalos fijos con recuento, suma y máximo"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # El último intervalo no tiene límite
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def copy(self):
+        """Copia para publicar un histograma que otro hilo actualiza sin bloqueo.
+
+        El recuento se calcula a partir de los intervalos copiados, de modo que
+        siempre coincide con ellos; la suma y el máximo pueden incluir como mucho
+        una observación hecha durante la copia.
+        """
+        other = Histogram(self.buckets)
+        other.total = self.total
+        other.max = self.max
+        other.counts = list(self.counts)
+        other.count = sum(other.counts)
+        return other
+
+    def snapshot(self):
+        # Los intervalos son acumulativos: cuántas observaciones no superan cada límite
+        cumulative = 0
+        buckets = {}
+        for limit, count in zip(self.buckets + ('inf',), self.counts):
+            cumulative += count
+            buckets[str(limit)] = cumulative
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'max': round(self.max, 3),
+            'buckets': buckets,
+        }
+
+
+class MetricsScope:
+    """Métricas de una parte del grabador (una captura, el hilo escritor...)"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS_MS):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def set_counter(self, name, value):
+        """Publica un contador que el dueño lleva por su cuenta (en el camino de la captura, sin bloqueo)"""
+        with self._lock:
+            self.counters[name] = value
+
+    def set_histogram(self, name, histogram):
+        """Publica un histograma calculado por el dueño (una copia si lo sigue actualizando)"""
+        with self._lock:
+            self.histograms[name] = histogram
+
+    def counter(self, name):
+        return self.counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+
+class MetricsRegistry:
+    """Conjunto de ámbitos de métricas con sus funciones de recogida.
+
+    Los valores que no se actualizan en el camino de la captura (colas,
+    desbordamientos que cuenta PyAudio...) se leen al hacer la instantánea
+    mediante las funciones registradas con add_collector.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._scopes = {}
+        self._collectors = []
+
+    def scope(self, name):
+        """Devuelve el ámbito con ese nombre, creándolo si no existe"""
+        with self._lock:
+            scope = self._scopes.get(name)
+            if scope is None:
+                scope = self._scopes[name] = MetricsScope(name)
+            return scope
+
+    def add_collector(self, collector):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def snapshot(self):
+        """Instantánea de todas las métricas, lista para serializar en JSON"""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error recogiendo métricas: {e}")
+        with self._lock:
+            scopes = dict(self._scopes)
+        return {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'uptime_seconds': round(time.monotonic() - self.started_at, 3),
+            'scopes': {name: scope.snapshot() for name, scope in scopes.items()},
+        }
+
+
+class MetricsExporter:
+    """Publica las métricas en un archivo JSON y por HTTP en un hilo propio.
+
+    El archivo se reescribe cada interval segundos a través de un temporal y
+    un renombrado, así que quien lo lea nunca ve un JSON a medias. El servidor
+    HTTP responde a GET /metrics (y /) con una instantánea al momento.
+    """
+
+    def __init__(self, registry, path=None, interval=5.0, http_host='127.0.0.1', http_port=0):
+        self.registry = registry
+        self.path = path
+        self.interval = max(0.1, interval)
+        self.http_server = None
+        self._stop = threading.Event()
+
+        if http_port:
+            self.http_server = ThreadingHTTPServer((http_host, http_port), self._handler_class())
+            self.http_server.daemon_threads = True
+            threading.Thread(target=self.http_server.serve_forever, name="MetricsHTTP", daemon=True).start()
+            print(f"Métricas disponibles en http://{http_host}:{self.http_server.server_address[1]}/metrics")
+
+        self._thread = None
+        if path:
+            self._thread = threading.Thread(target=self._run, name="MetricsFile", daemon=True)
+            self._thread.start()
+
+    def _handler_class(self):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sin una línea de registro por petición
+
+        return MetricsHandler
+
+    def write_file(self):
+        """Reescribe el archivo de métricas de forma atómica"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def _run(self):
+        while True:
+            try:
+                self.write_file()
+            except Exception as e:
+                print(f"Error escribiendo el archivo de métricas: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def close(self):
+        """Detiene el servidor y escribe una última instantánea"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            try:
+                self.write_file()
+            except Exception as e:
+                print(f"Error escribiendo el archivo de métricas: {e}")
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
@@ -0,0 +1,224 @@
+"""
+Perfilado del grabador durante una ventana de tiempo acotada.
+
+RecordingProfiler muestrea periódicamente la pila de todos los hilos (el de
+grabación, el escritor, el de la interfaz...) y, en modo 'deterministic',
+además ejecuta los hilos de grabación bajo cProfile. Al terminar la ventana
+escribe en el directorio de salida un resumen de texto y un archivo de pilas
+colapsadas (una línea "hilo;función;...;función N" por pila) que se puede
+abrir con flamegraph.pl o speedscope; en modo determinista también el .prof
+de pstats.
+
+Mientras el perfilado está desactivado el grabador no crea ningún
+RecordingProfiler, así que no tiene coste. Este módulo no depende de Kivy ni
+de PyAudio.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+
+PROFILE_MODES = ('sampling', 'deterministic')
+
+
+def frame_label(code):
+    """Nombre de una función en las pilas: función (archivo:línea)"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RecordingProfiler:
+    """Perfil de los hilos del grabador durante `seconds` segundos.
+
+    profile_thread envuelve el objetivo de un hilo de grabación para que, en
+    modo determinista, se ejecute bajo su propio cProfile; cProfile solo puede
+    detenerse desde el hilo que perfila, así que esos hilos llaman a check()
+    en cada bloque y se detienen solos al acabar la ventana.
+    """
+
+    # Espera máxima a que los hilos de grabación detengan su cProfile al acabar la ventana
+    FINISH_TIMEOUT_SECONDS = 5
+
+    def __init__(self, output_dir, mode='sampling', seconds=60.0, interval=0.005, on_written=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfilado no soportado: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.seconds = seconds
+        self.interval = max(0.001, interval)
+        self.on_written = on_written  # Se llama con las rutas escritas
+        self.finished = False
+        self.stacks = {}  # Pila (tupla de la raíz a la hoja) -> muestras
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = []  # [cProfile.Profile, activo] de cada hilo de grabación
+        self._stop = threading.Event()
+        self._started_at = None
+        self._deadline = None
+        self._cpu_start = 0.0
+        self._thread = None
+
+    def start(self):
+        self._started_at = datetime.now()
+        self._deadline = time.monotonic() + self.seconds
+        self._cpu_start = time.process_time()
+        self._thread = threading.Thread(target=self._run, name="Perfilador", daemon=True)
+        self._thread.start()
+        print(f"Perfilado ({self.mode}) activo durante {self.seconds:.0f} s")
+        return self
+
+    def profile_thread(self, target):
+        """Devuelve el objetivo de un hilo de grabación, perfilado con cProfile en modo determinista"""
+        if self.mode != 'deterministic':
+            return target
+
+        @functools.wraps(target)
+        def run():
+            if self.finished:
+                return target()
+            entry = [cProfile.Profile(), True]
+            with self._lock:
+                self._profiles.append(entry)
+            self._local.entry = entry
+            entry[0].enable()
+            try:
+                return target()
+            finally:
+                self._disable(entry)
+
+        return run
+
+    def check(self):
+        """Se llama desde los hilos de grabación: detiene su cProfile al acabar la ventana"""
+        if time.monotonic() < self._deadline:
+            return
+        entry = getattr(self._local, 'entry', None)
+        if entry is not None:
+            self._disable(entry)
+            self._local.entry = None
+
+    def _disable(self, entry):
+        with self._lock:
+            if entry[1]:
+                entry[0].disable()
+                entry[1] = False
+
+    def stop(self):
+        """Termina la ventana antes de tiempo (al detener la grabación) y escribe los resultados"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.FINISH_TIMEOUT_SECONDS + 1)
+
+    def _run(self):
+        while not self._stop.is_set() and time.monotonic() < self._deadline:
+            self._sample()
+            self._stop.wait(self.interval)
+        self._deadline = time.monotonic()  # Los hilos que llamen a check() se detienen ya
+
+        # Esperar a que cada hilo de grabación detenga su propio cProfile
+        limit = time.monotonic() + self.FINISH_TIMEOUT_SECONDS
+        while time.monotonic() < limit:
+            with self._lock:
+                if not any(active for profile, active in self._profiles):
+                    break
+            time.sleep(0.05)
+        try:
+            self.write()
+        except Exception as e:
+            print(f"Error escribiendo el perfil: {e}")
+        self.finished = True
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            key = (names.get(ident, f"hilo-{ident}"),) + tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def collapsed_lines(self):
+        """Pilas en formato colapsado: hilo;función;...;función muestras"""
+        lines = []
+        for key, count in self.stacks.items():
+            frames = [key[0].replace(';', ':')] + [frame_label(code) for code in key[1:]]
+            lines.append(f"{';'.join(frames)} {count}")
+        lines.sort()
+        return lines
+
+    def summary(self, cpu_seconds, elapsed):
+        """Resumen de texto: funciones con más muestras propias e inclusivas"""
+        own = {}
+        inclusive = {}
+        threads = {}
+        for key, count in self.stacks.items():
+            threads[key[0]] = threads.get(key[0], 0) + count
+            if len(key) > 1:
+                leaf = frame_label(key[-1])
+                own[leaf] = own.get(leaf, 0) + count
+            for label in {frame_label(code) for code in key[1:]}:
+                inclusive[label] = inclusive.get(label, 0) + count
+
+        out = io.StringIO()
+        out.write(f"Perfil del grabador ({self.mode}) desde {self._started_at:%Y-%m-%d %H:%M:%S}\n")
+        out.write(f"Duración: {elapsed:.1f} s, CPU del proceso: {cpu_seconds:.2f} s "
+                  f"({100.0 * cpu_seconds / elapsed if elapsed > 0 else 0.0:.1f} %)\n")
+        out.write(f"Muestras: {self.samples} cada {self.interval * 1000:.1f} ms "
+                  f"(tiempo real: incluyen las esperas de cada hilo)\n\n")
+        out.write("Muestras por hilo:\n")
+        for name, count in sorted(threads.items(), key=lambda item: -item[1]):
+            out.write(f"  {count:8d}  {name}\n")
+        for title, table in (("Funciones con más muestras propias", own),
+                             ("Funciones con más muestras incluyendo llamadas", inclusive)):
+            out.write(f"\n{title}:\n")
+            for label, count in sorted(table.items(), key=lambda item: -item[1])[:30]:
+                out.write(f"  {count:8d}  {label}\n")
+        return out.getvalue()
+
+    def write(self):
+        """Escribe el resumen, las pilas colapsadas y, en modo determinista, el .prof"""
+        elapsed = (datetime.now() - self._started_at).total_seconds()
+        cpu_seconds = time.process_time() - self._cpu_start
+        base = os.path.join(self.output_dir, f"perfil_{self._started_at:%Y%m%d_%H%M%S}")
+        paths = []
+
+        text = self.summary(cpu_seconds, elapsed)
+        with self._lock:
+            profiles = [profile for profile, active in self._profiles if not active]
+            still_active = len(self._profiles) - len(profiles)
+        if still_active:
+            print(f"{still_active} hilos de grabación no detuvieron cProfile a tiempo; se omiten")
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(base + '.prof')
+            paths.append(base + '.prof')
+            listing = io.StringIO()
+            stats.stream = listing
+            stats.sort_stats('cumulative').print_stats(40)
+            text += "\ncProfile de los hilos de grabación (tiempo acumulado):\n" + listing.getvalue()
+
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(text)
+        paths.append(base + '.txt')
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.collapsed_lines()) + '\n')
+        paths.append(base + '.collapsed')
+
+        if self.on_written is not None:
+            self.on_written(paths)
+        else:
+            print(f"Perfil guardado: {', '.join(paths)}")
+        return paths
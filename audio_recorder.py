@@ -1,3 +1,6 @@
+import time
+_START_TIME = time.perf_counter()  # Para comparar el arranque con el modo sin interfaz
+
 import kivy
 from kivy.app import App
 from kivy.core.window import Window
@@ -16,14 +19,11 @@ from kivy.clock import Clock
 from kivy.metrics import dp
 from kivy.core.window import Window
 
+import re
+
 import pyaudio
-import wave
-import numpy as np
-import threading
-import os
-from datetime import datetime
-import time
-import configparser
+
+from recorder_core import RecorderCore, peak_memory_mb
 
 class AudioRecorderApp(App):
     def build(self):
@@ -35,7 +35,12 @@ class AudioRecorderApp(App):
         
         # Crear instancia del grabador
         self.recorder = AudioRecorder()
-        return self.recorder.setup_ui()
+        root = self.recorder.setup_ui()
+        
+        memory_mb = peak_memory_mb()
+        memory_text = f", memoria máxima {memory_mb:.1f} MB" if memory_mb is not None else ""
+        print(f"Interfaz lista en {time.perf_counter() - _START_TIME:.2f} s{memory_text}")
+        return root
     
     def on_stop(self):
         """Método de Kivy llamado cuando la aplicación se cierra"""
@@ -43,32 +48,18 @@ class AudioRecorderApp(App):
             self.recorder.on_closing()
         return super().on_stop()
 
-class AudioRecorder:
+class AudioRecorder(RecorderCore):
+    """Interfaz gráfica Kivy sobre el núcleo de grabación"""
+    # Segundos que se muestra el resultado de un tramo antes de volver al estado en vivo
+    RESULT_DISPLAY_SECONDS = 2
+    
     def __init__(self):
-        # Archivo de configuración
-        self.config_file = "config.ini"
-        
-        # Cargar configuración desde archivo
-        self.load_config()
-        
-        # Configuración de audio - Cargada desde config.ini
-        self.CHUNK = self.config_chunk_size
-        self.FORMAT = self.config_format
-        self.CHANNELS = self.config_channels
-        self.RATE = self.config_sample_rate
-        # RECORD_SECONDS será definido dinámicamente desde self.record_duration
-        
-        # Variables de estado - Inicializadas desde config.ini
-        self.is_recording = False
-        self.audio = None
-        self.threshold_db = self.config_threshold_db
-        self.record_duration = self.config_record_seconds
+        super().__init__()
+        
+        # Variables de estado de la interfaz
+        self.result_hold_until = 0  # Hasta cuándo se mantiene visible el resultado del tramo
         self.current_volume_text = "0.0 dB"
-        self.status_text = "Detenido"
-        self.recordings_saved_count = 0
-        self.recordings_deleted_count = 0
         self.will_save_current_text = "Esperando..."  # Estado del tramo actual
-        self.current_max_volume = -60.0  # Volumen máximo del tramo actual
         
         # Variables para tracking de tiempo
         self.recording_start_time = 0  # Tiempo de inicio de la grabación actual
@@ -77,14 +68,9 @@ class AudioRecorder:
         # Variables para calidad de audio - Inicializadas desde config.ini
         self.sample_rate_text = str(self.config_sample_rate)
         self.bit_depth_text = str(self.config_bit_depth)
-        self.channels_mode_text = "Estéreo" if self.config_channels == 2 else "Mono"
+        self.channels_mode_text = self.channels_label(self.config_channels)
         self.selected_device_text = ""  # Dispositivo de audio seleccionado
-        self.audio_devices = []  # Lista de dispositivos disponibles
-        
-        # Directorio para guardar grabaciones - Desde config.ini
-        self.output_dir = self.config_output_dir
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        self.announce_device_probe = False  # Avisar al terminar la comprobación pedida por el usuario
             
         # Referencias a widgets Kivy (se asignarán en setup_ui)
         self.volume_bar = None
@@ -95,288 +81,6 @@ class AudioRecorder:
         self.recordings_deleted_label = None
         self.start_button = None
         self.stop_button = None
-            
-        self.refresh_audio_devices()  # Cargar dispositivos al inicializar
-        
-    def load_config(self):
-        """Carga la configuración desde el archivo config.ini"""
-        # Crear parser que no procese interpolación para evitar problemas con %
-        config = configparser.ConfigParser(interpolation=None)
-        config.optionxform = str  # Mantener case sensitivity
-        
-        # Valores por defecto si no existe el archivo o faltan secciones
-        defaults = {
-            'AUDIO': {
-                'RECORD_SECONDS': '30',
-                'SAMPLE_RATE': '44100',
-                'CHANNELS': '1',
-                'FORMAT': '16',
-                'CHUNK_SIZE': '1024'
-            },
-            'INTERFACE': {
-                'DEFAULT_THRESHOLD_DB': '-40.0',
-                'MIN_THRESHOLD_DB': '-60.0',
-                'MAX_THRESHOLD_DB': '0.0'
-            },
-            'STORAGE': {
-                'OUTPUT_DIRECTORY': 'grabaciones',
-                'FILENAME_FORMAT': 'grabacion_%Y%m%d_%H%M%S.wav'
-            },
-            'DISPLAY': {
-                'VOLUME_UPDATE_INTERVAL': '100',
-                'MIN_DISPLAY_DB': '-60'
-            }
-        }
-        
-        try:
-            if os.path.exists(self.config_file):
-                config.read(self.config_file, encoding='utf-8')
-                print(f"Configuración cargada desde {self.config_file}")
-            else:
-                print(f"Archivo {self.config_file} no encontrado, usando valores por defecto")
-                
-            # Función auxiliar para extraer solo el número de una cadena
-            def extract_number(value_str):
-                import re
-                # Buscar el primer número (entero o decimal) en la cadena
-                match = re.search(r'-?\d+\.?\d*', value_str)
-                return match.group(0) if match else value_str
-                
-            # Cargar valores de audio
-            record_seconds_str = config.get('AUDIO', 'RECORD_SECONDS', fallback=defaults['AUDIO']['RECORD_SECONDS'])
-            self.config_record_seconds = float(extract_number(record_seconds_str))
-            
-            sample_rate_str = config.get('AUDIO', 'SAMPLE_RATE', fallback=defaults['AUDIO']['SAMPLE_RATE'])
-            self.config_sample_rate = int(extract_number(sample_rate_str))
-            
-            channels_str = config.get('AUDIO', 'CHANNELS', fallback=defaults['AUDIO']['CHANNELS'])
-            self.config_channels = int(extract_number(channels_str))
-            
-            format_str = config.get('AUDIO', 'FORMAT', fallback=defaults['AUDIO']['FORMAT'])
-            format_bits = int(extract_number(format_str))
-            
-            chunk_str = config.get('AUDIO', 'CHUNK_SIZE', fallback=defaults['AUDIO']['CHUNK_SIZE'])
-            self.config_chunk_size = int(extract_number(chunk_str))
-            
-            # Convertir bits a formato PyAudio
-            if format_bits == 16:
-                self.config_format = pyaudio.paInt16
-                self.config_bit_depth = 16
-            elif format_bits == 24:
-                self.config_format = pyaudio.paInt24
-                self.config_bit_depth = 24
-            elif format_bits == 32:
-                self.config_format = pyaudio.paInt32
-                self.config_bit_depth = 32
-            else:
-                self.config_format = pyaudio.paInt16
-                self.config_bit_depth = 16
-                
-            # Cargar valores de interfaz
-            threshold_str = config.get('INTERFACE', 'DEFAULT_THRESHOLD_DB', fallback=defaults['INTERFACE']['DEFAULT_THRESHOLD_DB'])
-            self.config_threshold_db = float(extract_number(threshold_str))
-            
-            min_threshold_str = config.get('INTERFACE', 'MIN_THRESHOLD_DB', fallback=defaults['INTERFACE']['MIN_THRESHOLD_DB'])
-            self.config_min_threshold_db = float(extract_number(min_threshold_str))
-            
-            max_threshold_str = config.get('INTERFACE', 'MAX_THRESHOLD_DB', fallback=defaults['INTERFACE']['MAX_THRESHOLD_DB'])
-            self.config_max_threshold_db = float(extract_number(max_threshold_str))
-            
-            # Cargar valores de almacenamiento
-            self.config_output_dir = config.get('STORAGE', 'OUTPUT_DIRECTORY', fallback=defaults['STORAGE']['OUTPUT_DIRECTORY'])
-            # Eliminar comillas si las tiene
-            self.config_output_dir = self.config_output_dir.strip('"\'')
-            
-            self.config_filename_format = config.get('STORAGE', 'FILENAME_FORMAT', fallback=defaults['STORAGE']['FILENAME_FORMAT'])
-            self.config_filename_format = self.config_filename_format.strip('"\'')
-            
-            # Cargar valores de display
-            volume_update_str = config.get('DISPLAY', 'VOLUME_UPDATE_INTERVAL', fallback=defaults['DISPLAY']['VOLUME_UPDATE_INTERVAL'])
-            self.config_volume_update_interval = int(extract_number(volume_update_str))
-            
-            min_display_str = config.get('DISPLAY', 'MIN_DISPLAY_DB', fallback=defaults['DISPLAY']['MIN_DISPLAY_DB'])
-            self.config_min_display_db = float(extract_number(min_display_str))
-            
-            print(f"Configuración aplicada: {self.config_sample_rate}Hz, {self.config_bit_depth}bit, {self.config_channels}ch, Umbral: {self.config_threshold_db}dB")
-            
-        except Exception as e:
-            print(f"Error cargando configuración: {e}")
-            # Usar valores por defecto en caso de error
-            self.config_record_seconds = 30
-            self.config_sample_rate = 44100
-            self.config_channels = 1
-            self.config_format = pyaudio.paInt16
-            self.config_bit_depth = 16
-            self.config_chunk_size = 1024
-            self.config_threshold_db = -40.0
-            self.config_min_threshold_db = -60.0
-            self.config_max_threshold_db = 0.0
-            self.config_output_dir = "grabaciones"
-            self.config_filename_format = "grabacion_%Y%m%d_%H%M%S.wav"
-            self.config_volume_update_interval = 100
-            self.config_min_display_db = -60
-            
-    def save_config(self, show_messages=False):
-        """Guarda la configuración actual en el archivo config.ini"""
-        config = configparser.ConfigParser()
-        
-        # Crear secciones
-        config.add_section('AUDIO')
-        config.add_section('INTERFACE')
-        config.add_section('STORAGE')
-        config.add_section('DISPLAY')
-        
-        try:
-            # Guardar valores actuales
-            config.set('AUDIO', 'RECORD_SECONDS', str(int(self.record_duration)))
-            config.set('AUDIO', 'SAMPLE_RATE', str(self.RATE))
-            config.set('AUDIO', 'CHANNELS', str(self.CHANNELS))
-            config.set('AUDIO', 'FORMAT', str(self.config_bit_depth))
-            config.set('AUDIO', 'CHUNK_SIZE', str(self.CHUNK))
-            
-            config.set('INTERFACE', 'DEFAULT_THRESHOLD_DB', str(self.threshold_db))
-            config.set('INTERFACE', 'MIN_THRESHOLD_DB', str(self.config_min_threshold_db))
-            config.set('INTERFACE', 'MAX_THRESHOLD_DB', str(self.config_max_threshold_db))
-            
-            config.set('STORAGE', 'OUTPUT_DIRECTORY', f'"{self.output_dir}"')
-            # Escapar los % para evitar problemas con interpolación
-            filename_format_escaped = self.config_filename_format.replace('%', '%%')
-            config.set('STORAGE', 'FILENAME_FORMAT', f'"{filename_format_escaped}"')
-            
-            config.set('DISPLAY', 'VOLUME_UPDATE_INTERVAL', str(self.config_volume_update_interval))
-            config.set('DISPLAY', 'MIN_DISPLAY_DB', str(self.config_min_display_db))
-            
-            # Escribir al archivo con comentarios personalizados
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                f.write("# Configuración del Grabador de Audio\n")
-                f.write("# Este archivo permite personalizar algunos aspectos del grabador\n\n")
-                
-                f.write("[AUDIO]\n")
-                f.write(f"# Duración de cada grabación en segundos\n")
-                f.write(f"RECORD_SECONDS = {int(self.record_duration)}\n\n")
-                
-                f.write(f"# Calidad de audio\n")
-                f.write(f"SAMPLE_RATE = {self.RATE}  # Hz\n")
-                f.write(f"CHANNELS = {self.CHANNELS}  # 1 = mono, 2 = estéreo\n")
-                f.write(f"FORMAT = {self.config_bit_depth}  # bits\n\n")
-                
-                f.write(f"# Tamaño del buffer\n")
-                f.write(f"CHUNK_SIZE = {self.CHUNK}\n\n")
-                
-                f.write("[INTERFACE]\n")
-                f.write(f"# Umbral por defecto en decibelios\n")
-                f.write(f"DEFAULT_THRESHOLD_DB = {self.threshold_db}\n\n")
-                
-                f.write(f"# Rango del slider de umbral\n")
-                f.write(f"MIN_THRESHOLD_DB = {self.config_min_threshold_db}\n")
-                f.write(f"MAX_THRESHOLD_DB = {self.config_max_threshold_db}\n\n")
-                
-                f.write("[STORAGE]\n")
-                f.write(f"# Directorio donde guardar las grabaciones\n")
-                f.write(f'OUTPUT_DIRECTORY = "{self.output_dir}"\n\n')
-                
-                f.write(f"# Formato del nombre de archivo (usando strftime)\n")
-                f.write(f'FILENAME_FORMAT = "{self.config_filename_format}"\n\n')
-                
-                f.write("[DISPLAY]\n")
-                f.write(f"# Actualización del monitor de volumen (milisegundos)\n")
-                f.write(f"VOLUME_UPDATE_INTERVAL = {self.config_volume_update_interval}\n\n")
-                
-                f.write(f"# Limitar el nivel mínimo de dB mostrado\n")
-                f.write(f"MIN_DISPLAY_DB = {self.config_min_display_db}\n")
-                
-            if show_messages:
-                print(f"Configuración guardada en {self.config_file}")
-            
-        except Exception as e:
-            print(f"Error guardando configuración: {e}")
-            if show_messages:
-                self.show_message("Error", f"No se pudo guardar la configuración: {str(e)}", "error")
-        
-    def refresh_audio_devices(self):
-        """Obtiene la lista de dispositivos de audio de entrada disponibles y los valida"""
-        try:
-            # Inicializar PyAudio temporalmente para obtener dispositivos
-            temp_audio = pyaudio.PyAudio()
-            
-            self.audio_devices = []
-            device_names = []
-            
-            # Configuración de prueba estándar (más compatible)
-            test_format = pyaudio.paInt16
-            test_channels = 1
-            test_rate = 44100
-            
-            # Obtener información de todos los dispositivos
-            for i in range(temp_audio.get_device_count()):
-                try:
-                    device_info = temp_audio.get_device_info_by_index(i)
-                    
-                    # Solo dispositivos de entrada (micrófonos)
-                    if device_info['maxInputChannels'] > 0:
-                        # Probar si el dispositivo es compatible con nuestra configuración estándar
-                        is_compatible = False
-                        try:
-                            # Intentar abrir el dispositivo con configuración estándar
-                            test_stream = temp_audio.open(
-                                format=test_format,
-                                channels=min(test_channels, device_info['maxInputChannels']),
-                                rate=int(device_info['defaultSampleRate']) if device_info['defaultSampleRate'] > 0 else test_rate,
-                                input=True,
-                                input_device_index=i,
-                                frames_per_buffer=1024
-                            )
-                            test_stream.close()
-                            is_compatible = True
-                        except Exception as e:
-                            print(f"Dispositivo {device_info['name']} no compatible: {e}")
-                            is_compatible = False
-                        
-                        if is_compatible:
-                            device_name = f"{device_info['name']} (ID: {i})"
-                            device_names.append(device_name)
-                            self.audio_devices.append({
-                                'index': i,
-                                'name': device_info['name'],
-                                'display_name': device_name,
-                                'channels': min(device_info['maxInputChannels'], 2),  # Limitar a máximo 2 canales
-                                'sample_rate': int(device_info['defaultSampleRate']) if device_info['defaultSampleRate'] > 0 else 44100
-                            })
-                            
-                except Exception as e:
-                    print(f"Error evaluando dispositivo {i}: {e}")
-                    continue
-            
-            temp_audio.terminate()
-            
-            # Establecer el dispositivo por defecto si hay dispositivos disponibles
-            if self.audio_devices:
-                self.selected_device_name = self.audio_devices[0]['display_name']
-            else:
-                # Añadir dispositivo por defecto si no se encuentra ninguno compatible
-                self.audio_devices.append({
-                    'index': None,
-                    'name': 'Dispositivo por defecto',
-                    'display_name': 'Dispositivo por defecto del sistema',
-                    'channels': 1,
-                    'sample_rate': 44100
-                })
-                device_names.append('Dispositivo por defecto del sistema')
-                self.selected_device_name = 'Dispositivo por defecto del sistema'
-            
-            return device_names
-            
-        except Exception as e:
-            print(f"Error obteniendo dispositivos de audio: {e}")
-            # Configuración de emergencia
-            self.audio_devices = [{
-                'index': None,
-                'name': 'Dispositivo por defecto',
-                'display_name': 'Dispositivo por defecto del sistema',
-                'channels': 1,
-                'sample_rate': 44100
-            }]
-            return ["Dispositivo por defecto del sistema"]
         
     def setup_ui(self):
         """Configura la interfaz de usuario en Kivy"""
@@ -617,6 +321,35 @@ class AudioRecorder:
         )
         popup.open()
         
+    def notify(self, title, message, message_type="info"):
+        """Muestra el mensaje en un popup desde el hilo principal de Kivy"""
+        Clock.schedule_once(lambda dt: self.show_message(title, message, message_type))
+        
+    def set_status(self, status_text):
+        """Actualiza el estado y su etiqueta desde el hilo principal de Kivy"""
+        super().set_status(status_text)
+        if hasattr(self, 'status_label'):
+            Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', status_text))
+        
+    def on_segment_result(self, kept, max_volume):
+        """Muestra si el tramo se ha guardado o eliminado"""
+        if kept:
+            self.show_segment_result(f"GUARDADA ({max_volume:.1f} dB)", (0, 1, 0, 1))
+        else:
+            self.show_segment_result(f"ELIMINADA ({max_volume:.1f} dB)", (1, 0, 0, 1))
+        
+    def on_devices_updated(self, device_names, finished=True):
+        """Actualiza el selector de micrófono con cada dispositivo comprobado en segundo plano"""
+        def update_spinner(dt):
+            if getattr(self, 'device_spinner', None) is not None:
+                self.device_spinner.values = device_names
+            if finished and self.announce_device_probe:
+                self.announce_device_probe = False
+                self.show_message("Dispositivos actualizados",
+                                  f"Se encontraron {len(device_names)} dispositivos de entrada",
+                                  "info")
+        Clock.schedule_once(update_spinner)
+        
     def on_threshold_change(self, instance, value):
         """Actualiza el valor del umbral cuando cambia el slider"""
         self.threshold_db = value
@@ -711,7 +444,7 @@ class AudioRecorder:
         channels_layout.add_widget(Label(text="Canales:", size_hint_x=0.4))
         self.channels_spinner = Spinner(
             text=self.channels_mode_text,
-            values=["Mono", "Estéreo"],
+            values=self.channel_options(),
             size_hint_x=0.6
         )
         channels_layout.add_widget(self.channels_spinner)
@@ -747,10 +480,11 @@ class AudioRecorder:
     def refresh_devices_popup(self, instance=None):
         """Refresca los dispositivos en el popup"""
         try:
-            device_names = self.refresh_audio_devices()
+            # La comprobación sigue en segundo plano; el resultado se avisa al terminar
+            self.announce_device_probe = True
+            device_names = self.refresh_audio_devices(force_probe=True)
             if hasattr(self, 'device_spinner'):
                 self.device_spinner.values = device_names
-            self.show_message("Dispositivos actualizados", f"Se encontraron {len(device_names)} dispositivos")
         except Exception as e:
             self.show_message("Error", f"Error refrescando dispositivos: {str(e)}")
         
@@ -930,10 +664,8 @@ class AudioRecorder:
         # Guardar configuración
         self.save_config(show_messages=False)
         
-        # Cerrar PyAudio si está abierto
-        if hasattr(self, 'audio') and self.audio:
-            self.audio.terminate()
-            self.audio = None
+        # Cerrar PyAudio
+        self.backend.terminate()
         
         # Cerrar la aplicación
         import sys
@@ -942,18 +674,10 @@ class AudioRecorder:
     def refresh_devices_modal(self, combo_widget):
         """Refresca los dispositivos en el modal de audio"""
         try:
-            device_names = self.refresh_audio_devices()
+            self.announce_device_probe = True
+            device_names = self.refresh_audio_devices(force_probe=True)
             combo_widget['values'] = device_names
             self.update_device_list()
-            
-            if device_names and device_names[0] != "Error obteniendo dispositivos":
-                self.show_message("Dispositivos actualizados", 
-                                  f"Se encontraron {len(device_names)} dispositivos de entrada",
-                                  "info")
-            else:
-                self.show_message("Sin dispositivos", 
-                                     "No se encontraron dispositivos de entrada disponibles",
-                                     "warning")
         except Exception as e:
             self.show_message("Error", f"Error refrescando dispositivos: {str(e)}", "error")
             
@@ -1006,6 +730,32 @@ class AudioRecorder:
         """Actualiza la etiqueta de duración cuando cambia el slider (mantener para compatibilidad)"""
         pass  # No se usa en la nueva interfaz, pero se mantiene para evitar errores
         
+    def channels_label(self, channels):
+        """Texto del selector de canales para un número de canales"""
+        if channels == 1:
+            return "Mono"
+        if channels == 2:
+            return "Estéreo"
+        return f"{channels} canales"
+        
+    def channels_from_label(self, text):
+        """Número de canales a partir del texto del selector"""
+        if text == "Estéreo":
+            return 2
+        match = re.match(r'\d+', text)
+        return int(match.group(0)) if match else 1
+        
+    def channel_options(self):
+        """Opciones del selector de canales hasta el máximo del dispositivo seleccionado"""
+        max_channels = 2
+        device_index = self.get_selected_device_index()
+        for device in self.audio_devices:
+            if device['index'] == device_index:
+                max_channels = max(max_channels, device.get('channels', 1))
+                break
+        counts = sorted({c for c in self.PROBE_CHANNEL_COUNTS if c <= max_channels} | {max_channels})
+        return [self.channels_label(c) for c in counts]
+        
     def apply_audio_quality(self):
         """Aplica la configuración de calidad de audio con validación"""
         if self.is_recording:
@@ -1025,7 +775,7 @@ class AudioRecorder:
             # Configuración propuesta
             proposed_rate = int(self.sample_rate_text)
             proposed_bit_depth = int(self.bit_depth_text)
-            proposed_channels = 2 if self.channels_mode_text == "Estéreo" else 1
+            proposed_channels = self.channels_from_label(self.channels_mode_text)
             
             # Validar con el dispositivo seleccionado
             if selected_device_info:
@@ -1034,15 +784,12 @@ class AudioRecorder:
                 if proposed_channels > max_device_channels:
                     proposed_channels = max_device_channels
                     if hasattr(self, 'channels_spinner'):
-                        self.channels_spinner.text = "Mono" if proposed_channels == 1 else "Estéreo"
+                        self.channels_spinner.text = self.channels_label(proposed_channels)
                     self.show_message("Ajuste automático", 
                                          f"El dispositivo seleccionado solo soporta {max_device_channels} canal(es). "
-                                         f"Configurando a {'Mono' if proposed_channels == 1 else 'Estéreo'}.",
+                                         f"Configurando a {self.channels_label(proposed_channels)}.",
                                          "warning")
             
-            # Probar la configuración antes de aplicarla
-            test_audio = pyaudio.PyAudio()
-            
             # Determinar formato
             if proposed_bit_depth == 16:
                 test_format = pyaudio.paInt16
@@ -1053,19 +800,9 @@ class AudioRecorder:
             else:
                 test_format = pyaudio.paInt16  # Fallback
                 
-            try:
-                # Intentar abrir con la configuración propuesta
-                test_stream = test_audio.open(
-                    format=test_format,
-                    channels=proposed_channels,
-                    rate=proposed_rate,
-                    input=True,
-                    input_device_index=device_index,
-                    frames_per_buffer=1024
-                )
-                test_stream.close()
-                
-                # Si llegamos aquí, la configuración es válida
+            # Probar la configuración antes de aplicarla (o consultar la caché de dispositivos)
+            supported, error = self.check_input_format(device_index, test_format, proposed_channels, proposed_rate)
+            if supported:
                 self.RATE = proposed_rate
                 self.FORMAT = test_format
                 self.CHANNELS = proposed_channels
@@ -1078,9 +815,9 @@ class AudioRecorder:
                 else:
                     self.CHUNK = 1024
                     
-            except Exception as e:
+            else:
                 # Si falla, usar configuración segura
-                print(f"Configuración propuesta falló: {e}")
+                print(f"Configuración propuesta falló: {error}")
                 self.show_message("Configuración no soportada", 
                                      "La configuración seleccionada no es compatible. Usando configuración estándar segura.",
                                      "warning")
@@ -1098,12 +835,10 @@ class AudioRecorder:
                     self.bit_depth_spinner.text = "16"  
                 if hasattr(self, 'channels_spinner'):
                     self.channels_spinner.text = "Mono"
-                
-            test_audio.terminate()
             
             # Actualizar la información de calidad mostrada
             bit_depth_display = "16" if self.FORMAT == pyaudio.paInt16 else "24" if self.FORMAT == pyaudio.paInt24 else "32"
-            channels_text = 'Estéreo' if self.CHANNELS == 2 else 'Mono'
+            channels_text = self.channels_label(self.CHANNELS)
             self.quality_info_text = f"{self.RATE}Hz, {bit_depth_display}bit, {channels_text}"
             if hasattr(self, 'quality_info_label'):
                 self.quality_info_label.text = self.quality_info_text
@@ -1141,203 +876,54 @@ class AudioRecorder:
     def refresh_devices_ui(self):
         """Refresca la lista de dispositivos de audio en la interfaz (mantener para compatibilidad)"""
         try:
-            device_names = self.refresh_audio_devices()
+            self.announce_device_probe = True
+            self.refresh_audio_devices(force_probe=True)
             self.update_device_list()
-            
-            if device_names and device_names[0] != "Error obteniendo dispositivos":
-                self.show_message("Dispositivos actualizados", 
-                                  f"Se encontraron {len(device_names)} dispositivos de entrada",
-                                  "info")
-            else:
-                self.show_message("Sin dispositivos", 
-                                     "No se encontraron dispositivos de entrada disponibles",
-                                     "warning")
                                      
         except Exception as e:
             self.show_message("Error", f"Error refrescando dispositivos: {str(e)}", "error")
             
-    def get_selected_device_index(self):
-        """Obtiene el índice del dispositivo seleccionado"""
-        selected_name = self.selected_device_name if hasattr(self, 'selected_device_name') else ""
-        
-        for device in self.audio_devices:
-            if device['display_name'] == selected_name:
-                return device['index']
-                
-        return None  # Usar dispositivo por defecto si no se encuentra
-        
-    def calculate_db(self, audio_data):
-        """Calcula el nivel de volumen en decibelios con soporte para múltiples formatos"""
-        if len(audio_data) == 0:
-            return -60  # Silencio
-            
-        try:
-            # Determinar el tipo de datos y valor máximo según el formato
-            if self.FORMAT == pyaudio.paInt16:
-                audio_float = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)
-                max_val = 32767.0
-            elif self.FORMAT == pyaudio.paInt24:
-                # Para 24-bit, necesitamos procesamiento especial
-                audio_bytes = np.frombuffer(audio_data, dtype=np.uint8)
-                # Convertir de 3 bytes a int32
-                audio_int = np.zeros(len(audio_bytes) // 3, dtype=np.int32)
-                for i in range(len(audio_int)):
-                    # Little endian: byte0 + byte1*256 + byte2*65536
-                    audio_int[i] = (audio_bytes[i*3] + 
-                                   (audio_bytes[i*3+1] << 8) + 
-                                   (audio_bytes[i*3+2] << 16))
-                    # Convertir a signed
-                    if audio_int[i] >= 2**23:
-                        audio_int[i] -= 2**24
-                audio_float = audio_int.astype(np.float32)
-                max_val = 8388607.0  # 2^23 - 1
-            elif self.FORMAT == pyaudio.paInt32:
-                audio_float = np.frombuffer(audio_data, dtype=np.int32).astype(np.float32)
-                max_val = 2147483647.0  # 2^31 - 1
-            else:
-                # Fallback para otros formatos
-                audio_float = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)
-                max_val = 32767.0
-                
-            # Si es estéreo, calcular el RMS de ambos canales
-            if self.CHANNELS == 2 and len(audio_float) > 1:
-                # Separar canales izquierdo y derecho
-                left = audio_float[0::2]
-                right = audio_float[1::2]
-                # Calcular RMS de ambos canales y tomar el máximo
-                rms_left = np.sqrt(np.mean(left**2))
-                rms_right = np.sqrt(np.mean(right**2))
-                rms = max(rms_left, rms_right)
-            else:
-                # Calcular RMS normal
-                rms = np.sqrt(np.mean(audio_float**2))
-            
-            if rms == 0:
-                return -60  # Silencio
-                
-            # Convertir a decibelios
-            db = 20 * np.log10(rms / max_val)
-            
-            return max(db, -60)  # Limitar a -60 dB como mínimo
-            
-        except Exception as e:
-            print(f"Error calculando dB: {e}")
-            return -60  # Silencio en caso de error
-        
-    def record_audio_chunk(self):
-        """Graba un chunk de audio con duración configurable y manejo robusto de errores"""
-        try:
-            # Reiniciar el estado del tramo actual
-            self.current_max_volume = -60.0
-            self.update_current_status("Grabando...")
-            
-            # Obtener el índice del dispositivo seleccionado
-            device_index = self.get_selected_device_index()
-            
-            # Intentar abrir el stream con manejo de errores
-            stream = None
-            try:
-                stream = self.audio.open(format=self.FORMAT,
-                                       channels=self.CHANNELS,
-                                       rate=self.RATE,
-                                       input=True,
-                                       input_device_index=device_index,
-                                       frames_per_buffer=self.CHUNK)
-            except Exception as e:
-                print(f"Error abriendo stream con dispositivo específico: {e}")
-                # Intentar con dispositivo por defecto
-                try:
-                    stream = self.audio.open(format=self.FORMAT,
-                                           channels=self.CHANNELS,
-                                           rate=self.RATE,
-                                           input=True,
-                                           frames_per_buffer=self.CHUNK)
-                    print("Usando dispositivo por defecto")
-                except Exception as e2:
-                    print(f"Error abriendo stream con dispositivo por defecto: {e2}")
-                    # Último intento con configuración mínima
-                    try:
-                        stream = self.audio.open(format=pyaudio.paInt16,
-                                               channels=1,
-                                               rate=44100,
-                                               input=True,
-                                               frames_per_buffer=1024)
-                        print("Usando configuración de emergencia")
-                        # Actualizar configuración actual
-                        self.FORMAT = pyaudio.paInt16
-                        self.CHANNELS = 1
-                        self.RATE = 44100
-                        self.CHUNK = 1024
-                    except Exception as e3:
-                        raise Exception(f"No se pudo abrir ningún stream de audio: {e3}")
-            
-            if stream is None:
-                raise Exception("No se pudo crear el stream de audio")
-            
-            frames = []
-            max_volume_db = -60
-            record_seconds = self.record_duration
-            
-            # Inicializar el tiempo de inicio
-            import time as time_module
-            self.recording_start_time = time_module.time()
-            
-            # Calcular cuántos chunks necesitamos para la duración seleccionada
-            chunks_needed = int(self.RATE / self.CHUNK * record_seconds)
-            
-            for i in range(chunks_needed):
-                if not self.is_recording:
-                    break
-                    
-                try:
-                    data = stream.read(self.CHUNK, exception_on_overflow=False)
-                    frames.append(data)
-                    
-                    # Calcular tiempo transcurrido
-                    elapsed_time = time_module.time() - self.recording_start_time
-                    elapsed_seconds = int(elapsed_time)
-                    total_seconds = int(record_seconds)
-                    
-                    # Actualizar tiempo en la interfaz
-                    Clock.schedule_once(lambda dt: setattr(self, 'current_recording_time_text', f"{elapsed_seconds}/{total_seconds} seg") or 
-                                     (hasattr(self, 'current_recording_time_label') and setattr(self.current_recording_time_label, 'text', self.current_recording_time_text)))
-                    
-                    # Calcular volumen actual
-                    current_db = self.calculate_db(data)
-                    max_volume_db = max(max_volume_db, current_db)
-                    self.current_max_volume = max_volume_db
-                    
-                    # Actualizar UI en el hilo principal
-                    Clock.schedule_once(lambda dt: self.update_volume_display(current_db))
-                    Clock.schedule_once(lambda dt: self.update_current_status_by_volume())
-                    
-                except Exception as e:
-                    print(f"Error leyendo datos de audio: {e}")
-                    # Continuar con el siguiente chunk
-                    continue
-                
-            stream.stop_stream()
-            stream.close()
-            
-            return frames, max_volume_db
-            
-        except Exception as e:
-            print(f"Error en record_audio_chunk: {e}")
-            # Programar el mensaje de error para el hilo principal
-            Clock.schedule_once(lambda dt: self.show_message("Error de Grabación", 
-                               f"Error durante la grabación: {str(e)}\n\n"
-                               "Sugerencias:\n"
-                               "• Verificar que el micrófono esté conectado\n"
-                               "• Probar con configuración más simple (16-bit, Mono, 44.1kHz)\n"
-                               "• Seleccionar otro dispositivo de audio",
-                               "error"))
-            return None, -60
-            
-    def update_volume_display(self, db_level):
-        """Actualiza la visualización del volumen"""
-        self.current_volume_text = f"{db_level:.1f} dB"
-        if hasattr(self, 'current_volume_label'):
-            self.current_volume_label.text = self.current_volume_text
+    def refresh_ui(self, dt=None):
+        """Pinta el último estado publicado por el hilo de grabación (una vez por intervalo)"""
+        # En modo multidispositivo se muestra el nivel más alto de todos los dispositivos
+        self.collect_device_levels()
+        # Pico desde el último refresco, para no perder ruidos cortos entre dos refrescos
+        peak_db = self.display_peak_db
+        self.display_peak_db = -60.0
+        channel_peaks = self.display_channel_peak_db
+        self.display_channel_peak_db = None
+        self.update_volume_display(peak_db, channel_peaks)
+        self.update_current_status_by_volume()
+        
+        # Solo se asignan textos que han cambiado, para no forzar redibujados
+        time_text = f"{self.segment_elapsed_seconds}/{self.segment_total_seconds} seg"
+        if time_text != self.current_recording_time_text:
+            self.current_recording_time_text = time_text
+            if hasattr(self, 'current_recording_time_label'):
+                self.current_recording_time_label.text = time_text
+        
+        self.update_statistics_display()
+        
+    def update_statistics_display(self):
+        """Actualiza los contadores de grabaciones guardadas y eliminadas"""
+        if self.recordings_saved_label is not None:
+            saved_text = str(self.recordings_saved_count)
+            if self.recordings_saved_label.text != saved_text:
+                self.recordings_saved_label.text = saved_text
+        if self.recordings_deleted_label is not None:
+            deleted_text = str(self.recordings_deleted_count)
+            if self.recordings_deleted_label.text != deleted_text:
+                self.recordings_deleted_label.text = deleted_text
+        
+    def update_volume_display(self, db_level, channel_db=None):
+        """Actualiza la visualización del volumen y, con varios canales, el nivel de cada uno"""
+        volume_text = f"{db_level:.1f} dB"
+        if channel_db is not None and len(channel_db) > 1:
+            volume_text += "  [" + " ".join(f"{level:.0f}" for level in channel_db) + "]"
+        if volume_text != self.current_volume_text:
+            self.current_volume_text = volume_text
+            if hasattr(self, 'current_volume_label'):
+                self.current_volume_label.text = self.current_volume_text
         
         # Actualizar barra de progreso (convertir dB a porcentaje)
         # -60 dB = 0%, 0 dB = 100%
@@ -1353,7 +939,11 @@ class AudioRecorder:
         
     def update_current_status_by_volume(self):
         """Actualiza el estado del tramo actual basado en el volumen máximo detectado"""
-        if self.current_max_volume >= self.threshold_db:
+        # No sobrescribir el resultado del tramo anterior mientras se muestra
+        if time.time() < self.result_hold_until:
+            return
+            
+        if self.current_segment_passes():
             status_text = f"SE GUARDARÁ (Max: {self.current_max_volume:.1f} dB)"
             color = (0, 1, 0, 1)  # Verde
         else:
@@ -1365,149 +955,34 @@ class AudioRecorder:
             self.current_status_label.text = status_text
             self.current_status_label.color = color
         
-    def save_recording(self, frames, timestamp=None):
-        """Guarda la grabación en un archivo WAV con validación robusta"""
-        try:
-            # Generar nombre de archivo usando el formato de config.ini
-            if timestamp is None:
-                timestamp = datetime.now()
-            
-            # Usar el formato de nombre desde la configuración
-            if hasattr(self, 'config_filename_format'):
-                filename = timestamp.strftime(self.config_filename_format)
-            else:
-                filename = f"grabacion_{timestamp.strftime('%Y%m%d_%H%M%S')}.wav"
-                
-            filepath = os.path.join(self.output_dir, filename)
-            # Validar que tenemos frames para guardar
-            if not frames or len(frames) == 0:
-                print("No hay datos de audio para guardar")
-                return
-                
-            # Obtener información del formato actual
-            sample_width = self.audio.get_sample_size(self.FORMAT)
-            channels = self.CHANNELS
-            framerate = self.RATE
-            
-            print(f"Guardando audio: {channels} canales, {framerate}Hz, {sample_width} bytes por muestra")
-            
-            # Crear archivo WAV
-            wf = wave.open(filepath, 'wb')
-            wf.setnchannels(channels)
-            wf.setsampwidth(sample_width)
-            wf.setframerate(framerate)
-            
-            # Concatenar todos los frames
-            audio_data = b''.join(frames)
-            
-            # Validar que tenemos datos
-            if len(audio_data) == 0:
-                print("Datos de audio vacíos")
-                wf.close()
-                return
-            
-            # Escribir datos
-            wf.writeframes(audio_data)
-            wf.close()
-            
-            # Verificar que el archivo se creó correctamente
-            if os.path.exists(filepath) and os.path.getsize(filepath) > 44:  # 44 bytes = header WAV mínimo
-                self.recordings_saved_count += 1
-                print(f"Grabación guardada exitosamente: {filepath}")
-                print(f"Tamaño del archivo: {os.path.getsize(filepath)} bytes")
-            else:
-                print(f"Error: El archivo no se creó correctamente o está vacío")
-                
-        except Exception as e:
-            error_msg = f"Error al guardar la grabación: {str(e)}"
-            print(error_msg)
-            self.show_message("Error de Guardado", error_msg, "error")
-            
-            # Intentar crear un archivo de prueba con configuración básica
-            try:
-                print("Intentando guardar con configuración básica...")
-                wf = wave.open(filepath, 'wb')
-                wf.setnchannels(1)  # Mono
-                wf.setsampwidth(2)  # 16-bit = 2 bytes
-                wf.setframerate(44100)  # 44.1 kHz
-                
-                # Si los frames están en formato diferente, intentar convertir
-                if frames:
-                    audio_data = b''.join(frames)
-                    wf.writeframes(audio_data)
-                
-                wf.close()
-                print("Archivo guardado con configuración básica")
-                
-            except Exception as e2:
-                print(f"Error también con configuración básica: {e2}")
-                self.show_message("Error Crítico", 
-                                   f"No se pudo guardar el archivo de audio.\n"
-                                   f"Error original: {str(e)}\n"
-                                   f"Error de respaldo: {str(e2)}", 
-                                   "error")
-            
-    def recording_loop(self):
-        """Bucle principal de grabación"""
-        while self.is_recording:
-            timestamp = datetime.now()  # Pasar objeto datetime completo
-            
-            # Grabar con duración configurable
-            duration = self.record_duration
-            self.status_text = f"Grabando ({duration:.0f}s)..."
-            if hasattr(self, 'status_label'):
-                Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', self.status_text))
-            frames, max_volume = self.record_audio_chunk()
-            
-            if frames is None:
-                break
-                
-            # Verificar si el volumen superó el umbral
-            threshold = self.threshold_db
-            
-            if max_volume >= threshold:
-                # Guardar la grabación
-                self.save_recording(frames, timestamp)
-                self.status_text = f"Grabación guardada (Vol: {max_volume:.1f} dB)"
-                Clock.schedule_once(lambda dt: self.update_current_status(f"GUARDADA ({max_volume:.1f} dB)"))
-                if hasattr(self, 'current_status_label'):
-                    Clock.schedule_once(lambda dt: setattr(self.current_status_label, 'color', (0, 1, 0, 1)))
-            else:
-                # Descartar la grabación
-                self.recordings_deleted_count += 1
-                self.status_text = f"Grabación descartada (Vol: {max_volume:.1f} dB)"
-                Clock.schedule_once(lambda dt: self.update_current_status(f"ELIMINADA ({max_volume:.1f} dB)"))
-                if hasattr(self, 'current_status_label'):
-                    Clock.schedule_once(lambda dt: setattr(self.current_status_label, 'color', (1, 0, 0, 1)))
-                
-            # Pequeña pausa antes del siguiente ciclo
-            if self.is_recording:
-                # Resetear el contador de tiempo para mostrar que esperamos el próximo ciclo
-                duration_int = int(duration)
-                Clock.schedule_once(lambda dt: (
-                    setattr(self, 'current_recording_time_text', f"0/{duration_int} seg") or
-                    (hasattr(self, 'current_recording_time_label') and setattr(self.current_recording_time_label, 'text', self.current_recording_time_text))
-                ))
+    def show_segment_result(self, result_text, color):
+        """Muestra el resultado del tramo durante unos segundos sin pausar la grabación"""
+        # Mientras dure la retención, el estado en vivo no sobrescribe el resultado
+        self.result_hold_until = time.time() + self.RESULT_DISPLAY_SECONDS
+        
+        def show_result(dt):
+            self.update_current_status(result_text)
+            if hasattr(self, 'current_status_label'):
+                self.current_status_label.color = color
                 
-                time.sleep(2)  # Pausa un poco más larga para mostrar el resultado
-                Clock.schedule_once(lambda dt: self.update_current_status("Esperando..."))
-                if hasattr(self, 'current_status_label'):
-                    Clock.schedule_once(lambda dt: setattr(self.current_status_label, 'color', (0, 0, 0, 1)))
-                time.sleep(1)
+        Clock.schedule_once(show_result)
                 
     def start_recording(self, instance=None):
         """Inicia la grabación en bucle"""
         try:
-            self.audio = pyaudio.PyAudio()
-            self.is_recording = True
+            self.result_hold_until = 0
+            self.update_current_status("Grabando...")
+            
+            # Un único refresco periódico de la interfaz, independiente del tamaño de bloque
+            Clock.unschedule(self.refresh_ui)
+            Clock.schedule_interval(self.refresh_ui, self.config_volume_update_interval / 1000.0)
             
             # Deshabilitar botón de inicio y habilitar el de parar
             self.start_button.disabled = True
             self.stop_button.disabled = False
             
-            # Iniciar el hilo de grabación
-            self.recording_thread = threading.Thread(target=self.recording_loop, daemon=True)
-            self.recording_thread.start()
+            # Iniciar PyAudio y el hilo de grabación
+            super().start_recording()
             
         except Exception as e:
             self.show_message("Error", f"No se pudo iniciar la grabación: {str(e)}", "error")
@@ -1515,7 +990,7 @@ class AudioRecorder:
             
     def stop_recording(self, instance=None):
         """Detiene la grabación"""
-        self.is_recording = False
+        Clock.unschedule(self.refresh_ui)
         self.status_text = "Detenido"
         if hasattr(self, 'status_label'):
             self.status_label.text = self.status_text
@@ -1535,22 +1010,9 @@ class AudioRecorder:
         self.start_button.disabled = False
         self.stop_button.disabled = True
         
-        # Cerrar PyAudio
-        if self.audio:
-            self.audio.terminate()
-            self.audio = None
-            
-    def on_closing(self):
-        """Maneja el cierre de la aplicación y guarda la configuración"""
-        if self.is_recording:
-            self.stop_recording()
-        # Guardar configuración antes de cerrar
-        self.save_config(show_messages=False)
-        
-        # Cerrar PyAudio si está abierto
-        if hasattr(self, 'audio') and self.audio:
-            self.audio.terminate()
-            self.audio = None  # Sin mensajes al cerrar
+        # Detener el hilo de grabación, guardar lo pendiente y cerrar PyAudio
+        super().stop_recording()
+        self.update_statistics_display()
 
 if __name__ == "__main__":
     # Verificar dependencias
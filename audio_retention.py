@@ -0,0 +1,297 @@
+"""
+Límites de espacio y antigüedad del directorio de grabaciones.
+
+RetentionManager lleva la cuenta de las grabaciones del directorio de salida
+(tamaño, inicio y nivel de cada una) y borra las que sobran cuando se supera
+el tamaño máximo, cuando son más antiguas que la antigüedad máxima o cuando el
+disco se queda con menos espacio libre del mínimo. Se borran primero las más
+antiguas o las más silenciosas, según la política.
+
+El directorio se recorre una sola vez, en segundo plano, al empezar; después
+el grabador informa de cada grabación que guarda y el total se mantiene sin
+volver a recorrerlo. Este módulo no depende de Kivy ni de PyAudio.
+"""
+
+import collections
+import heapq
+import os
+import shutil
+import threading
+import time
+
+from audio_triage import analyze_wav
+
+RETENTION_POLICIES = ('oldest', 'quietest')
+
+# Extensiones que se consideran grabaciones (el resto de archivos no se toca)
+RECORDING_EXTENSIONS = ('.wav', '.flac', '.ogg', '.opus')
+
+
+class RetentionManager:
+    """Aplica los límites de retención en un hilo propio.
+
+    Las grabaciones se ordenan en dos montículos, por inicio y por nivel, con
+    borrado perezoso: una entrada que ya no está en el índice se ignora al
+    salir del montículo. make_room() se llama desde el hilo escritor antes de
+    guardar un tramo y libera espacio en el momento si el disco no tiene sitio
+    para él; el resto de límites los aplica el hilo de retención.
+    """
+
+    # Grabaciones borradas, o medidas, como máximo en cada pasada del hilo de retención
+    EVICT_BATCH = 64
+    MEASURE_BATCH = 16
+
+    def __init__(self, directory, max_bytes=0, max_age_seconds=0, min_free_bytes=0, policy='oldest',
+                 check_interval=60.0, chunk_frames=1024, load_levels=None, on_evicted=None, metrics=None):
+        if policy not in RETENTION_POLICIES:
+            raise ValueError(f"Política de retención no soportada: {policy}")
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.min_free_bytes = min_free_bytes
+        self.policy = policy
+        self.check_interval = max(1.0, check_interval)
+        self.chunk_frames = chunk_frames  # Bloque de medida de los WAV sin nivel conocido
+        self.load_levels = load_levels  # Devuelve {ruta: nivel máximo} de las grabaciones ya medidas
+        self.on_evicted = on_evicted  # Se llama con la ruta de cada grabación borrada
+        self.metrics = metrics
+        self.total_bytes = 0
+        self._entries = {}  # Ruta -> (tamaño, inicio en segundos epoch, nivel o None)
+        self._held = {}  # Grabaciones que aún se están codificando: no se pueden borrar
+        self._by_age = []
+        self._by_level = []
+        self._unmeasured = collections.deque()  # WAV encontrados al empezar cuyo nivel se desconoce
+        self._free_unreachable = False  # Si ya se avisó de que el mínimo libre no se puede alcanzar
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="Retencion", daemon=True)
+        self._thread.start()
+
+    def add(self, path, size, start, max_db=None, hold=False):
+        """Cuenta una grabación recién guardada; con hold, no se borra hasta rename() o release()"""
+        path = os.path.abspath(path)
+        with self._lock:
+            if hold:
+                self._forget(path)
+                self._held[path] = (size, start, max_db)
+                self.total_bytes += size
+            else:
+                self._track(path, size, start, max_db)
+        self._wake.set()
+
+    def rename(self, old_path, new_path, size):
+        """Sustituye una grabación por su versión codificada"""
+        old_path = os.path.abspath(old_path)
+        with self._lock:
+            entry = self._held.get(old_path) or self._entries.get(old_path)
+            if entry is None:
+                return
+            self._forget(old_path)
+            self._track(os.path.abspath(new_path), size, entry[1], entry[2])
+        self._wake.set()
+
+    def release(self, path):
+        """Permite borrar una grabación retenida con hold cuya codificación ha fallado"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._held.get(path)
+            if entry is None:
+                return
+            self._track(path, *entry)
+        self._wake.set()
+
+    def make_room(self, nbytes):
+        """Libera espacio antes de guardar nbytes, si el límite de tamaño o el disco lo exigen.
+
+        Como mucho borra EVICT_BATCH grabaciones, para no retener al hilo escritor;
+        el resto lo completa el hilo de retención.
+        """
+        with self._lock:
+            evicted = self._evict(extra_bytes=nbytes, limit=self.EVICT_BATCH)
+        if evicted >= self.EVICT_BATCH:
+            self._wake.set()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.check_interval + 1)
+
+    def _track(self, path, size, start, max_db):
+        self._forget(path)
+        self._entries[path] = (size, start, max_db)
+        self.total_bytes += size
+        heapq.heappush(self._by_age, (start, path))
+        # Sin nivel conocido se ordena como la más fuerte hasta que se mida
+        level = max_db if max_db is not None else float('inf')
+        heapq.heappush(self._by_level, (level, start, path))
+
+    def _forget(self, path):
+        entry = self._entries.pop(path, None) or self._held.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def _pop(self, heap):
+        """Saca la siguiente grabación vigente de un montículo"""
+        while heap:
+            item = heapq.heappop(heap)
+            path = item[-1]
+            entry = self._entries.get(path)
+            if entry is not None and entry[1] == item[-2]:
+                return path
+        return None
+
+    def _peek_age(self):
+        while self._by_age:
+            start, path = self._by_age[0]
+            entry = self._entries.get(path)
+            if entry is not None and entry[1] == start:
+                return start
+            heapq.heappop(self._by_age)
+        return None
+
+    def _free_bytes(self):
+        try:
+            return shutil.disk_usage(self.directory).free
+        except OSError:
+            return None
+
+    def _free_shortfall(self, extra_bytes):
+        """Bytes que faltan para dejar min_free_bytes libres tras guardar extra_bytes (0 si no falta nada)"""
+        if not self.min_free_bytes:
+            return 0
+        free = self._free_bytes()
+        if free is None:
+            return 0
+        return max(0, self.min_free_bytes + extra_bytes - free)
+
+    def _evictable_bytes(self):
+        """Bytes de las grabaciones que se pueden borrar (las retenidas no cuentan)"""
+        return self.total_bytes - sum(entry[0] for entry in self._held.values())
+
+    def _must_evict(self, extra_bytes):
+        """Indica si hay que borrar otra grabación para cumplir el tamaño máximo o el espacio libre"""
+        if self.max_bytes and self.total_bytes + extra_bytes > self.max_bytes:
+            return True
+        shortfall = self._free_shortfall(extra_bytes)
+        if not shortfall:
+            self._free_unreachable = False
+            return False
+        # El espacio libre depende de todo el disco: si ni borrando todas las grabaciones
+        # se llega al mínimo, el resto lo ocupan otros archivos y no se borra ninguna
+        if shortfall > self._evictable_bytes():
+            if self.metrics is not None:
+                self.metrics.increment('free_space_unreachable')
+            if not self._free_unreachable:
+                self._free_unreachable = True
+                print(f"Retención: faltan {shortfall / 1e6:.1f} MB libres en el disco y las grabaciones "
+                      f"solo ocupan {self._evictable_bytes() / 1e6:.1f} MB; no se borra ninguna")
+            return False
+        return True
+
+    def _evict(self, extra_bytes=0, limit=None):
+        """Borra grabaciones hasta cumplir los límites o llegar a limit; devuelve cuántas se borraron"""
+        evicted = 0
+        if self.max_age_seconds:
+            cutoff = time.time() - self.max_age_seconds
+            while limit is None or evicted < limit:
+                start = self._peek_age()
+                if start is None or start >= cutoff:
+                    break
+                evicted += self._delete(self._pop(self._by_age))
+        heap = self._by_age if self.policy == 'oldest' else self._by_level
+        while (limit is None or evicted < limit) and self._must_evict(extra_bytes):
+            path = self._pop(heap)
+            if path is None:
+                break
+            evicted += self._delete(path)
+        self._update_metrics()
+        return evicted
+
+    def _delete(self, path):
+        size = self._entries[path][0]
+        self._forget(path)
+        evicted = 0
+        try:
+            os.remove(path)
+            evicted = 1
+            print(f"Retención: borrada {path} ({size} bytes)")
+            if self.metrics is not None:
+                self.metrics.increment('files_evicted')
+                self.metrics.increment('bytes_evicted', size)
+        except FileNotFoundError:
+            pass  # Ya no existía: solo se corrige la cuenta
+        except OSError as e:
+            print(f"No se pudo borrar {path}: {e}")
+            if self.metrics is not None:
+                self.metrics.increment('evict_errors')
+            return 0
+        if self.on_evicted is not None:
+            self.on_evicted(path)
+        return evicted
+
+    def _update_metrics(self):
+        if self.metrics is not None:
+            self.metrics.set('tracked_bytes', self.total_bytes)
+            self.metrics.set('tracked_files', len(self._entries) + len(self._held))
+
+    def scan(self):
+        """Cuenta las grabaciones que ya hay en el directorio; se hace una sola vez al empezar"""
+        levels = {}
+        if self.load_levels is not None:
+            try:
+                levels = self.load_levels()
+            except Exception as e:
+                print(f"No se pudieron leer los niveles de las grabaciones: {e}")
+        found = 0
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                # Los WAV temporales de la escritura progresiva son ocultos
+                if name.startswith('.') or not name.lower().endswith(RECORDING_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    # Las que el grabador ya ha contado mientras tanto se respetan
+                    if path not in self._entries and path not in self._held:
+                        self._track(path, stat.st_size, stat.st_mtime, levels.get(path))
+                        found += 1
+                        if self.policy == 'quietest' and path not in levels and name.lower().endswith('.wav'):
+                            self._unmeasured.append(path)
+            if self._stop.is_set():
+                break
+        print(f"Retención: {found} grabaciones en {self.directory} ({self.total_bytes / 1e6:.1f} MB)")
+
+    def measure(self, count):
+        """Mide el nivel de algunas grabaciones encontradas al empezar que no estaban catalogadas"""
+        for _ in range(count):
+            if not self._unmeasured:
+                return
+            path = self._unmeasured.popleft()
+            # La lectura se hace sin el bloqueo: el hilo escritor puede seguir guardando
+            result = analyze_wav(path, self.chunk_frames)
+            if result['error'] is not None:
+                continue
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and entry[2] is None:
+                    self._entries[path] = (entry[0], entry[1], result['max_db'])
+                    heapq.heappush(self._by_level, (result['max_db'], entry[1], path))
+
+    def _run(self):
+        self.scan()
+        while not self._stop.is_set():
+            # Por tandas, soltando el bloqueo entre una y otra para no retener al hilo escritor
+            with self._lock:
+                evicted = self._evict(limit=self.EVICT_BATCH)
+            if evicted >= self.EVICT_BATCH:
+                continue
+            if self._unmeasured:
+                self.measure(self.MEASURE_BATCH)
+                continue
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
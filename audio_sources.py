@@ -0,0 +1,192 @@
+"""
+Orígenes de audio del grabador.
+
+Un origen abre streams de entrada con la interfaz de PyAudio (read,
+stop_stream, close), de modo que el bucle de grabación y el guardado
+funcionan igual con un micrófono, con un WAV reproducido o con una señal
+sintética. Los dos últimos permiten probar y medir todo el proceso sin
+hardware de audio, a la velocidad máxima o al ritmo del tiempo real.
+
+Este módulo no depende de Kivy ni de PyAudio: los formatos se indican por el
+ancho de muestra en bytes. El origen PyAudio está en audio_capture.
+"""
+
+import math
+import time
+import wave
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from audio_dsp import encode_pcm
+
+SOURCE_TYPES = ('pyaudio', 'file', 'synthetic')
+SIGNAL_TYPES = ('tone', 'noise', 'bursts')
+
+
+class AudioSource:
+    """Interfaz de un origen de audio.
+
+    stream_params devuelve el formato que el origen entregará realmente para
+    el formato pedido (un WAV impone el suyo) y open abre un stream con ese
+    formato. Los orígenes que abren dispositivos reales (is_device) pasan por
+    las alternativas y la caché de formatos del backend de PyAudio.
+    """
+
+    is_device = False
+    name = "origen"
+
+    def stream_params(self, sample_width, channels, rate):
+        """Formato (sample_width, channels, rate) que entregará el origen"""
+        return sample_width, channels, rate
+
+    def open(self, sample_width, channels, rate, frames_per_buffer, input_device_index=None, reserve_seconds=None):
+        raise NotImplementedError
+
+    def close(self):
+        """Libera los recursos del origen"""
+        pass
+
+
+class GeneratedStream:
+    """Stream que produce bloques bajo demanda, a la velocidad máxima o en tiempo real.
+
+    En tiempo real cada lectura espera hasta el instante en que el último
+    frame entregado se habría capturado, contado desde la primera lectura,
+    así que el ritmo no acumula deriva aunque los bloques varíen de tamaño.
+    """
+
+    def __init__(self, sample_width, channels, rate, realtime=True):
+        self.sample_width = sample_width
+        self.channels = channels
+        self.rate = rate
+        self.realtime = realtime
+        self.frames_delivered = 0
+        self._started_at = None
+        self.opened_at = datetime.now()
+
+    def generate(self, num_frames):
+        """Devuelve num_frames frames PCM; EOFError si el origen se ha agotado"""
+        raise NotImplementedError
+
+    def read(self, num_frames, exception_on_overflow=False):
+        """Lee num_frames frames; exception_on_overflow se acepta por compatibilidad con PyAudio"""
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        data = self.generate(num_frames)
+        self.frames_delivered += len(data) // (self.sample_width * self.channels)
+        if self.realtime:
+            delay = self._started_at + self.frames_delivered / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+    def media_time(self):
+        """Instante en que se habría capturado el siguiente frame, según el audio entregado"""
+        return self.opened_at + timedelta(seconds=self.frames_delivered / self.rate)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WavFileStream(GeneratedStream):
+    """Reproduce un WAV; al terminar vuelve al principio o lanza EOFError"""
+
+    def __init__(self, path, realtime=True, loop=False):
+        self._wav = wave.open(path, 'rb')
+        super().__init__(self._wav.getsampwidth(), self._wav.getnchannels(), self._wav.getframerate(), realtime)
+        self.loop = loop
+        self.frame_bytes = self.sample_width * self.channels
+
+    def generate(self, num_frames):
+        data = self._wav.readframes(num_frames)
+        while self.loop and len(data) < num_frames * self.frame_bytes:
+            # Completar el bloque desde el principio del archivo
+            self._wav.rewind()
+            more = self._wav.readframes(num_frames - len(data) // self.frame_bytes)
+            if not more:
+                break
+            data += more
+        if not data:
+            raise EOFError("Fin del archivo de audio")
+        return data
+
+    def close(self):
+        self._wav.close()
+
+
+class SyntheticStream(GeneratedStream):
+    """Genera un tono, ruido o ráfagas de tono sobre un ruido de fondo.
+
+    Los niveles son RMS en dBFS, como los mide LevelMeter: un tono a -20 dB
+    se ve a -20 dB en el medidor. En modo 'bursts' el tono suena
+    burst_seconds al principio de cada intervalo de burst_interval segundos y
+    el resto del tiempo solo queda el ruido de fondo a noise_db.
+    """
+
+    def __init__(self, sample_width, channels, rate, realtime=True, signal='bursts', level_db=-20.0,
+                 noise_db=-70.0, frequency=440.0, burst_seconds=1.0, burst_interval=5.0, seed=0):
+        super().__init__(sample_width, channels, rate, realtime)
+        if signal not in SIGNAL_TYPES:
+            raise ValueError(f"Señal sintética no soportada: {signal}")
+        self.signal = signal
+        # Amplitud de pico de un seno con ese RMS y desviación típica del ruido
+        self.tone_amplitude = math.sqrt(2.0) * 10.0 ** (level_db / 20.0)
+        self.noise_level = 10.0 ** ((level_db if signal == 'noise' else noise_db) / 20.0)
+        self.frequency = frequency
+        self.burst_frames = int(burst_seconds * rate)
+        self.interval_frames = max(1, int(burst_interval * rate))
+        self._rng = np.random.default_rng(seed)
+        self._position = 0  # Frames generados, para mantener la fase entre bloques
+
+    def generate(self, num_frames):
+        positions = np.arange(self._position, self._position + num_frames)
+        self._position += num_frames
+        samples = self._rng.standard_normal(num_frames) * self.noise_level
+        if self.signal != 'noise':
+            tone = self.tone_amplitude * np.sin(2.0 * math.pi * self.frequency / self.rate * positions)
+            if self.signal == 'bursts':
+                tone *= (positions % self.interval_frames) < self.burst_frames
+            samples += tone
+        # La misma señal en todos los canales
+        return encode_pcm(np.repeat(samples, self.channels), self.sample_width)
+
+
+class WavFileSource(AudioSource):
+    """Origen que reproduce un archivo WAV con su propio formato"""
+
+    name = "archivo"
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+
+    def stream_params(self, sample_width, channels, rate):
+        with wave.open(self.path, 'rb') as wav:
+            return wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+
+    def open(self, sample_width, channels, rate, frames_per_buffer, input_device_index=None, reserve_seconds=None):
+        return WavFileStream(self.path, realtime=self.realtime, loop=self.loop)
+
+
+class SyntheticSource(AudioSource):
+    """Origen que genera una señal de prueba con el formato pedido"""
+
+    name = "señal sintética"
+
+    def __init__(self, realtime=True, signal='bursts', level_db=-20.0, noise_db=-70.0, frequency=440.0,
+                 burst_seconds=1.0, burst_interval=5.0):
+        self.realtime = realtime
+        self.signal_options = dict(signal=signal, level_db=level_db, noise_db=noise_db, frequency=frequency,
+                                   burst_seconds=burst_seconds, burst_interval=burst_interval)
+        self.streams_opened = 0
+
+    def open(self, sample_width, channels, rate, frames_per_buffer, input_device_index=None, reserve_seconds=None):
+        # Cada stream usa otra semilla para que varias capturas no generen el mismo ruido
+        self.streams_opened += 1
+        return SyntheticStream(sample_width, channels, rate, realtime=self.realtime,
+                               seed=self.streams_opened, **self.signal_options)
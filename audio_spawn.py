@@ -0,0 +1,31 @@
+"""
+Arranque de procesos 'spawn' sin volver a ejecutar el módulo principal.
+
+Con 'spawn' cada proceso hijo ejecuta de nuevo el módulo __main__ del padre
+antes de su objetivo; si es la interfaz (audio_recorder.py) eso importa Kivy y
+crea su ventana en el hijo. Mientras se arranca un proceso, main_module_hidden()
+sustituye __main__ por este módulo, que solo usa la biblioteca estándar, de modo
+que el hijo importa únicamente lo que necesita su objetivo. Los datos de
+arranque se toman al crear el proceso, así que basta con restaurarlo al volver.
+
+Lo usan el proceso de captura y el pool de codificación.
+"""
+
+import contextlib
+import sys
+import threading
+
+# Serializa los arranques mientras __main__ está sustituido
+_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def main_module_hidden():
+    """Dentro del bloque, los procesos 'spawn' que se creen no cargan el módulo principal"""
+    with _lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
@@ -0,0 +1,374 @@
+"""
+Guardado de tramos de audio fuera del hilo de captura.
+
+Este módulo no depende de Kivy: el hilo de grabación solo entrega los tramos
+ya decididos y la escritura a disco se hace en un hilo propio.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from audio_dsp import decode_pcm
+from audio_spawn import main_module_hidden
+
+# Formatos de salida comprimidos: extensión, formato y subtipo de libsndfile
+COMPRESSED_FORMATS = {
+    'flac': ('.flac', 'FLAC', None),  # Sin pérdidas; el subtipo depende del ancho de muestra
+    'ogg': ('.ogg', 'OGG', 'VORBIS'),
+    'opus': ('.opus', 'OGG', 'OPUS'),
+}
+OUTPUT_FORMATS = ('wav',) + tuple(COMPRESSED_FORMATS)
+
+# Frecuencias admitidas por Opus; con otras se codifica en Vorbis
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Frames leídos por iteración al codificar, para no cargar el WAV completo
+ENCODE_BLOCK_FRAMES = 65536
+
+
+class Segment:
+    """Tramo de audio pendiente de guardar, con el formato con el que se capturó"""
+
+    def __init__(self, frames, timestamp, sample_width, channels, rate, max_db=None, partial_file=None,
+                 source=None, dropped_frames=0, zero_filled=False):
+        self.frames = frames  # Lista de bloques (bytes o memoryview)
+        self.partial_file = partial_file  # StreamingWavWriter si el tramo ya está en disco
+        self.source = source  # Grabador que lo capturó y lo guarda (varios comparten el escritor)
+        self.timestamp = timestamp
+        self.sample_width = sample_width
+        self.channels = channels
+        self.rate = rate
+        self.max_db = max_db
+        self.dropped_frames = dropped_frames  # Frames que la captura perdió dentro del tramo
+        self.zero_filled = zero_filled  # Si el audio perdido se sustituyó por silencio
+
+    @property
+    def nbytes(self):
+        if self.partial_file is not None:
+            return self.partial_file.bytes_written
+        return sum(len(frame) for frame in self.frames)
+
+
+def append_wav_comment(path, comment):
+    """Añade un comentario (chunk LIST/INFO ICMT) al final de un WAV ya cerrado.
+
+    Los lectores de WAV ignoran los chunks que no conocen, así que el audio no
+    cambia; solo se corrige el tamaño total en la cabecera RIFF.
+    """
+    text = comment.encode('utf-8') + b'\0'
+    if len(text) % 2:
+        text += b'\0'
+    info = b'INFO' + b'ICMT' + struct.pack('<I', len(text)) + text
+    chunk = b'LIST' + struct.pack('<I', len(info)) + info
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size % 2:
+            # Los chunks RIFF empiezan en posiciones pares
+            f.write(b'\0')
+            size += 1
+        f.write(chunk)
+        f.seek(4)
+        f.write(struct.pack('<I', size + len(chunk) - 8))
+
+
+def read_wav_comment(path):
+    """Devuelve el comentario ICMT de un WAV (el de append_wav_comment) o None"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        if f.read(12)[8:12] != b'WAVE':
+            return None
+        position = 12
+        while position + 8 <= size:
+            f.seek(position)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if chunk_id == b'LIST' and position + 8 + chunk_size <= size:
+                body = f.read(chunk_size)
+                if body[:4] == b'INFO':
+                    offset = 4
+                    while offset + 8 <= len(body):
+                        sub_id, sub_size = struct.unpack_from('<4sI', body, offset)
+                        if sub_id == b'ICMT':
+                            text = body[offset + 8:offset + 8 + sub_size]
+                            return text.rstrip(b'\0').decode('utf-8', errors='replace')
+                        offset += 8 + sub_size + (sub_size & 1)
+            # Los chunks ocupan un número par de bytes
+            position += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+class StreamingWavWriter:
+    """WAV temporal que se escribe mientras se graba el tramo.
+
+    El archivo se crea oculto dentro del directorio de salida, de modo que al
+    decidir el tramo basta con renombrarlo (commit) o borrarlo (discard): la
+    memoria usada no depende de la duración del tramo.
+    """
+
+    def __init__(self, directory, sample_width, channels, rate):
+        fd, self.temp_path = tempfile.mkstemp(prefix='.grabando_', suffix='.wav.part', dir=directory)
+        os.close(fd)
+        self.bytes_written = 0
+        self._wav = wave.open(self.temp_path, 'wb')
+        self.set_format(sample_width, channels, rate)
+
+    def set_format(self, sample_width, channels, rate):
+        """Ajusta el formato; solo es posible antes de escribir la primera muestra"""
+        self.sample_width = sample_width
+        self.channels = channels
+        self.rate = rate
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(sample_width)
+        self._wav.setframerate(rate)
+
+    def write(self, data):
+        self._wav.writeframesraw(data)
+        self.bytes_written += len(data)
+
+    def _close(self):
+        if self._wav is not None:
+            # Al cerrar, wave corrige la cabecera con el número real de frames
+            self._wav.close()
+            self._wav = None
+
+    def commit(self, final_path):
+        """Cierra el archivo y lo mueve a su nombre definitivo"""
+        self._close()
+        os.replace(self.temp_path, final_path)
+        return final_path
+
+    def discard(self):
+        """Cierra y elimina el archivo temporal"""
+        self._close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class SegmentWriter:
+    """Hilo escritor con cola acotada de tramos terminados.
+
+    Si la cola está llena, submit() contabiliza un evento de contrapresión y
+    espera como mucho submit_timeout segundos a que haya hueco. Esperar retiene
+    al hilo de captura, que mientras tanto acumula audio en el buffer del
+    dispositivo o del modo de captura; esperar sin límite acabaría perdiendo
+    audio en directo sin que constara en ningún sitio. Pasado el límite el
+    tramo se descarta (se borra su archivo temporal, si lo tiene) y se cuenta
+    en dropped_count. La cola acotada garantiza además que el buffer circular
+    no sobrescriba un tramo que aún no se ha escrito.
+    """
+
+    def __init__(self, write_segment, max_pending=2, submit_timeout=2.0, name="SegmentWriter"):
+        self.write_segment = write_segment
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._unfinished = 0
+        self._idle = threading.Condition()
+
+        # Estadísticas
+        self.segments_written = 0
+        self.write_errors = 0
+        self.backpressure_count = 0
+        self.dropped_count = 0
+        self.last_write_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Tramos encolados o en escritura"""
+        return self._unfinished
+
+    def submit(self, segment):
+        """Encola un tramo para escritura; devuelve False si se descartó por cola llena"""
+        with self._idle:
+            self._unfinished += 1
+        try:
+            self._queue.put_nowait(segment)
+            return True
+        except queue.Full:
+            self.backpressure_count += 1
+            print(f"Aviso: escritor de grabaciones saturado ({self.max_pending} tramos pendientes)")
+        try:
+            self._queue.put(segment, timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            print(f"Tramo descartado: el escritor no tuvo hueco en {self.submit_timeout:.1f} s")
+            if segment.partial_file is not None:
+                segment.partial_file.discard()
+            with self._idle:
+                self._unfinished -= 1
+                self._idle.notify_all()
+            return False
+
+    def flush(self, timeout=None):
+        """Espera a que se escriban todos los tramos pendientes"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Escribe lo pendiente y detiene el hilo escritor"""
+        flushed = self.flush(timeout)
+        self._queue.put(None)
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            segment = self._queue.get()
+            if segment is None:
+                break
+            start = time.perf_counter()
+            try:
+                self.write_segment(segment)
+                self.segments_written += 1
+            except Exception as e:
+                self.write_errors += 1
+                print(f"Error en el hilo escritor: {e}")
+            finally:
+                # No retener las vistas del último tramo: el buffer compartido no
+                # puede liberarse mientras queden vistas sobre él
+                segment = None
+                self.last_write_seconds = time.perf_counter() - start
+                with self._idle:
+                    self._unfinished -= 1
+                    self._idle.notify_all()
+
+
+def encode_recording(wav_path, output_format):
+    """Convierte un WAV guardado al formato comprimido indicado y borra el WAV.
+
+    Se ejecuta en un proceso del pool de codificación. Requiere el paquete
+    opcional soundfile (libsndfile).
+    """
+    import soundfile as sf
+
+    extension, container, subtype = COMPRESSED_FORMATS[output_format]
+    with wave.open(wav_path, 'rb') as src:
+        sample_width = src.getsampwidth()
+        channels = src.getnchannels()
+        rate = src.getframerate()
+
+        if output_format == 'opus' and rate not in OPUS_RATES:
+            print(f"Opus no admite {rate} Hz, codificando en Vorbis")
+            extension, container, subtype = COMPRESSED_FORMATS['ogg']
+        if subtype is None:
+            # FLAC admite como máximo 24 bits
+            subtype = 'PCM_16' if sample_width == 2 else 'PCM_24'
+
+        output_path = os.path.splitext(wav_path)[0] + extension
+        with sf.SoundFile(output_path, 'w', samplerate=rate, channels=channels,
+                          format=container, subtype=subtype) as dst:
+            while True:
+                data = src.readframes(ENCODE_BLOCK_FRAMES)
+                if not data:
+                    break
+                samples = decode_pcm(data, sample_width).reshape(-1, channels)
+                if sample_width == 3:
+                    # soundfile interpreta int32 a escala completa de 32 bits
+                    samples = samples << 8
+                dst.write(samples)
+
+    os.remove(wav_path)
+    return output_path
+
+
+def ignore_interrupts():
+    """Inicialización de los procesos de codificación.
+
+    Ctrl+C llega a todo el grupo de procesos: el cierre lo decide el proceso
+    principal, que aún encola los últimos tramos al detener la grabación.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class RecordingEncoder:
+    """Pool de codificación de grabaciones a formatos comprimidos.
+
+    Se usa un pool de procesos para repartir la codificación entre núcleos sin
+    competir por el GIL con el hilo de captura (la lectura del WAV y la
+    conversión de cada bloque son código Python). Los procesos se crean con
+    'spawn', no con fork desde un proceso con hilos (captura, escritor,
+    PortAudio), que puede heredar bloqueos tomados y colgarse. El pool crea
+    sus procesos al encolar, así que submit() encola con main_module_hidden
+    para que no carguen la interfaz Kivy.
+    """
+
+    def __init__(self, output_format, max_workers=None, on_encoded=None, on_failed=None):
+        self.output_format = output_format
+        self.on_encoded = on_encoded  # Se llama con (ruta del WAV, ruta codificada) al terminar cada una
+        self.on_failed = on_failed  # Se llama con la ruta del WAV que se conserva si la codificación falla
+        if max_workers is None:
+            # Dejar un núcleo libre para la captura
+            max_workers = max(1, (os.cpu_count() or 2) - 1)
+        self.max_workers = max_workers
+        self._executor = self._create_executor()
+        self.pending = 0
+        self.encoded_count = 0
+        self.failed_count = 0
+        self._lock = threading.Lock()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=ignore_interrupts)
+
+    def submit(self, wav_path):
+        """Encola la codificación de un WAV ya guardado"""
+        with self._lock:
+            self.pending += 1
+        try:
+            with main_module_hidden():
+                future = self._executor.submit(encode_recording, wav_path, self.output_format)
+        except BrokenProcessPool:
+            # Un proceso de codificación murió: este WAV se conserva y el pool se recrea
+            print(f"El pool de codificación dejó de funcionar; se conserva {wav_path} y se reinicia")
+            self._executor.shutdown(wait=False)
+            self._executor = self._create_executor()
+            with self._lock:
+                self.pending -= 1
+            self.failed_count += 1
+            if self.on_failed is not None:
+                self.on_failed(wav_path)
+            return None
+        future.add_done_callback(lambda f: self._done(f, wav_path))
+        return future
+
+    def _done(self, future, wav_path):
+        with self._lock:
+            self.pending -= 1
+        try:
+            output_path = future.result()
+            self.encoded_count += 1
+            print(f"Grabación codificada: {output_path}")
+            if self.on_encoded is not None:
+                self.on_encoded(wav_path, output_path)
+        except Exception as e:
+            # El WAV original se conserva si la codificación falla
+            self.failed_count += 1
+            print(f"Error codificando {wav_path} a {self.output_format}: {e}")
+            if self.on_failed is not None:
+                self.on_failed(wav_path)
+
+    def shutdown(self, wait=True):
+        """Termina las codificaciones pendientes y libera el pool"""
+        self._executor.shutdown(wait=wait)
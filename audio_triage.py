@@ -0,0 +1,230 @@
+"""
+Revisión en lote de un directorio de grabaciones ya guardadas.
+
+Vuelve a medir cada WAV con la misma métrica que usa el grabador para decidir
+si guarda un tramo (el mayor nivel RMS de un canal en un bloque de CHUNK_SIZE
+frames) y lo compara con un umbral nuevo. Los archivos por debajo del umbral
+se pueden listar, mover a otro directorio o borrar. Ejemplos:
+
+    python -m audio_triage grabaciones --threshold -35
+    python -m audio_triage grabaciones --threshold -35 --action move
+    python -m audio_triage grabaciones --threshold -35 --action delete --json
+
+Los archivos se leen mapeados en memoria por ventanas de bloques completos,
+sin cargarlos enteros, y se analizan en paralelo en un pool de procesos. Este
+módulo no depende de Kivy ni de PyAudio.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_dsp import chunk_power_stats, power_to_db
+
+TRIAGE_ACTIONS = ('report', 'move', 'delete')
+
+# Subdirectorio por defecto al que se mueven los archivos descartados
+DEFAULT_DISCARD_DIR = "descartadas"
+
+# Bloques por ventana mapeada: limita la memoria de cada proceso, no la lectura
+WINDOW_CHUNKS = 256
+
+# Formatos PCM enteros en la cabecera fmt (el segundo es WAVE_FORMAT_EXTENSIBLE)
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_layout(mm):
+    """Devuelve (sample_width, channels, rate, data_offset, data_size) de un WAV PCM mapeado.
+
+    Se recorren los chunks RIFF a mano en lugar de usar el módulo wave para
+    conocer la posición de los datos en el archivo. Si la cabecera indica un
+    tamaño de datos nulo o mayor que el archivo (una grabación interrumpida
+    antes de cerrar el WAV), se usa lo que haya hasta el final.
+    """
+    if len(mm) < 12 or mm[0:4] != b'RIFF' or mm[8:12] != b'WAVE':
+        raise ValueError("No es un archivo WAV")
+    position = 12
+    fmt = None
+    while position + 8 <= len(mm):
+        chunk_id = mm[position:position + 4]
+        chunk_size = struct.unpack_from('<I', mm, position + 4)[0]
+        body = position + 8
+        if chunk_id == b'fmt ':
+            format_tag, channels, rate = struct.unpack_from('<HHI', mm, body)
+            bits = struct.unpack_from('<H', mm, body + 14)[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                format_tag = struct.unpack_from('<H', mm, body + 24)[0]
+            if format_tag != WAVE_FORMAT_PCM or bits not in (16, 24, 32):
+                raise ValueError(f"Formato WAV no soportado (formato {format_tag}, {bits} bits)")
+            fmt = (bits // 8, channels, rate)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("Falta la cabecera fmt antes de los datos")
+            available = len(mm) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            return fmt + (body, chunk_size)
+        # Los chunks ocupan un número par de bytes
+        position = body + chunk_size + (chunk_size & 1)
+    raise ValueError("El archivo no contiene datos de audio")
+
+
+def analyze_wav(path, chunk_frames=1024):
+    """Mide un WAV y devuelve un diccionario con los niveles máximo y medio o el error.
+
+    Se ejecuta en los procesos del pool, así que solo recibe y devuelve
+    valores que se pueden serializar.
+    """
+    result = {'path': path, 'max_db': None, 'mean_db': None, 'seconds': None, 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("Archivo vacío")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                sample_width, channels, rate, offset, size = read_wav_layout(mm)
+                frame_bytes = sample_width * channels
+                size -= size % frame_bytes
+                # Las ventanas contienen bloques completos, para que los bloques
+                # coincidan con los que midió el grabador al capturar
+                window = chunk_frames * frame_bytes * WINDOW_CHUNKS
+                peak = 0.0
+                total = 0.0
+                count = 0
+                with memoryview(mm) as view:
+                    for start in range(offset, offset + size, window):
+                        end = min(start + window, offset + size)
+                        window_peak, window_total, window_count = chunk_power_stats(
+                            view[start:end], sample_width, channels, chunk_frames)
+                        peak = max(peak, window_peak)
+                        total += window_total
+                        count += window_count
+        result.update(max_db=round(power_to_db(peak), 2),
+                      mean_db=round(power_to_db(total / count if count else 0.0), 2),
+                      seconds=round(size / frame_bytes / rate, 3),
+                      channels=channels, rate=rate, bits=sample_width * 8)
+    except (OSError, ValueError, struct.error) as e:
+        result['error'] = str(e)
+    return result
+
+
+def find_recordings(directory, exclude=None):
+    """Lista los WAV del directorio y sus subdirectorios, en orden, y los archivos no analizables.
+
+    Los WAV temporales de la escritura progresiva (ocultos) no se incluyen;
+    los formatos comprimidos se devuelven aparte para informar de ellos.
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    wav_files = []
+    skipped = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude)
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            if name.lower().endswith('.wav'):
+                wav_files.append(path)
+            else:
+                skipped.append(path)
+    return wav_files, skipped
+
+
+def apply_action(path, action, directory, move_to):
+    """Mueve o borra un archivo descartado; devuelve el nuevo destino si se movió"""
+    if action == 'delete':
+        os.remove(path)
+        return None
+    if action == 'move':
+        # Se conserva la estructura de subdirectorios (por ejemplo, la de cada dispositivo)
+        target = os.path.join(move_to, os.path.relpath(path, directory))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+        return target
+    return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m audio_triage',
+                                     description="Revisa un directorio de grabaciones con un umbral nuevo")
+    parser.add_argument('directory', nargs='?', default='grabaciones',
+                        help="directorio de grabaciones (por defecto grabaciones)")
+    parser.add_argument('--threshold', type=float, required=True, help="umbral nuevo en dB")
+    parser.add_argument('--action', choices=TRIAGE_ACTIONS, default='report',
+                        help="qué hacer con los archivos por debajo del umbral (por defecto solo informar)")
+    parser.add_argument('--move-to', help=f"destino de --action move (por defecto DIRECTORIO/{DEFAULT_DISCARD_DIR})")
+    parser.add_argument('--chunk', type=int, default=1024,
+                        help="frames por bloque de medida; debe coincidir con CHUNK_SIZE (por defecto 1024)")
+    parser.add_argument('--workers', type=int, help="procesos de análisis (por defecto uno por núcleo)")
+    parser.add_argument('--json', action='store_true', help="escribir un resultado JSON por archivo")
+    parser.add_argument('--all', action='store_true', help="informar también de los archivos que se conservan")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.directory):
+        print(f"No existe el directorio {args.directory}", file=sys.stderr)
+        return 2
+    move_to = args.move_to or os.path.join(args.directory, DEFAULT_DISCARD_DIR)
+
+    def emit(record, text):
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+        else:
+            print(text, flush=True)
+
+    started = time.perf_counter()
+    wav_files, skipped = find_recordings(args.directory, exclude=move_to if args.action == 'move' else None)
+    for path in skipped:
+        emit({'path': path, 'status': 'skipped'}, f"[omitido] {path} (solo se analizan WAV)")
+
+    counts = {'kept': 0, 'discarded': 0, 'errors': 0}
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunks = [args.chunk] * len(wav_files)
+        # Los resultados llegan en orden; se procesan mientras se analizan los siguientes
+        for result in pool.map(analyze_wav, wav_files, chunks, chunksize=16):
+            path = result['path']
+            if result['error'] is not None:
+                counts['errors'] += 1
+                emit(dict(result, status='error'), f"[error] {path}: {result['error']}")
+                continue
+            total_bytes += os.path.getsize(path)
+            if result['max_db'] > args.threshold:
+                counts['kept'] += 1
+                if args.all:
+                    emit(dict(result, status='kept'), f"[conservar] {path} {result['max_db']:.1f} dB")
+                continue
+            counts['discarded'] += 1
+            status = {'report': 'below', 'move': 'moved', 'delete': 'deleted'}[args.action]
+            try:
+                target = apply_action(path, args.action, args.directory, move_to)
+            except OSError as e:
+                counts['errors'] += 1
+                emit(dict(result, status='error', error=str(e)), f"[error] {path}: {e}")
+                continue
+            record = dict(result, status=status)
+            if target:
+                record['moved_to'] = target
+            labels = {'below': "bajo el umbral", 'moved': f"movido a {target}", 'deleted': "borrado"}
+            emit(record, f"[descartar] {path} {result['max_db']:.1f} dB: {labels[status]}")
+
+    elapsed = time.perf_counter() - started
+    summary = dict(counts, skipped=len(skipped), threshold_db=args.threshold, action=args.action,
+                   seconds=round(elapsed, 2), mb_per_second=round(total_bytes / 1e6 / elapsed, 1) if elapsed > 0 else None)
+    emit(dict(summary, status='summary'),
+         f"Analizados {counts['kept'] + counts['discarded']} archivos en {elapsed:.1f} s: "
+         f"{counts['kept']} sobre el umbral, {counts['discarded']} por debajo, "
+         f"{counts['errors']} errores, {len(skipped)} omitidos")
+    return 1 if counts['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Caché persistente de la compatibilidad de los dispositivos de entrada.
+
+Abrir un stream de prueba en cada dispositivo puede tardar varios segundos en
+equipos con muchos dispositivos ALSA/PulseAudio. Los resultados se guardan en
+un archivo JSON indexado por una huella del dispositivo (API de audio, nombre
+y frecuencia por defecto), que no cambia aunque cambie el índice de PyAudio.
+
+Este módulo no depende de Kivy ni de PyAudio.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+def device_fingerprint(host_api_name, device_info):
+    """Huella estable de un dispositivo a partir de su información de PyAudio"""
+    rate = int(device_info['defaultSampleRate']) if device_info['defaultSampleRate'] > 0 else 0
+    return f"{host_api_name}|{device_info['name']}|{rate}"
+
+
+def format_key(rate, bit_depth, channels):
+    """Clave de una combinación de calidad de audio en la caché"""
+    return f"{rate}/{bit_depth}/{channels}"
+
+
+class DeviceProbeCache:
+    """Resultados de las pruebas de dispositivos, guardados en disco.
+
+    Por cada huella se guarda si el dispositivo abrió el stream de prueba y qué
+    combinaciones de frecuencia, bits y canales se han comprobado. También se
+    guarda el conjunto de huellas de la última enumeración: mientras no cambie,
+    los resultados se dan por válidos y no se abre ningún stream al arrancar.
+    Con path=None la caché solo se mantiene en memoria.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.devices = {}  # huella -> {'compatible': bool, 'formats': {clave: bool}, 'checked': epoch}
+        self.fingerprints = []  # Huellas de la última enumeración validada, ordenadas
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != self.VERSION:
+                print(f"Caché de dispositivos {self.path} de otra versión, se ignora")
+                return
+            self.devices = data.get('devices', {})
+            self.fingerprints = data.get('fingerprints', [])
+        except Exception as e:
+            print(f"Error leyendo la caché de dispositivos: {e}")
+            self.devices = {}
+            self.fingerprints = []
+
+    def save(self):
+        """Escribe la caché a disco de forma atómica"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                'version': self.VERSION,
+                'fingerprints': self.fingerprints,
+                'devices': self.devices,
+            }
+            temp_path = self.path + '.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Error guardando la caché de dispositivos: {e}")
+
+    def matches(self, fingerprints):
+        """True si el conjunto de dispositivos es el mismo que en la última validación"""
+        return sorted(fingerprints) == self.fingerprints
+
+    def set_fingerprints(self, fingerprints):
+        with self._lock:
+            self.fingerprints = sorted(fingerprints)
+
+    def is_compatible(self, fingerprint):
+        """True/False según la última prueba, o None si el dispositivo no se ha probado"""
+        entry = self.devices.get(fingerprint)
+        return None if entry is None else entry.get('compatible')
+
+    def set_compatible(self, fingerprint, compatible):
+        with self._lock:
+            entry = self.devices.setdefault(fingerprint, {'formats': {}})
+            if entry.get('compatible') != compatible:
+                # Si el resultado cambia, las combinaciones probadas dejan de ser fiables
+                entry['formats'] = {}
+            entry['compatible'] = compatible
+            entry['checked'] = int(time.time())
+
+    def format_supported(self, fingerprint, key):
+        """True/False si la combinación ya se probó en el dispositivo, o None"""
+        entry = self.devices.get(fingerprint)
+        return None if entry is None else entry.get('formats', {}).get(key)
+
+    def set_format_supported(self, fingerprint, key, supported):
+        with self._lock:
+            entry = self.devices.setdefault(fingerprint, {'formats': {}})
+            entry.setdefault('formats', {})[key] = supported
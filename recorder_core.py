@@ -0,0 +1,2192 @@
+"""
+Núcleo del grabador de audio, sin dependencias de Kivy.
+
+RecorderCore contiene la configuración, la captura, el análisis de volumen, el
+guardado de tramos y sus métricas. La interfaz gráfica (audio_recorder.AudioRecorder) y el
+modo sin interfaz (audio_cli) lo extienden redefiniendo notify, set_status y
+on_segment_result.
+"""
+
+import pyaudio
+import re
+import wave
+import threading
+import queue
+import time
+import os
+import sys
+from datetime import datetime, timedelta
+import configparser
+import errno
+import functools
+import sqlite3
+
+import numpy as np
+
+from audio_capture import SAMPLE_FORMATS, AudioBackend, PyAudioSource, SampleRing, TriggerSegmenter, insert_silence
+from audio_sources import SIGNAL_TYPES, SOURCE_TYPES, SyntheticSource, WavFileSource
+from audio_dsp import LevelMeter, chunk_power_stats, power_to_db
+from audio_metrics import Histogram, MetricsExporter, MetricsRegistry
+from audio_profiling import PROFILE_MODES, RecordingProfiler
+from audio_catalog import RecordingCatalog, format_time, recording_levels
+from audio_retention import RETENTION_POLICIES, RetentionManager
+from audio_triage import WINDOW_CHUNKS, analyze_wav
+from device_cache import DeviceProbeCache, device_fingerprint, format_key
+from audio_storage import (OUTPUT_FORMATS, RecordingEncoder, Segment, SegmentWriter, StreamingWavWriter,
+                           append_wav_comment)
+
+
+def peak_memory_mb():
+    """Memoria residente máxima del proceso en MB, o None si no se puede medir"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class RecorderCore:
+    # Tiempo máximo de espera al hilo de grabación al detener
+    STOP_TIMEOUT_SECONDS = 2
+    # Tramos terminados que pueden esperar en la cola del hilo escritor, y espera
+    # máxima de la captura por un hueco en ella antes de descartar el tramo
+    WRITER_QUEUE_SEGMENTS = 2
+    WRITER_SUBMIT_TIMEOUT_SECONDS = 2.0
+    # Errores de lectura seguidos tras los que se da el stream por perdido
+    MAX_CONSECUTIVE_READ_ERRORS = 50
+    # Pausa tras un error de lectura, para no girar en vacío con un dispositivo caído
+    READ_ERROR_BACKOFF_SECONDS = 0.01
+    # Pruebas de dispositivos simultáneas y tiempo máximo por dispositivo
+    DEVICE_PROBE_WORKERS = 4
+    DEVICE_PROBE_TIMEOUT_SECONDS = 5
+    # Frecuencias de la matriz de capacidades (las que ofrece la interfaz)
+    PROBE_SAMPLE_RATES = (44100, 48000, 96000)
+    # Número de canales que se prueban, además del máximo de cada dispositivo
+    PROBE_CHANNEL_COUNTS = (1, 2, 4, 6, 8)
+    # Si falla el dispositivo seleccionado, probar con el dispositivo por defecto
+    allow_default_device_fallback = True
+    
+    def __init__(self, config_file="config.ini"):
+        # Archivo de configuración
+        self.config_file = config_file
+        
+        # Cargar configuración desde archivo
+        self.load_config()
+        
+        # Configuración de audio - Cargada desde config.ini
+        self.CHUNK = self.config_chunk_size
+        self.FORMAT = self.config_format
+        self.CHANNELS = self.config_channels
+        self.RATE = self.config_sample_rate
+        # RECORD_SECONDS será definido dinámicamente desde self.record_duration
+        
+        # Variables de estado - Inicializadas desde config.ini
+        self.backend = AudioBackend()  # PyAudio inicializado durante toda la aplicación
+        self.audio_source = self.create_audio_source()  # Micrófono, WAV o señal sintética
+        self.segment_writer = None  # Hilo escritor que guarda los tramos fuera del hilo de captura
+        self.encoder = None  # Pool de codificación a FLAC/Opus (solo si OUTPUT_FORMAT no es wav)
+        self.device_pipelines = []  # Capturas por dispositivo en modo multidispositivo
+        self.stats_lock = threading.Lock()  # Contadores que actualizan varias capturas a la vez
+        self.metrics_registry = MetricsRegistry()  # Métricas de captura, análisis y guardado
+        self.metrics = self.metrics_registry.scope('main')
+        self.metrics_registry.add_collector(self.collect_metrics)
+        self.metrics_exporter = None  # Archivo JSON y servidor HTTP de métricas ([METRICS])
+        self.profiler = None  # Perfilado de la grabación en curso ([PROFILING]); None si está desactivado
+        self.catalog = None  # Catálogo SQLite de las grabaciones guardadas ([CATALOG])
+        self.retention = None  # Límites de tamaño y antigüedad del directorio de salida ([RETENTION])
+        self.threshold_db = self.config_threshold_db
+        self.record_duration = self.config_record_seconds
+        self.init_capture_state()
+        
+        self.selected_device_name = ""  # Dispositivo de audio seleccionado
+        self.audio_devices = []  # Lista de dispositivos disponibles
+        device_cache_path = None
+        if self.config_device_cache_file:
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            device_cache_path = os.path.join(config_dir, self.config_device_cache_file)
+        self.device_cache = DeviceProbeCache(device_cache_path)  # Resultados de pruebas de dispositivos
+        self.device_probe_thread = None  # Hilo que prueba los dispositivos en segundo plano
+        
+        # Directorio para guardar grabaciones - Desde config.ini
+        self.output_dir = self.config_output_dir
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+            
+        self.refresh_audio_devices()  # Cargar dispositivos al inicializar
+        
+    def init_capture_state(self):
+        """Inicializa el estado de la captura de un dispositivo"""
+        self.is_recording = False
+        self.audio = None  # Instancia de PyAudio del backend mientras se graba
+        self.recording_thread = None
+        self.stream = None  # Stream de entrada continuo, abierto durante toda la grabación
+        self.sample_ring = None  # Buffer circular preasignado donde se acumulan los tramos
+        self.level_meter = None  # Medidor de nivel con buffers de trabajo reutilizables
+        self.trigger_segmenter = None  # Estado de la segmentación por eventos
+        self.source_finished = False  # El origen de audio (un WAV) se ha agotado
+        self.closed_overflows = 0  # Desbordamientos y bloques perdidos de streams ya cerrados
+        self.closed_dropped_blocks = 0
+        self.stream_dropped_seen = 0  # Frames perdidos del stream actual ya contabilizados
+        self.capture_gaps = []  # Huecos (posición en el buffer, bytes, frames) del modo por eventos
+        self.segment_dropped_frames = 0  # Frames perdidos en el tramo actual
+        self.consecutive_read_errors = 0  # Lecturas fallidas seguidas del stream actual
+        # Métricas de cada bloque: contadores propios, sin el bloqueo del registro de
+        # métricas; collect_capture_metrics los publica al hacer cada instantánea
+        self.chunks_read_count = 0
+        self.frames_read_count = 0
+        self.chunk_processing_histogram = Histogram()
+        self.capture_backlog = None  # Frames capturados sin leer tras el último bloque
+        self.status_text = "Detenido"
+        self.recordings_saved_count = 0
+        self.recordings_deleted_count = 0
+        self.current_max_volume = -60.0  # Volumen máximo del tramo actual
+        
+        # Estado publicado por el hilo de grabación para quien lo muestre
+        self.display_peak_db = -60.0  # Pico de volumen desde la última lectura
+        self.segment_channel_max_db = None  # Nivel máximo de cada canal en el tramo actual
+        self.display_channel_peak_db = None  # Pico de cada canal desde la última lectura
+        self.segment_elapsed_seconds = 0
+        self.segment_total_seconds = int(self.record_duration)
+        
+    def load_config(self):
+        """Carga la configuración desde el archivo config.ini"""
+        # Crear parser que no procese interpolación para evitar problemas con %
+        config = configparser.ConfigParser(interpolation=None)
+        config.optionxform = str  # Mantener case sensitivity
+        
+        # Valores por defecto si no existe el archivo o faltan secciones
+        defaults = {
+            'AUDIO': {
+                'RECORD_SECONDS': '30',
+                'SAMPLE_RATE': '44100',
+                'CHANNELS': '1',
+                'FORMAT': '16',
+                'CHUNK_SIZE': '1024',
+                'CAPTURE_MODE': 'blocking',
+                'CAPTURE_QUEUE_SECONDS': '10',
+                'ZERO_FILL_DROPS': 'false',
+                'DEVICE_CACHE_FILE': 'device_cache.json',
+                'THRESHOLD_POLICY': 'any',
+                'CHANNEL_THRESHOLDS': ''
+            },
+            'INTERFACE': {
+                'DEFAULT_THRESHOLD_DB': '-40.0',
+                'MIN_THRESHOLD_DB': '-60.0',
+                'MAX_THRESHOLD_DB': '0.0'
+            },
+            'STORAGE': {
+                'OUTPUT_DIRECTORY': 'grabaciones',
+                'FILENAME_FORMAT': 'grabacion_%Y%m%d_%H%M%S.wav',
+                'STREAMING_WRITE': 'false',
+                'OUTPUT_FORMAT': 'wav'
+            },
+            'TRIGGER': {
+                'ENABLED': 'false',
+                'PRE_ROLL_SECONDS': '2',
+                'HANGOVER_SECONDS': '3',
+                'MAX_SEGMENT_SECONDS': '60'
+            },
+            'MULTI_DEVICE': {
+                'ENABLED': 'false',
+                'DEVICES': '',
+                'THRESHOLDS': ''
+            },
+            'SOURCE': {
+                'TYPE': 'pyaudio',
+                'REALTIME': 'true',
+                'FILE': '',
+                'LOOP': 'false',
+                'SIGNAL': 'bursts',
+                'LEVEL_DB': '-20',
+                'NOISE_DB': '-70',
+                'FREQUENCY': '440',
+                'BURST_SECONDS': '1',
+                'BURST_INTERVAL_SECONDS': '5'
+            },
+            'METRICS': {
+                'FILE': '',
+                'INTERVAL_SECONDS': '5',
+                'HTTP_HOST': '127.0.0.1',
+                'HTTP_PORT': '0'
+            },
+            'PROFILING': {
+                'ENABLED': 'false',
+                'MODE': 'sampling',
+                'SECONDS': '60',
+                'INTERVAL_MS': '5'
+            },
+            'CATALOG': {
+                'FILE': 'catalogo.sqlite',
+                'COMMIT_INTERVAL_SECONDS': '2'
+            },
+            'RETENTION': {
+                'MAX_SIZE_MB': '0',
+                'MAX_AGE_DAYS': '0',
+                'MIN_FREE_MB': '0',
+                'POLICY': 'oldest',
+                'CHECK_INTERVAL_SECONDS': '60'
+            },
+            'DISPLAY': {
+                'VOLUME_UPDATE_INTERVAL': '100',
+                'MIN_DISPLAY_DB': '-60'
+            }
+        }
+        
+        try:
+            if os.path.exists(self.config_file):
+                config.read(self.config_file, encoding='utf-8')
+                print(f"Configuración cargada desde {self.config_file}")
+            else:
+                print(f"Archivo {self.config_file} no encontrado, usando valores por defecto")
+                
+            # Función auxiliar para extraer solo el número de una cadena
+            def extract_number(value_str):
+                import re
+                # Buscar el primer número (entero o decimal) en la cadena
+                match = re.search(r'-?\d+\.?\d*', value_str)
+                return match.group(0) if match else value_str
+                
+            # Cargar valores de audio
+            record_seconds_str = config.get('AUDIO', 'RECORD_SECONDS', fallback=defaults['AUDIO']['RECORD_SECONDS'])
+            self.config_record_seconds = float(extract_number(record_seconds_str))
+            
+            sample_rate_str = config.get('AUDIO', 'SAMPLE_RATE', fallback=defaults['AUDIO']['SAMPLE_RATE'])
+            self.config_sample_rate = int(extract_number(sample_rate_str))
+            
+            channels_str = config.get('AUDIO', 'CHANNELS', fallback=defaults['AUDIO']['CHANNELS'])
+            self.config_channels = int(extract_number(channels_str))
+            
+            format_str = config.get('AUDIO', 'FORMAT', fallback=defaults['AUDIO']['FORMAT'])
+            format_bits = int(extract_number(format_str))
+            
+            chunk_str = config.get('AUDIO', 'CHUNK_SIZE', fallback=defaults['AUDIO']['CHUNK_SIZE'])
+            self.config_chunk_size = int(extract_number(chunk_str))
+            
+            # Motor de captura: 'blocking' (stream.read) o 'callback' (cola acotada)
+            capture_mode_str = config.get('AUDIO', 'CAPTURE_MODE', fallback=defaults['AUDIO']['CAPTURE_MODE'])
+            self.config_capture_mode = capture_mode_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_capture_mode not in ('blocking', 'callback', 'process'):
+                self.config_capture_mode = 'blocking'
+            
+            queue_seconds_str = config.get('AUDIO', 'CAPTURE_QUEUE_SECONDS', fallback=defaults['AUDIO']['CAPTURE_QUEUE_SECONDS'])
+            self.config_capture_queue_seconds = float(extract_number(queue_seconds_str))
+            
+            # Rellenar con silencio el audio perdido, para que la duración coincida con la real
+            zero_fill_str = config.get('AUDIO', 'ZERO_FILL_DROPS', fallback=defaults['AUDIO']['ZERO_FILL_DROPS'])
+            self.config_zero_fill_drops = zero_fill_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            # Caché de pruebas de dispositivos; vacío para desactivarla
+            device_cache_str = config.get('AUDIO', 'DEVICE_CACHE_FILE', fallback=defaults['AUDIO']['DEVICE_CACHE_FILE'])
+            self.config_device_cache_file = device_cache_str.split('#')[0].strip().strip('"\'')
+            
+            # Umbral por canal: 'any' (el canal más fuerte contra el umbral general) o
+            # 'per_channel' (cada canal contra su umbral de CHANNEL_THRESHOLDS)
+            policy_str = config.get('AUDIO', 'THRESHOLD_POLICY', fallback=defaults['AUDIO']['THRESHOLD_POLICY'])
+            self.config_threshold_policy = policy_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_threshold_policy not in ('any', 'per_channel'):
+                self.config_threshold_policy = 'any'
+            
+            channel_thresholds_str = config.get('AUDIO', 'CHANNEL_THRESHOLDS', fallback=defaults['AUDIO']['CHANNEL_THRESHOLDS'])
+            self.config_channel_thresholds = [float(extract_number(t)) for t in channel_thresholds_str.split('#')[0].strip().strip('"\'').split(',') if t.strip()]
+            
+            # Convertir bits a formato PyAudio
+            if format_bits == 16:
+                self.config_format = pyaudio.paInt16
+                self.config_bit_depth = 16
+            elif format_bits == 24:
+                self.config_format = pyaudio.paInt24
+                self.config_bit_depth = 24
+            elif format_bits == 32:
+                self.config_format = pyaudio.paInt32
+                self.config_bit_depth = 32
+            else:
+                self.config_format = pyaudio.paInt16
+                self.config_bit_depth = 16
+                
+            # Cargar valores de interfaz
+            threshold_str = config.get('INTERFACE', 'DEFAULT_THRESHOLD_DB', fallback=defaults['INTERFACE']['DEFAULT_THRESHOLD_DB'])
+            self.config_threshold_db = float(extract_number(threshold_str))
+            
+            min_threshold_str = config.get('INTERFACE', 'MIN_THRESHOLD_DB', fallback=defaults['INTERFACE']['MIN_THRESHOLD_DB'])
+            self.config_min_threshold_db = float(extract_number(min_threshold_str))
+            
+            max_threshold_str = config.get('INTERFACE', 'MAX_THRESHOLD_DB', fallback=defaults['INTERFACE']['MAX_THRESHOLD_DB'])
+            self.config_max_threshold_db = float(extract_number(max_threshold_str))
+            
+            # Cargar valores de almacenamiento
+            self.config_output_dir = config.get('STORAGE', 'OUTPUT_DIRECTORY', fallback=defaults['STORAGE']['OUTPUT_DIRECTORY'])
+            # Eliminar comillas si las tiene
+            self.config_output_dir = self.config_output_dir.strip('"\'')
+            
+            self.config_filename_format = config.get('STORAGE', 'FILENAME_FORMAT', fallback=defaults['STORAGE']['FILENAME_FORMAT'])
+            self.config_filename_format = self.config_filename_format.strip('"\'')
+            
+            # Escritura directa a disco mientras se graba cada tramo
+            streaming_str = config.get('STORAGE', 'STREAMING_WRITE', fallback=defaults['STORAGE']['STREAMING_WRITE'])
+            self.config_streaming_write = streaming_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            # Formato de salida: wav, flac (sin pérdidas), ogg u opus (con pérdidas)
+            output_format_str = config.get('STORAGE', 'OUTPUT_FORMAT', fallback=defaults['STORAGE']['OUTPUT_FORMAT'])
+            self.config_output_format = output_format_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_output_format not in OUTPUT_FORMATS:
+                print(f"Formato de salida desconocido '{self.config_output_format}', usando wav")
+                self.config_output_format = 'wav'
+            
+            # Cargar valores de grabación por eventos
+            trigger_enabled_str = config.get('TRIGGER', 'ENABLED', fallback=defaults['TRIGGER']['ENABLED'])
+            self.config_trigger_enabled = trigger_enabled_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            pre_roll_str = config.get('TRIGGER', 'PRE_ROLL_SECONDS', fallback=defaults['TRIGGER']['PRE_ROLL_SECONDS'])
+            self.config_pre_roll_seconds = float(extract_number(pre_roll_str))
+            
+            hangover_str = config.get('TRIGGER', 'HANGOVER_SECONDS', fallback=defaults['TRIGGER']['HANGOVER_SECONDS'])
+            self.config_hangover_seconds = float(extract_number(hangover_str))
+            
+            max_segment_str = config.get('TRIGGER', 'MAX_SEGMENT_SECONDS', fallback=defaults['TRIGGER']['MAX_SEGMENT_SECONDS'])
+            self.config_max_segment_seconds = float(extract_number(max_segment_str))
+            
+            # Cargar valores de grabación multidispositivo
+            multi_enabled_str = config.get('MULTI_DEVICE', 'ENABLED', fallback=defaults['MULTI_DEVICE']['ENABLED'])
+            self.config_multi_device_enabled = multi_enabled_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            # Índices o partes del nombre de los dispositivos, separados por comas
+            devices_str = config.get('MULTI_DEVICE', 'DEVICES', fallback=defaults['MULTI_DEVICE']['DEVICES'])
+            self.config_multi_devices = [d.strip() for d in devices_str.split('#')[0].strip().strip('"\'').split(',') if d.strip()]
+            
+            # Umbral de cada dispositivo en el mismo orden; si falta se usa el general
+            thresholds_str = config.get('MULTI_DEVICE', 'THRESHOLDS', fallback=defaults['MULTI_DEVICE']['THRESHOLDS'])
+            self.config_multi_thresholds = [float(extract_number(t)) for t in thresholds_str.split('#')[0].strip().strip('"\'').split(',') if t.strip()]
+            
+            # Origen del audio: 'pyaudio' (micrófono), 'file' (WAV) o 'synthetic' (señal de prueba)
+            source_type_str = config.get('SOURCE', 'TYPE', fallback=defaults['SOURCE']['TYPE'])
+            self.config_source_type = source_type_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_source_type not in SOURCE_TYPES:
+                self.config_source_type = 'pyaudio'
+            
+            realtime_str = config.get('SOURCE', 'REALTIME', fallback=defaults['SOURCE']['REALTIME'])
+            self.config_source_realtime = realtime_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            source_file_str = config.get('SOURCE', 'FILE', fallback=defaults['SOURCE']['FILE'])
+            self.config_source_file = source_file_str.split('#')[0].strip().strip('"\'')
+            
+            loop_str = config.get('SOURCE', 'LOOP', fallback=defaults['SOURCE']['LOOP'])
+            self.config_source_loop = loop_str.split('#')[0].strip().strip('"\'').lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            signal_str = config.get('SOURCE', 'SIGNAL', fallback=defaults['SOURCE']['SIGNAL'])
+            self.config_source_signal = signal_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_source_signal not in SIGNAL_TYPES:
+                self.config_source_signal = 'bursts'
+            
+            level_str = config.get('SOURCE', 'LEVEL_DB', fallback=defaults['SOURCE']['LEVEL_DB'])
+            self.config_source_level_db = float(extract_number(level_str))
+            
+            noise_str = config.get('SOURCE', 'NOISE_DB', fallback=defaults['SOURCE']['NOISE_DB'])
+            self.config_source_noise_db = float(extract_number(noise_str))
+            
+            frequency_str = config.get('SOURCE', 'FREQUENCY', fallback=defaults['SOURCE']['FREQUENCY'])
+            self.config_source_frequency = float(extract_number(frequency_str))
+            
+            burst_str = config.get('SOURCE', 'BURST_SECONDS', fallback=defaults['SOURCE']['BURST_SECONDS'])
+            self.config_source_burst_seconds = float(extract_number(burst_str))
+            
+            interval_str = config.get('SOURCE', 'BURST_INTERVAL_SECONDS', fallback=defaults['SOURCE']['BURST_INTERVAL_SECONDS'])
+            self.config_source_burst_interval = float(extract_number(interval_str))
+            
+            # Métricas de funcionamiento: archivo JSON (relativo a config.ini) y puerto HTTP local
+            metrics_file_str = config.get('METRICS', 'FILE', fallback=defaults['METRICS']['FILE'])
+            self.config_metrics_file = metrics_file_str.split('#')[0].strip().strip('"\'')
+            
+            metrics_interval_str = config.get('METRICS', 'INTERVAL_SECONDS', fallback=defaults['METRICS']['INTERVAL_SECONDS'])
+            self.config_metrics_interval = float(extract_number(metrics_interval_str))
+            
+            metrics_host_str = config.get('METRICS', 'HTTP_HOST', fallback=defaults['METRICS']['HTTP_HOST'])
+            self.config_metrics_http_host = metrics_host_str.split('#')[0].strip().strip('"\'') or '127.0.0.1'
+            
+            metrics_port_str = config.get('METRICS', 'HTTP_PORT', fallback=defaults['METRICS']['HTTP_PORT'])
+            self.config_metrics_http_port = int(extract_number(metrics_port_str))
+            
+            # Perfilado del grabador durante una ventana acotada
+            profiling_enabled_str = config.get('PROFILING', 'ENABLED', fallback=defaults['PROFILING']['ENABLED'])
+            self.config_profiling_enabled = profiling_enabled_str.split('#')[0].strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+            
+            profiling_mode_str = config.get('PROFILING', 'MODE', fallback=defaults['PROFILING']['MODE'])
+            self.config_profiling_mode = profiling_mode_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_profiling_mode not in PROFILE_MODES:
+                print(f"Modo de perfilado no soportado: {self.config_profiling_mode}, usando sampling")
+                self.config_profiling_mode = 'sampling'
+            
+            profiling_seconds_str = config.get('PROFILING', 'SECONDS', fallback=defaults['PROFILING']['SECONDS'])
+            self.config_profiling_seconds = float(extract_number(profiling_seconds_str))
+            
+            profiling_interval_str = config.get('PROFILING', 'INTERVAL_MS', fallback=defaults['PROFILING']['INTERVAL_MS'])
+            self.config_profiling_interval_ms = float(extract_number(profiling_interval_str))
+            
+            # Catálogo SQLite de las grabaciones guardadas (relativo a config.ini)
+            catalog_file_str = config.get('CATALOG', 'FILE', fallback=defaults['CATALOG']['FILE'])
+            self.config_catalog_file = catalog_file_str.split('#')[0].strip().strip('"\'')
+            
+            catalog_interval_str = config.get('CATALOG', 'COMMIT_INTERVAL_SECONDS', fallback=defaults['CATALOG']['COMMIT_INTERVAL_SECONDS'])
+            self.config_catalog_commit_interval = float(extract_number(catalog_interval_str))
+            
+            # Límites del directorio de grabaciones (0 = sin límite)
+            retention_size_str = config.get('RETENTION', 'MAX_SIZE_MB', fallback=defaults['RETENTION']['MAX_SIZE_MB'])
+            self.config_retention_max_size_mb = float(extract_number(retention_size_str))
+            
+            retention_age_str = config.get('RETENTION', 'MAX_AGE_DAYS', fallback=defaults['RETENTION']['MAX_AGE_DAYS'])
+            self.config_retention_max_age_days = float(extract_number(retention_age_str))
+            
+            retention_free_str = config.get('RETENTION', 'MIN_FREE_MB', fallback=defaults['RETENTION']['MIN_FREE_MB'])
+            self.config_retention_min_free_mb = float(extract_number(retention_free_str))
+            
+            retention_policy_str = config.get('RETENTION', 'POLICY', fallback=defaults['RETENTION']['POLICY'])
+            self.config_retention_policy = retention_policy_str.split('#')[0].strip().strip('"\'').lower()
+            if self.config_retention_policy not in RETENTION_POLICIES:
+                print(f"Política de retención no soportada: {self.config_retention_policy}, usando oldest")
+                self.config_retention_policy = 'oldest'
+            
+            retention_interval_str = config.get('RETENTION', 'CHECK_INTERVAL_SECONDS', fallback=defaults['RETENTION']['CHECK_INTERVAL_SECONDS'])
+            self.config_retention_check_interval = float(extract_number(retention_interval_str))
+            
+            # Cargar valores de display
+            volume_update_str = config.get('DISPLAY', 'VOLUME_UPDATE_INTERVAL', fallback=defaults['DISPLAY']['VOLUME_UPDATE_INTERVAL'])
+            self.config_volume_update_interval = int(extract_number(volume_update_str))
+            
+            min_display_str = config.get('DISPLAY', 'MIN_DISPLAY_DB', fallback=defaults['DISPLAY']['MIN_DISPLAY_DB'])
+            self.config_min_display_db = float(extract_number(min_display_str))
+            
+            print(f"Configuración aplicada: {self.config_sample_rate}Hz, {self.config_bit_depth}bit, {self.config_channels}ch, Umbral: {self.config_threshold_db}dB")
+            
+        except Exception as e:
+            print(f"Error cargando configuración: {e}")
+            # Usar valores por defecto en caso de error
+            self.config_record_seconds = 30
+            self.config_sample_rate = 44100
+            self.config_channels = 1
+            self.config_format = pyaudio.paInt16
+            self.config_bit_depth = 16
+            self.config_chunk_size = 1024
+            self.config_capture_mode = 'blocking'
+            self.config_capture_queue_seconds = 10.0
+            self.config_zero_fill_drops = False
+            self.config_device_cache_file = 'device_cache.json'
+            self.config_threshold_policy = 'any'
+            self.config_channel_thresholds = []
+            self.config_threshold_db = -40.0
+            self.config_min_threshold_db = -60.0
+            self.config_max_threshold_db = 0.0
+            self.config_output_dir = "grabaciones"
+            self.config_filename_format = "grabacion_%Y%m%d_%H%M%S.wav"
+            self.config_streaming_write = False
+            self.config_output_format = 'wav'
+            self.config_trigger_enabled = False
+            self.config_pre_roll_seconds = 2.0
+            self.config_hangover_seconds = 3.0
+            self.config_max_segment_seconds = 60.0
+            self.config_multi_device_enabled = False
+            self.config_multi_devices = []
+            self.config_multi_thresholds = []
+            self.config_source_type = 'pyaudio'
+            self.config_source_realtime = True
+            self.config_source_file = ''
+            self.config_source_loop = False
+            self.config_source_signal = 'bursts'
+            self.config_source_level_db = -20.0
+            self.config_source_noise_db = -70.0
+            self.config_source_frequency = 440.0
+            self.config_source_burst_seconds = 1.0
+            self.config_source_burst_interval = 5.0
+            self.config_metrics_file = ''
+            self.config_metrics_interval = 5.0
+            self.config_metrics_http_host = '127.0.0.1'
+            self.config_metrics_http_port = 0
+            self.config_profiling_enabled = False
+            self.config_profiling_mode = 'sampling'
+            self.config_profiling_seconds = 60.0
+            self.config_profiling_interval_ms = 5.0
+            self.config_catalog_file = 'catalogo.sqlite'
+            self.config_catalog_commit_interval = 2.0
+            self.config_retention_max_size_mb = 0.0
+            self.config_retention_max_age_days = 0.0
+            self.config_retention_min_free_mb = 0.0
+            self.config_retention_policy = 'oldest'
+            self.config_retention_check_interval = 60.0
+            self.config_volume_update_interval = 100
+            self.config_min_display_db = -60
+            
+    def save_config(self, show_messages=False):
+        """Guarda la configuración actual en el archivo config.ini"""
+        config = configparser.ConfigParser()
+        
+        # Crear secciones
+        config.add_section('AUDIO')
+        config.add_section('INTERFACE')
+        config.add_section('STORAGE')
+        config.add_section('TRIGGER')
+        config.add_section('MULTI_DEVICE')
+        config.add_section('SOURCE')
+        config.add_section('METRICS')
+        config.add_section('PROFILING')
+        config.add_section('CATALOG')
+        config.add_section('RETENTION')
+        config.add_section('DISPLAY')
+        
+        try:
+            # Guardar valores actuales
+            config.set('AUDIO', 'RECORD_SECONDS', str(int(self.record_duration)))
+            config.set('AUDIO', 'SAMPLE_RATE', str(self.RATE))
+            config.set('AUDIO', 'CHANNELS', str(self.CHANNELS))
+            config.set('AUDIO', 'FORMAT', str(self.config_bit_depth))
+            config.set('AUDIO', 'CHUNK_SIZE', str(self.CHUNK))
+            config.set('AUDIO', 'CAPTURE_MODE', self.config_capture_mode)
+            config.set('AUDIO', 'CAPTURE_QUEUE_SECONDS', str(self.config_capture_queue_seconds))
+            config.set('AUDIO', 'ZERO_FILL_DROPS', str(self.config_zero_fill_drops).lower())
+            config.set('AUDIO', 'DEVICE_CACHE_FILE', self.config_device_cache_file)
+            config.set('AUDIO', 'THRESHOLD_POLICY', self.config_threshold_policy)
+            config.set('AUDIO', 'CHANNEL_THRESHOLDS', ', '.join(str(t) for t in self.config_channel_thresholds))
+            
+            config.set('INTERFACE', 'DEFAULT_THRESHOLD_DB', str(self.threshold_db))
+            config.set('INTERFACE', 'MIN_THRESHOLD_DB', str(self.config_min_threshold_db))
+            config.set('INTERFACE', 'MAX_THRESHOLD_DB', str(self.config_max_threshold_db))
+            
+            config.set('STORAGE', 'OUTPUT_DIRECTORY', f'"{self.output_dir}"')
+            # Escapar los % para evitar problemas con interpolación
+            filename_format_escaped = self.config_filename_format.replace('%', '%%')
+            config.set('STORAGE', 'FILENAME_FORMAT', f'"{filename_format_escaped}"')
+            config.set('STORAGE', 'STREAMING_WRITE', str(self.config_streaming_write).lower())
+            config.set('STORAGE', 'OUTPUT_FORMAT', self.config_output_format)
+            
+            config.set('TRIGGER', 'ENABLED', str(self.config_trigger_enabled).lower())
+            config.set('TRIGGER', 'PRE_ROLL_SECONDS', str(self.config_pre_roll_seconds))
+            config.set('TRIGGER', 'HANGOVER_SECONDS', str(self.config_hangover_seconds))
+            config.set('TRIGGER', 'MAX_SEGMENT_SECONDS', str(self.config_max_segment_seconds))
+            
+            config.set('MULTI_DEVICE', 'ENABLED', str(self.config_multi_device_enabled).lower())
+            config.set('MULTI_DEVICE', 'DEVICES', ', '.join(self.config_multi_devices))
+            config.set('MULTI_DEVICE', 'THRESHOLDS', ', '.join(str(t) for t in self.config_multi_thresholds))
+            
+            config.set('SOURCE', 'TYPE', self.config_source_type)
+            config.set('SOURCE', 'REALTIME', str(self.config_source_realtime).lower())
+            config.set('SOURCE', 'FILE', self.config_source_file)
+            config.set('SOURCE', 'LOOP', str(self.config_source_loop).lower())
+            config.set('SOURCE', 'SIGNAL', self.config_source_signal)
+            config.set('SOURCE', 'LEVEL_DB', str(self.config_source_level_db))
+            config.set('SOURCE', 'NOISE_DB', str(self.config_source_noise_db))
+            config.set('SOURCE', 'FREQUENCY', str(self.config_source_frequency))
+            config.set('SOURCE', 'BURST_SECONDS', str(self.config_source_burst_seconds))
+            config.set('SOURCE', 'BURST_INTERVAL_SECONDS', str(self.config_source_burst_interval))
+            
+            config.set('METRICS', 'FILE', self.config_metrics_file)
+            config.set('METRICS', 'INTERVAL_SECONDS', str(self.config_metrics_interval))
+            config.set('METRICS', 'HTTP_HOST', self.config_metrics_http_host)
+            config.set('METRICS', 'HTTP_PORT', str(self.config_metrics_http_port))
+            
+            config.set('PROFILING', 'ENABLED', str(self.config_profiling_enabled).lower())
+            config.set('PROFILING', 'MODE', self.config_profiling_mode)
+            config.set('PROFILING', 'SECONDS', str(self.config_profiling_seconds))
+            config.set('PROFILING', 'INTERVAL_MS', str(self.config_profiling_interval_ms))
+            
+            config.set('CATALOG', 'FILE', self.config_catalog_file)
+            config.set('CATALOG', 'COMMIT_INTERVAL_SECONDS', str(self.config_catalog_commit_interval))
+            
+            config.set('RETENTION', 'MAX_SIZE_MB', str(self.config_retention_max_size_mb))
+            config.set('RETENTION', 'MAX_AGE_DAYS', str(self.config_retention_max_age_days))
+            config.set('RETENTION', 'MIN_FREE_MB', str(self.config_retention_min_free_mb))
+            config.set('RETENTION', 'POLICY', self.config_retention_policy)
+            config.set('RETENTION', 'CHECK_INTERVAL_SECONDS', str(self.config_retention_check_interval))
+            
+            config.set('DISPLAY', 'VOLUME_UPDATE_INTERVAL', str(self.config_volume_update_interval))
+            config.set('DISPLAY', 'MIN_DISPLAY_DB', str(self.config_min_display_db))
+            
+            # Escribir al archivo con comentarios personalizados
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                f.write("# Configuración del Grabador de Audio\n")
+                f.write("# Este archivo permite personalizar algunos aspectos del grabador\n\n")
+                
+                f.write("[AUDIO]\n")
+                f.write(f"# Duración de cada grabación en segundos\n")
+                f.write(f"RECORD_SECONDS = {int(self.record_duration)}\n\n")
+                
+                f.write(f"# Calidad de audio\n")
+                f.write(f"SAMPLE_RATE = {self.RATE}  # Hz\n")
+                f.write(f"CHANNELS = {self.CHANNELS}  # 1 = mono, 2 = estéreo, hasta los que admita el dispositivo\n")
+                f.write(f"FORMAT = {self.config_bit_depth}  # bits\n\n")
+                
+                f.write(f"# Tamaño del buffer\n")
+                f.write(f"CHUNK_SIZE = {self.CHUNK}\n\n")
+                
+                f.write(f"# Motor de captura: blocking (lectura bloqueante), callback (cola acotada)\n")
+                f.write(f"# o process (proceso aparte con buffer en memoria compartida)\n")
+                f.write(f"CAPTURE_MODE = {self.config_capture_mode}\n")
+                f.write(f"# Capacidad de la cola de captura en modo callback o process (segundos)\n")
+                f.write(f"CAPTURE_QUEUE_SECONDS = {self.config_capture_queue_seconds}\n")
+                f.write(f"# Rellenar con silencio el audio perdido por desbordamientos (la duración del archivo coincide con la real)\n")
+                f.write(f"ZERO_FILL_DROPS = {str(self.config_zero_fill_drops).lower()}\n\n")
+                
+                f.write(f"# Caché de pruebas de dispositivos (relativa a este archivo; vacío para desactivarla)\n")
+                f.write(f"DEVICE_CACHE_FILE = {self.config_device_cache_file}\n\n")
+                
+                f.write(f"# Umbral por canal: any (basta el canal más fuerte) o per_channel\n")
+                f.write(f"# (cada canal con su umbral de CHANNEL_THRESHOLDS; los que falten usan el general)\n")
+                f.write(f"THRESHOLD_POLICY = {self.config_threshold_policy}\n")
+                f.write(f"CHANNEL_THRESHOLDS = {', '.join(str(t) for t in self.config_channel_thresholds)}\n\n")
+                
+                f.write("[INTERFACE]\n")
+                f.write(f"# Umbral por defecto en decibelios\n")
+                f.write(f"DEFAULT_THRESHOLD_DB = {self.threshold_db}\n\n")
+                
+                f.write(f"# Rango del slider de umbral\n")
+                f.write(f"MIN_THRESHOLD_DB = {self.config_min_threshold_db}\n")
+                f.write(f"MAX_THRESHOLD_DB = {self.config_max_threshold_db}\n\n")
+                
+                f.write("[STORAGE]\n")
+                f.write(f"# Directorio donde guardar las grabaciones\n")
+                f.write(f'OUTPUT_DIRECTORY = "{self.output_dir}"\n\n')
+                
+                f.write(f"# Formato del nombre de archivo (usando strftime)\n")
+                f.write(f'FILENAME_FORMAT = "{self.config_filename_format}"\n\n')
+                
+                f.write(f"# Escribir cada tramo a disco mientras se graba (memoria constante)\n")
+                f.write(f"STREAMING_WRITE = {str(self.config_streaming_write).lower()}\n\n")
+                
+                f.write(f"# Formato de salida: wav, flac (sin pérdidas), ogg u opus (con pérdidas; requieren soundfile)\n")
+                f.write(f"OUTPUT_FORMAT = {self.config_output_format}\n\n")
+                
+                f.write("[TRIGGER]\n")
+                f.write(f"# Grabación por eventos: el tramo empieza al superar el umbral\n")
+                f.write(f"ENABLED = {str(self.config_trigger_enabled).lower()}\n")
+                f.write(f"# Segundos de audio previos al evento que se incluyen\n")
+                f.write(f"PRE_ROLL_SECONDS = {self.config_pre_roll_seconds}\n")
+                f.write(f"# Segundos por debajo del umbral antes de cerrar el tramo\n")
+                f.write(f"HANGOVER_SECONDS = {self.config_hangover_seconds}\n")
+                f.write(f"# Duración máxima de un tramo\n")
+                f.write(f"MAX_SEGMENT_SECONDS = {self.config_max_segment_seconds}\n\n")
+                
+                f.write("[MULTI_DEVICE]\n")
+                f.write(f"# Grabar varios dispositivos a la vez, cada uno en su subdirectorio\n")
+                f.write(f"ENABLED = {str(self.config_multi_device_enabled).lower()}\n")
+                f.write(f"# Índices o nombres de los dispositivos, separados por comas\n")
+                f.write(f"DEVICES = {', '.join(self.config_multi_devices)}\n")
+                f.write(f"# Umbral en dB de cada dispositivo, en el mismo orden (vacío: el umbral general)\n")
+                f.write(f"THRESHOLDS = {', '.join(str(t) for t in self.config_multi_thresholds)}\n\n")
+                
+                f.write("[SOURCE]\n")
+                f.write(f"# Origen del audio: pyaudio (micrófono), file (WAV) o synthetic (señal de prueba)\n")
+                f.write(f"TYPE = {self.config_source_type}\n")
+                f.write(f"# false: file y synthetic entregan el audio lo más rápido posible (pruebas de rendimiento)\n")
+                f.write(f"REALTIME = {str(self.config_source_realtime).lower()}\n")
+                f.write(f"# WAV que se reproduce con TYPE = file y si se repite al terminar\n")
+                f.write(f"FILE = {self.config_source_file}\n")
+                f.write(f"LOOP = {str(self.config_source_loop).lower()}\n")
+                f.write(f"# Señal sintética: tone, noise o bursts (tono a ráfagas sobre ruido de fondo)\n")
+                f.write(f"SIGNAL = {self.config_source_signal}\n")
+                f.write(f"# Nivel RMS de la señal y del ruido de fondo (dBFS) y frecuencia del tono (Hz)\n")
+                f.write(f"LEVEL_DB = {self.config_source_level_db}\n")
+                f.write(f"NOISE_DB = {self.config_source_noise_db}\n")
+                f.write(f"FREQUENCY = {self.config_source_frequency}\n")
+                f.write(f"# Duración de cada ráfaga y tiempo entre el inicio de dos ráfagas (segundos)\n")
+                f.write(f"BURST_SECONDS = {self.config_source_burst_seconds}\n")
+                f.write(f"BURST_INTERVAL_SECONDS = {self.config_source_burst_interval}\n\n")
+                
+                f.write("[METRICS]\n")
+                f.write(f"# Archivo JSON con las métricas, reescrito cada INTERVAL_SECONDS (relativo a este archivo; vacío para desactivarlo)\n")
+                f.write(f"FILE = {self.config_metrics_file}\n")
+                f.write(f"INTERVAL_SECONDS = {self.config_metrics_interval}\n")
+                f.write(f"# Servidor HTTP de métricas (GET /metrics); 0 para desactivarlo\n")
+                f.write(f"HTTP_HOST = {self.config_metrics_http_host}\n")
+                f.write(f"HTTP_PORT = {self.config_metrics_http_port}\n\n")
+                
+                f.write("[PROFILING]\n")
+                f.write(f"# Perfilar el grabador al iniciar la grabación; escribe perfil_*.txt y perfil_*.collapsed en el directorio de salida\n")
+                f.write(f"ENABLED = {str(self.config_profiling_enabled).lower()}\n")
+                f.write(f"# sampling (muestreo de las pilas de todos los hilos) o deterministic (además cProfile en los hilos de grabación)\n")
+                f.write(f"MODE = {self.config_profiling_mode}\n")
+                f.write(f"# Duración de la ventana de perfilado (segundos) e intervalo entre muestras (milisegundos)\n")
+                f.write(f"SECONDS = {self.config_profiling_seconds}\n")
+                f.write(f"INTERVAL_MS = {self.config_profiling_interval_ms}\n\n")
+                
+                f.write("[CATALOG]\n")
+                f.write(f"# Catálogo SQLite con una fila por grabación guardada (relativo a este archivo; vacío para desactivarlo)\n")
+                f.write(f"FILE = {self.config_catalog_file}\n")
+                f.write(f"# Las filas se escriben agrupadas en una transacción cada COMMIT_INTERVAL_SECONDS\n")
+                f.write(f"COMMIT_INTERVAL_SECONDS = {self.config_catalog_commit_interval}\n\n")
+                
+                f.write("[RETENTION]\n")
+                f.write(f"# Tamaño máximo de las grabaciones, antigüedad máxima y espacio libre mínimo del disco (0 = sin límite)\n")
+                f.write(f"MAX_SIZE_MB = {self.config_retention_max_size_mb}\n")
+                f.write(f"MAX_AGE_DAYS = {self.config_retention_max_age_days}\n")
+                f.write(f"MIN_FREE_MB = {self.config_retention_min_free_mb}\n")
+                f.write(f"# Qué grabaciones se borran primero: oldest (las más antiguas) o quietest (las de menor nivel)\n")
+                f.write(f"POLICY = {self.config_retention_policy}\n")
+                f.write(f"# Cada cuánto se comprueban los límites aunque no se guarden tramos (segundos)\n")
+                f.write(f"CHECK_INTERVAL_SECONDS = {self.config_retention_check_interval}\n\n")
+                
+                f.write("[DISPLAY]\n")
+                f.write(f"# Actualización del monitor de volumen (milisegundos)\n")
+                f.write(f"VOLUME_UPDATE_INTERVAL = {self.config_volume_update_interval}\n\n")
+                
+                f.write(f"# Limitar el nivel mínimo de dB mostrado\n")
+                f.write(f"MIN_DISPLAY_DB = {self.config_min_display_db}\n")
+                
+            if show_messages:
+                print(f"Configuración guardada en {self.config_file}")
+            
+        except Exception as e:
+            print(f"Error guardando configuración: {e}")
+            if show_messages:
+                self.notify("Error", f"No se pudo guardar la configuración: {str(e)}", "error")
+        
+    def refresh_audio_devices(self, force_probe=False):
+        """Obtiene la lista de dispositivos de audio de entrada disponibles y los valida.
+        
+        Solo se enumeran los dispositivos: la compatibilidad se toma de la caché
+        y la lista se devuelve enseguida. Si el conjunto de dispositivos ha
+        cambiado, o con force_probe=True, los dispositivos se prueban en
+        segundo plano y cada resultado se publica con on_devices_updated.
+        """
+        try:
+            # PortAudio solo detecta dispositivos nuevos al inicializarse; durante
+            # la grabación se mantiene la instancia en uso
+            if force_probe and not self.is_recording:
+                audio = self.backend.reinitialize()
+            else:
+                audio = self.backend.audio
+            input_devices = self.enumerate_input_devices(audio)
+            fingerprints = [fingerprint for _, _, fingerprint in input_devices]
+            
+            device_names = self.build_device_list(input_devices)
+            
+            # Establecer el dispositivo por defecto
+            self.selected_device_name = self.audio_devices[0]['display_name']
+            
+            if force_probe or not self.device_cache.matches(fingerprints):
+                self.start_device_probe()
+            
+            return device_names
+            
+        except Exception as e:
+            print(f"Error obteniendo dispositivos de audio: {e}")
+            # Configuración de emergencia
+            self.audio_devices = [{
+                'index': None,
+                'name': 'Dispositivo por defecto',
+                'display_name': 'Dispositivo por defecto del sistema',
+                'channels': 1,
+                'sample_rate': 44100,
+                'fingerprint': None
+            }]
+            return ["Dispositivo por defecto del sistema"]
+        
+    def enumerate_input_devices(self, audio):
+        """Devuelve (índice, información, huella) de cada dispositivo de entrada, sin abrir streams"""
+        input_devices = []
+        for i in range(audio.get_device_count()):
+            try:
+                device_info = audio.get_device_info_by_index(i)
+                
+                # Solo dispositivos de entrada (micrófonos)
+                if device_info['maxInputChannels'] > 0:
+                    host_api_name = audio.get_host_api_info_by_index(device_info['hostApi'])['name']
+                    input_devices.append((i, device_info, device_fingerprint(host_api_name, device_info)))
+            except Exception as e:
+                print(f"Error evaluando dispositivo {i}: {e}")
+        return input_devices
+        
+    def probe_device(self, audio, index, device_info):
+        """Comprueba si el dispositivo abre un stream con la configuración estándar (más compatible)"""
+        try:
+            test_stream = audio.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=int(device_info['defaultSampleRate']) if device_info['defaultSampleRate'] > 0 else 44100,
+                input=True,
+                input_device_index=index,
+                frames_per_buffer=1024
+            )
+            test_stream.close()
+            return True
+        except Exception as e:
+            print(f"Dispositivo {device_info['name']} no compatible: {e}")
+            return False
+        
+    def probe_device_capabilities(self, audio, index, device_info):
+        """Prueba el dispositivo y, si es compatible, la matriz de frecuencias × bits × canales.
+        
+        La matriz se consulta con is_format_supported, que no abre ningún stream.
+        Devuelve (compatible, {clave de formato: admitido}).
+        """
+        if not self.probe_device(audio, index, device_info):
+            return False, {}
+        formats = {}
+        max_channels = int(device_info['maxInputChannels'])
+        channel_counts = sorted({c for c in self.PROBE_CHANNEL_COUNTS if c <= max_channels} | {max_channels})
+        for rate in self.PROBE_SAMPLE_RATES:
+            for bit_depth, sample_format in ((16, pyaudio.paInt16), (24, pyaudio.paInt24), (32, pyaudio.paInt32)):
+                for channels in channel_counts:
+                    try:
+                        supported = bool(audio.is_format_supported(rate,
+                                                                   input_device=index,
+                                                                   input_channels=channels,
+                                                                   input_format=sample_format))
+                    except ValueError:
+                        supported = False
+                    formats[format_key(rate, bit_depth, channels)] = supported
+        return True, formats
+        
+    def build_device_list(self, input_devices):
+        """Construye audio_devices con los dispositivos compatibles según la caché"""
+        audio_devices = []
+        device_names = []
+        for i, device_info, fingerprint in input_devices:
+            # Los dispositivos aún no probados se listan hasta que se compruebe lo contrario
+            if self.device_cache.is_compatible(fingerprint) is False:
+                continue
+            device_name = f"{device_info['name']} (ID: {i})"
+            device_names.append(device_name)
+            audio_devices.append({
+                'index': i,
+                'name': device_info['name'],
+                'display_name': device_name,
+                'channels': int(device_info['maxInputChannels']),
+                'sample_rate': int(device_info['defaultSampleRate']) if device_info['defaultSampleRate'] > 0 else 44100,
+                'fingerprint': fingerprint
+            })
+        
+        if not audio_devices:
+            # Añadir dispositivo por defecto si no se encuentra ninguno compatible
+            audio_devices.append({
+                'index': None,
+                'name': 'Dispositivo por defecto',
+                'display_name': 'Dispositivo por defecto del sistema',
+                'channels': 1,
+                'sample_rate': 44100,
+                'fingerprint': None
+            })
+            device_names.append('Dispositivo por defecto del sistema')
+        
+        self.audio_devices = audio_devices
+        return device_names
+        
+    def start_device_probe(self):
+        """Lanza la prueba de dispositivos en segundo plano, si no hay ya una en curso"""
+        if self.device_probe_thread is not None and self.device_probe_thread.is_alive():
+            return
+        self.device_probe_thread = threading.Thread(target=self.probe_devices, name="DeviceProbe", daemon=True)
+        self.device_probe_thread.start()
+        
+    def probe_devices(self):
+        """Prueba todos los dispositivos en paralelo y publica cada resultado según llega.
+        
+        Cada dispositivo se prueba en su propio hilo, con como máximo
+        DEVICE_PROBE_WORKERS a la vez y una instancia de PyAudio por prueba, de
+        modo que ningún stream de prueba comparte instancia con otro. Un
+        controlador que no responde en DEVICE_PROBE_TIMEOUT_SECONDS se da por no
+        compatible y su hilo (daemon) se abandona con su instancia: no se vuelve
+        a usar ni se termina, porque el hilo sigue dentro de PortAudio.
+        """
+        try:
+            temp_audio = pyaudio.PyAudio()
+        except Exception as e:
+            print(f"Error comprobando dispositivos de audio: {e}")
+            return
+        
+        timed_out = 0
+        try:
+            input_devices = self.enumerate_input_devices(temp_audio)
+            recording = self.is_recording
+            results = queue.Queue()
+            pending = list(input_devices)
+            running = {}  # huella -> (inicio, información, evento de prueba abandonada)
+            # Crear y terminar instancias de PyAudio no es seguro desde varios hilos a la vez
+            instance_lock = threading.Lock()
+            
+            def worker(index, device_info, fingerprint, abandoned):
+                audio = None
+                result = (fingerprint, False, {})
+                try:
+                    with instance_lock:
+                        audio = pyaudio.PyAudio()
+                    result = (fingerprint,) + self.probe_device_capabilities(audio, index, device_info)
+                except Exception as e:
+                    print(f"Error probando dispositivo {device_info['name']}: {e}")
+                finally:
+                    with instance_lock:
+                        if audio is not None and not abandoned.is_set():
+                            audio.terminate()
+                results.put(result)
+            
+            while pending or running:
+                while pending and len(running) < self.DEVICE_PROBE_WORKERS:
+                    index, device_info, fingerprint = pending.pop(0)
+                    abandoned = threading.Event()
+                    running[fingerprint] = (time.monotonic(), device_info, abandoned)
+                    threading.Thread(target=worker, args=(index, device_info, fingerprint, abandoned),
+                                     name=f"DeviceProbe-{index}", daemon=True).start()
+                
+                updated = False
+                try:
+                    fingerprint, compatible, formats = results.get(timeout=0.1)
+                    # Un resultado tardío de un dispositivo ya dado por perdido se ignora
+                    if running.pop(fingerprint, None) is not None:
+                        # El dispositivo puede estar ocupado por la propia grabación
+                        if compatible or not self.is_recording:
+                            self.device_cache.set_compatible(fingerprint, compatible)
+                            for key, supported in formats.items():
+                                self.device_cache.set_format_supported(fingerprint, key, supported)
+                            updated = True
+                except queue.Empty:
+                    pass
+                
+                now = time.monotonic()
+                for fingerprint, (started, device_info, abandoned) in list(running.items()):
+                    if now - started > self.DEVICE_PROBE_TIMEOUT_SECONDS:
+                        print(f"Dispositivo {device_info['name']} no responde, se descarta")
+                        abandoned.set()
+                        del running[fingerprint]
+                        self.device_cache.set_compatible(fingerprint, False)
+                        timed_out += 1
+                        updated = True
+                
+                if updated:
+                    self.publish_device_list(input_devices, finished=False)
+            
+            if not recording and not self.is_recording:
+                self.device_cache.set_fingerprints([fingerprint for _, _, fingerprint in input_devices])
+            self.device_cache.save()
+            
+            device_names = self.publish_device_list(input_devices, finished=True)
+            print(f"Dispositivos comprobados: {len(device_names)} compatibles, {timed_out} sin respuesta")
+        except Exception as e:
+            print(f"Error comprobando dispositivos de audio: {e}")
+        finally:
+            # Ninguna prueba usa esta instancia, solo la enumeración. PortAudio cuenta las
+            # inicializaciones, así que mientras una instancia abandonada siga viva no se
+            # libera bajo el hilo colgado
+            temp_audio.terminate()
+        
+    def publish_device_list(self, input_devices, finished):
+        """Reconstruye la lista de dispositivos conservando la selección y la notifica"""
+        selected_name = self.selected_device_name
+        device_names = self.build_device_list(input_devices)
+        if selected_name not in device_names:
+            self.selected_device_name = self.audio_devices[0]['display_name']
+        self.on_devices_updated(device_names, finished)
+        return device_names
+        
+    def notify(self, title, message, message_type="info"):
+        """Informa al usuario; puede llamarse desde cualquier hilo. Sin interfaz se escribe en la salida"""
+        print(f"{title}: {message}")
+        
+    def set_status(self, status_text):
+        """Actualiza el estado de la grabación; puede llamarse desde cualquier hilo"""
+        self.status_text = status_text
+        
+    def on_segment_result(self, kept, max_volume):
+        """Se llama desde el hilo de grabación cuando se decide si un tramo se guarda"""
+        pass
+        
+    def on_devices_updated(self, device_names, finished=True):
+        """Se llama desde el hilo de comprobación con cada resultado y al terminar (finished=True)"""
+        pass
+        
+    def select_device(self, device_index):
+        """Selecciona el dispositivo de entrada por su índice de PyAudio; False si no está disponible"""
+        for device in self.audio_devices:
+            if device['index'] == device_index:
+                self.selected_device_name = device['display_name']
+                return True
+        return False
+        
+    def get_selected_device_index(self):
+        """Obtiene el índice del dispositivo seleccionado"""
+        selected_name = self.selected_device_name
+        
+        for device in self.audio_devices:
+            if device['display_name'] == selected_name:
+                return device['index']
+                
+        return None  # Usar dispositivo por defecto si no se encuentra
+        
+    def check_input_format(self, device_index, format, channels, rate):
+        """Comprueba si el dispositivo admite la calidad indicada; devuelve (admitida, error).
+        
+        Si la combinación ya se probó en ese dispositivo se usa el resultado de la
+        caché sin abrir ningún stream.
+        """
+        fingerprint = None
+        for device in self.audio_devices:
+            if device['index'] == device_index:
+                fingerprint = device.get('fingerprint')
+                break
+        bit_depth = {pyaudio.paInt16: 16, pyaudio.paInt24: 24, pyaudio.paInt32: 32}.get(format, 16)
+        key = format_key(rate, bit_depth, channels)
+        
+        if fingerprint is not None:
+            cached = self.device_cache.format_supported(fingerprint, key)
+            if cached is not None:
+                return cached, None if cached else "no compatible (resultado en caché)"
+        
+        test_audio = pyaudio.PyAudio()
+        try:
+            test_stream = test_audio.open(
+                format=format,
+                channels=channels,
+                rate=rate,
+                input=True,
+                input_device_index=device_index,
+                frames_per_buffer=1024
+            )
+            test_stream.close()
+            supported, error = True, None
+        except Exception as e:
+            supported, error = False, e
+        finally:
+            test_audio.terminate()
+        
+        if fingerprint is not None:
+            self.device_cache.set_format_supported(fingerprint, key, supported)
+            self.device_cache.save()
+        return supported, error
+        
+    def get_level_meter(self):
+        """Devuelve el medidor de nivel del formato actual, recreándolo solo si el formato cambia"""
+        # Formatos no reconocidos se tratan como 16 bits, igual que antes
+        sample_width = {pyaudio.paInt16: 2, pyaudio.paInt24: 3, pyaudio.paInt32: 4}.get(self.FORMAT, 2)
+        meter = self.level_meter
+        if meter is None or meter.sample_width != sample_width or meter.channels != self.CHANNELS:
+            meter = LevelMeter(sample_width, self.CHANNELS, max_frames=self.CHUNK)
+            self.level_meter = meter
+        return meter
+        
+    def calculate_db(self, audio_data):
+        """Calcula el nivel de volumen en decibelios con soporte para múltiples formatos"""
+        if len(audio_data) == 0:
+            return -60  # Silencio
+            
+        try:
+            # RMS por canal tomando el canal más fuerte; el medidor reutiliza sus
+            # buffers de trabajo, por lo que no reserva memoria en cada bloque
+            return self.get_level_meter().measure(audio_data)
+            
+        except Exception as e:
+            print(f"Error calculando dB: {e}")
+            return -60  # Silencio en caso de error
+            
+    def update_channel_levels(self):
+        """Acumula el nivel de cada canal del último bloque medido y lo devuelve.
+        
+        Actualiza el máximo de cada canal en el tramo y el pico por canal que
+        lee la interfaz, sin crear arrays nuevos en cada bloque.
+        """
+        meter = self.level_meter
+        if meter is None:
+            return None
+        levels = meter.channel_levels_db()
+        for name in ('segment_channel_max_db', 'display_channel_peak_db'):
+            accumulated = getattr(self, name)
+            if accumulated is None or len(accumulated) != len(levels):
+                setattr(self, name, levels.copy())
+            else:
+                np.maximum(accumulated, levels, out=accumulated)
+        return levels
+        
+    def channel_thresholds(self):
+        """Umbral de cada canal: el de CHANNEL_THRESHOLDS o, si falta, el umbral general"""
+        thresholds = np.full(self.CHANNELS, float(self.threshold_db))
+        count = min(len(self.config_channel_thresholds), self.CHANNELS)
+        thresholds[:count] = self.config_channel_thresholds[:count]
+        return thresholds
+        
+    def passes_threshold(self, level_db, channel_db=None):
+        """True si el nivel supera el umbral según THRESHOLD_POLICY.
+        
+        level_db es el nivel del canal más fuerte y channel_db el de cada canal;
+        sin niveles por canal se usa siempre el umbral general.
+        """
+        if self.config_threshold_policy == 'per_channel' and channel_db is not None and len(channel_db) == self.CHANNELS:
+            return bool((channel_db >= self.channel_thresholds()).any())
+        return level_db >= self.threshold_db
+        
+    def current_segment_passes(self):
+        """True si el tramo en curso se guardaría con lo capturado hasta ahora"""
+        if self.device_pipelines:
+            return any(pipeline.current_segment_passes() for pipeline in self.device_pipelines)
+        return self.passes_threshold(self.current_max_volume, self.segment_channel_max_db)
+        
+    def capture_time(self):
+        """Instante de captura del audio que se lee ahora.
+        
+        Es la hora actual, salvo con orígenes que van más rápido que el tiempo
+        real: entonces se usa el reloj del propio audio para que cada tramo
+        tenga su marca de tiempo y su nombre de archivo.
+        """
+        media_time = getattr(self.stream, 'media_time', None)
+        return media_time() if media_time is not None else datetime.now()
+        
+    def create_audio_source(self):
+        """Crea el origen de audio de [SOURCE]"""
+        if self.config_source_type == 'file':
+            if os.path.exists(self.config_source_file):
+                return WavFileSource(self.config_source_file, realtime=self.config_source_realtime,
+                                     loop=self.config_source_loop)
+            print(f"No existe el archivo de audio {self.config_source_file!r}, usando el micrófono")
+        elif self.config_source_type == 'synthetic':
+            return SyntheticSource(realtime=self.config_source_realtime,
+                                   signal=self.config_source_signal,
+                                   level_db=self.config_source_level_db,
+                                   noise_db=self.config_source_noise_db,
+                                   frequency=self.config_source_frequency,
+                                   burst_seconds=self.config_source_burst_seconds,
+                                   burst_interval=self.config_source_burst_interval)
+        return PyAudioSource(self.backend, self.config_capture_mode, self.config_capture_queue_seconds)
+        
+    def open_input_stream(self):
+        """Abre el stream de entrada con el dispositivo seleccionado, con alternativas si falla.
+        
+        El backend recuerda qué alternativa funcionó para este dispositivo y
+        configuración, así que normalmente basta con una sola apertura.
+        """
+        source = self.audio_source
+        if not source.is_device:
+            # Los orígenes de prueba no fallan por el dispositivo, pero pueden imponer su formato
+            sample_width, channels, rate = source.stream_params(pyaudio.get_sample_size(self.FORMAT),
+                                                                self.CHANNELS, self.RATE)
+            stream = source.open(sample_width, channels, rate, self.CHUNK)
+            self.FORMAT = SAMPLE_FORMATS[sample_width]
+            self.CHANNELS = channels
+            self.RATE = rate
+            print(f"Audio de {source.name}: {rate}Hz, {sample_width * 8}bit, {channels}ch")
+            return stream
+            
+        # Obtener el índice del dispositivo seleccionado
+        device_index = self.get_selected_device_index()
+        fingerprint = None
+        for device in self.audio_devices:
+            if device['index'] == device_index:
+                fingerprint = device.get('fingerprint')
+                break
+        
+        requested = dict(format=self.FORMAT, channels=self.CHANNELS, rate=self.RATE, frames_per_buffer=self.CHUNK)
+        candidates = [("dispositivo seleccionado", dict(requested, input_device_index=device_index))]
+        emergency_device = device_index
+        if self.allow_default_device_fallback:
+            # Intentar con dispositivo por defecto
+            candidates.append(("dispositivo por defecto", requested))
+            emergency_device = None
+        # Último intento con configuración mínima
+        candidates.append(("configuración de emergencia", dict(format=pyaudio.paInt16, channels=1, rate=44100,
+                                                               frames_per_buffer=1024, input_device_index=emergency_device)))
+        key = (fingerprint or device_index, self.FORMAT, self.CHANNELS, self.RATE, self.CHUNK)
+        
+        stream, name, params = self.backend.open_input(key, candidates, self.open_capture_stream)
+        if name != candidates[0][0]:
+            print(f"Usando {name}")
+        # Actualizar configuración actual (cambia con la configuración de emergencia)
+        self.FORMAT = params['format']
+        self.CHANNELS = params['channels']
+        self.RATE = params['rate']
+        self.CHUNK = params['frames_per_buffer']
+        return stream
+            
+    def open_capture_stream(self, format, channels, rate, frames_per_buffer, input_device_index=None):
+        """Abre un stream de entrada del origen de audio configurado"""
+        return self.audio_source.open(pyaudio.get_sample_size(format), channels, rate, frames_per_buffer,
+                                      input_device_index=input_device_index,
+                                      reserve_seconds=self.capture_segment_seconds() * (self.WRITER_QUEUE_SEGMENTS + 2))
+            
+    def close_input_stream(self):
+        """Cierra el stream de entrada continuo si está abierto"""
+        stream = self.stream
+        self.stream = None
+        if stream is None:
+            return
+        # Conservar los contadores del stream (solo existen en los streams de captura propios)
+        self.closed_overflows += getattr(stream, 'input_overflows', 0)
+        self.closed_dropped_blocks += getattr(stream, 'dropped_blocks', 0)
+        self.stream_dropped_seen = 0
+        self.capture_gaps = []  # Las posiciones del buffer de un stream nuevo empiezan de cero
+        try:
+            stream.stop_stream()
+            stream.close()
+        except Exception as e:
+            print(f"Error cerrando stream de audio: {e}")
+        
+    def capture_segment_seconds(self):
+        """Duración máxima de audio que ocupa un tramo en el buffer circular"""
+        if self.config_trigger_enabled:
+            return self.config_max_segment_seconds + self.config_pre_roll_seconds
+        return self.record_duration
+        
+    def ensure_sample_ring(self, record_seconds):
+        """Devuelve el buffer circular, recreándolo solo si cambia el formato o no cabe un tramo"""
+        sample_width = pyaudio.get_sample_size(self.FORMAT)
+        frame_bytes = sample_width * self.CHANNELS
+        segment_bytes = int(self.RATE * record_seconds) * frame_bytes
+        segments = self.WRITER_QUEUE_SEGMENTS + 2
+        
+        shared = getattr(self.stream, 'ring', None)
+        if shared is not None:
+            # Captura en proceso aparte: el buffer es el compartido, donde ya escribe el proceso hijo
+            if shared.reserve_bytes >= segment_bytes * segments:
+                return shared
+            # La duración del tramo ha crecido: se reabre la captura con un buffer mayor
+            print("El tramo no cabe en el buffer compartido, reiniciando la captura")
+            self.close_input_stream()
+            self.stream = self.open_input_stream()
+            return self.stream.ring
+        
+        # Además del tramo en curso caben los encolados y el que se está escribiendo,
+        # para que el buffer no sobrescriba audio que el escritor aún no ha guardado.
+        # Se comprueba al empezar cada tramo: si su duración crece, los pendientes se
+        # quedan con sus vistas sobre el buffer anterior. Un bloque de margen cubre el
+        # último bloque de un evento, que puede pasar de la duración máxima
+        ring = self.sample_ring
+        if (ring is None or ring.frame_bytes != frame_bytes
+                or ring.segment_bytes < segment_bytes + self.CHUNK * frame_bytes):
+            ring = SampleRing.for_segment(self.RATE, self.CHANNELS, sample_width, record_seconds,
+                                          segments=segments, extra_frames=self.CHUNK)
+            self.sample_ring = ring
+            self.capture_gaps = []
+            print(f"Buffer circular de {ring.capacity} bytes preparado")
+        return ring
+        
+    def record_audio_chunk(self, segment_file=None):
+        """Graba un tramo de audio de duración configurable sobre el stream continuo
+        
+        Si se indica segment_file, las muestras se escriben directamente en ese
+        archivo temporal en lugar de acumularse en memoria.
+        """
+        try:
+            # Reiniciar el estado del tramo actual
+            self.current_max_volume = -60.0
+            self.segment_channel_max_db = None
+            self.segment_dropped_frames = 0
+            
+            # El stream se abre una sola vez y se mantiene entre tramos, de modo que
+            # no se pierde audio entre el final de un tramo y el inicio del siguiente
+            if self.stream is None:
+                self.stream = self.open_input_stream()
+            stream = self.stream
+            
+            # La apertura del stream puede haber recurrido a la configuración de emergencia
+            if segment_file is not None:
+                segment_file.set_format(pyaudio.get_sample_size(self.FORMAT), self.CHANNELS, self.RATE)
+            
+            max_volume_db = -60
+            record_seconds = self.record_duration
+            total_seconds = int(record_seconds)
+            
+            # El límite del tramo se corta por número de muestras, no por tiempo de reloj;
+            # el audio perdido cuenta como tiempo transcurrido del tramo
+            frames_needed = int(self.RATE * record_seconds)
+            frames_read = 0
+            frame_bytes = pyaudio.get_sample_size(self.FORMAT) * self.CHANNELS
+            segment_gaps = []  # (offset en el tramo, bytes de silencio) para el relleno
+            
+            # Las muestras se copian al buffer circular en lugar de acumular una lista de bloques
+            ring = None
+            if segment_file is None:
+                ring = self.ensure_sample_ring(record_seconds)
+                stream = self.stream  # Puede haberse reabierto con un buffer compartido mayor
+                segment_start = ring.write_pos
+            
+            while frames_read < frames_needed and self.is_recording:
+                # El último bloque se recorta para que el tramo termine en la muestra exacta
+                to_read = min(self.CHUNK, frames_needed - frames_read)
+                frames_read += to_read
+                
+                data = None
+                try:
+                    data = stream.read(to_read, exception_on_overflow=False)
+                    chunk_started = time.perf_counter()
+                    # Audio que la captura perdió justo antes de este bloque
+                    lost = self.take_dropped_frames(stream)
+                    gap_bytes = min(lost, frames_needed) * frame_bytes
+                    if segment_file is not None:
+                        if lost and self.config_zero_fill_drops:
+                            segment_file.write(bytes(gap_bytes))
+                        segment_file.write(data)
+                    else:
+                        ring.write(data)
+                        if lost:
+                            segment_gaps.append((ring.write_pos - len(data) - segment_start, gap_bytes))
+                    if lost:
+                        self.segment_dropped_frames += lost
+                        frames_read += lost
+                    
+                    # Calcular volumen actual (canal más fuerte y cada canal)
+                    current_db = self.calculate_db(data)
+                    self.update_channel_levels()
+                    max_volume_db = max(max_volume_db, current_db)
+                    
+                    # Publicar el estado para la interfaz; refresh_ui lo pinta a intervalo fijo
+                    self.current_max_volume = max_volume_db
+                    self.display_peak_db = max(self.display_peak_db, current_db)
+                    self.segment_elapsed_seconds = int(frames_read / self.RATE)
+                    self.segment_total_seconds = total_seconds
+                    self.record_chunk_metrics(stream, to_read, time.perf_counter() - chunk_started)
+                    if self.profiler is not None:
+                        self.profiler.check()
+                    self.consecutive_read_errors = 0
+                    
+                except EOFError:
+                    # El origen (un WAV sin repetición) se ha agotado: se cierra el tramo
+                    self.set_status("Fin del audio de origen")
+                    self.source_finished = True
+                    self.is_recording = False
+                    if frames_read == to_read:
+                        # No se llegó a leer nada de este tramo
+                        return None, max_volume_db
+                    break
+                except Exception as e:
+                    print(f"Error leyendo datos de audio: {e}")
+                    self.metrics.increment('read_errors')
+                    if data is None:
+                        # El bloque no se leyó: su audio falta en el tramo
+                        self.metrics.increment('frames_dropped', to_read)
+                        self.segment_dropped_frames += to_read
+                        if segment_file is not None:
+                            if self.config_zero_fill_drops:
+                                segment_file.write(bytes(to_read * frame_bytes))
+                        else:
+                            segment_gaps.append((ring.write_pos - segment_start, to_read * frame_bytes))
+                    # Un dispositivo desconectado falla en cada lectura: se da por perdido
+                    # y el error llega a recording_loop, que detiene la grabación. La cuenta
+                    # sigue de un tramo al siguiente: un tramo corto tiene pocos bloques
+                    self.consecutive_read_errors += 1
+                    if self.consecutive_read_errors >= self.MAX_CONSECUTIVE_READ_ERRORS:
+                        self.consecutive_read_errors = 0
+                        raise
+                    time.sleep(self.READ_ERROR_BACKOFF_SECONDS)
+                    continue
+            
+            # El tramo se devuelve como vistas sobre el buffer, sin copiar las muestras
+            frames = ring.views(segment_start) if ring is not None else []
+            if segment_gaps and self.config_zero_fill_drops:
+                frames = insert_silence(frames, segment_gaps)
+            return frames, max_volume_db
+            
+        except Exception as e:
+            print(f"Error en record_audio_chunk: {e}")
+            self.close_input_stream()
+            self.notify("Error de Grabación", 
+                        f"Error durante la grabación: {str(e)}\n\n"
+                        "Sugerencias:\n"
+                        "• Verificar que el micrófono esté conectado\n"
+                        "• Probar con configuración más simple (16-bit, Mono, 44.1kHz)\n"
+                        "• Seleccionar otro dispositivo de audio",
+                        "error")
+            return None, -60
+            
+    def record_triggered_segment(self):
+        """Captura hasta que un evento por umbral se abre y se cierra (pre-roll y hangover)
+        
+        Devuelve (frames, max_db, timestamp). frames es una lista vacía si se detuvo
+        la grabación sin ningún evento y None si hubo un error.
+        """
+        try:
+            if self.stream is None:
+                self.stream = self.open_input_stream()
+            stream = self.stream
+            
+            # El buffer debe poder contener el pre-roll más un tramo de duración máxima
+            ring = self.ensure_sample_ring(self.config_max_segment_seconds + self.config_pre_roll_seconds)
+            stream = self.stream  # Puede haberse reabierto con un buffer compartido mayor
+            segmenter = self.trigger_segmenter
+            if (segmenter is None or segmenter.frame_bytes != ring.frame_bytes
+                    or segmenter.rate != self.RATE or segmenter.last_end > ring.write_pos):
+                segmenter = TriggerSegmenter(ring.frame_bytes, self.RATE,
+                                             pre_roll_seconds=self.config_pre_roll_seconds,
+                                             hangover_seconds=self.config_hangover_seconds,
+                                             max_seconds=self.config_max_segment_seconds)
+                segmenter.last_end = ring.write_pos
+                self.trigger_segmenter = segmenter
+            
+            self.set_status("Esperando evento...")
+            self.segment_channel_max_db = None
+            self.segment_dropped_frames = 0
+            max_gap_bytes = int(self.RATE * self.config_max_segment_seconds) * ring.frame_bytes
+            self.segment_total_seconds = int(self.config_max_segment_seconds)
+            
+            consecutive_errors = 0
+            bounds = None
+            while self.is_recording and bounds is None:
+                # Con el buffer compartido la lectura ya avanza la posición del buffer
+                chunk_start = ring.write_pos
+                try:
+                    data = stream.read(self.CHUNK, exception_on_overflow=False)
+                    chunk_started = time.perf_counter()
+                    lost = self.take_dropped_frames(stream)
+                    if lost:
+                        self.add_capture_gap(ring, chunk_start, lost, max_gap_bytes)
+                    consecutive_errors = 0
+                except EOFError:
+                    self.set_status("Fin del audio de origen")
+                    self.source_finished = True
+                    self.is_recording = False
+                    break
+                except Exception as e:
+                    print(f"Error leyendo datos de audio: {e}")
+                    self.metrics.increment('read_errors')
+                    self.metrics.increment('frames_dropped', self.CHUNK)
+                    self.add_capture_gap(ring, ring.write_pos, self.CHUNK, max_gap_bytes)
+                    consecutive_errors += 1
+                    if consecutive_errors >= self.MAX_CONSECUTIVE_READ_ERRORS:
+                        raise
+                    time.sleep(self.READ_ERROR_BACKOFF_SECONDS)
+                    continue
+                    
+                ring.write(data)
+                current_db = self.calculate_db(data)
+                channel_db = self.update_channel_levels()
+                bounds = segmenter.process(chunk_start, ring.write_pos, current_db,
+                                           self.passes_threshold(current_db, channel_db), ring.oldest_pos)
+                
+                # Publicar el estado para la interfaz
+                self.display_peak_db = max(self.display_peak_db, current_db)
+                if segmenter.is_open:
+                    self.current_max_volume = segmenter.max_db
+                    self.segment_elapsed_seconds = int(segmenter.seconds(ring.write_pos - segmenter.start))
+                elif bounds is None:
+                    self.current_max_volume = current_db
+                    self.segment_elapsed_seconds = 0
+                self.record_chunk_metrics(stream, self.CHUNK, time.perf_counter() - chunk_started)
+                if self.profiler is not None:
+                    self.profiler.check()
+            
+            # Al detener con un evento abierto se conserva lo grabado hasta ahora
+            if bounds is None and segmenter.is_open:
+                bounds = segmenter.close(ring.write_pos)
+            if bounds is None:
+                return [], -60, None
+                
+            start, end = bounds
+            # Marca de tiempo del inicio real del tramo, pre-roll incluido
+            timestamp = self.capture_time() - timedelta(seconds=segmenter.seconds(ring.write_pos - start))
+            frames = ring.views(start, end)
+            gaps = [(position - start, nbytes, lost) for position, nbytes, lost in self.capture_gaps
+                    if start <= position < end]
+            self.segment_dropped_frames = sum(lost for position, nbytes, lost in gaps)
+            if gaps and self.config_zero_fill_drops:
+                frames = insert_silence(frames, [(offset, nbytes) for offset, nbytes, lost in gaps])
+            return frames, segmenter.max_db, timestamp
+            
+        except Exception as e:
+            print(f"Error en record_triggered_segment: {e}")
+            self.close_input_stream()
+            self.notify("Error de Grabación", f"Error durante la grabación: {str(e)}", "error")
+            return None, -60, None
+            
+    def take_dropped_frames(self, stream):
+        """Frames que la captura perdió desde la consulta anterior, justo antes del último bloque leído"""
+        dropped = getattr(stream, 'dropped_frames', 0)
+        lost = dropped - self.stream_dropped_seen
+        self.stream_dropped_seen = dropped
+        if lost <= 0:
+            return 0
+        self.metrics.increment('frames_dropped', lost)
+        return lost
+        
+    def add_capture_gap(self, ring, position, lost, max_bytes):
+        """Anota un hueco en la posición del buffer donde falta audio (modo por eventos)"""
+        oldest = ring.oldest_pos
+        self.capture_gaps = [gap for gap in self.capture_gaps if gap[0] >= oldest]
+        self.capture_gaps.append((position, min(lost * ring.frame_bytes, max_bytes), lost))
+        
+    def record_chunk_metrics(self, stream, num_frames, processing_seconds):
+        """Anota un bloque leído: tiempo de análisis y audio pendiente de leer en la captura"""
+        self.chunks_read_count += 1
+        self.frames_read_count += num_frames
+        self.chunk_processing_histogram.observe(processing_seconds * 1000.0)
+        self.capture_backlog = self.capture_backlog_frames(stream)
+            
+    def capture_backlog_frames(self, stream):
+        """Frames ya capturados que aún no se han leído, o None si el stream no lo indica
+        
+        Si crece de forma sostenida, el análisis va por detrás del tiempo real.
+        """
+        backlog = getattr(stream, 'backlog_frames', None)  # Modos callback y process
+        if backlog is None and hasattr(stream, 'get_read_available'):
+            try:
+                backlog = stream.get_read_available()  # Stream bloqueante de PyAudio
+            except Exception:
+                backlog = None
+        return backlog
+        
+    def collect_metrics(self):
+        """Actualiza las métricas que se leen al publicar: colas, desbordamientos y carga"""
+        for recorder in [self] + self.device_pipelines:
+            recorder.collect_capture_metrics()
+        writer_metrics = self.metrics_registry.scope('writer')
+        writer = self.segment_writer
+        if writer is not None:
+            writer_metrics.set('queue_depth', writer.pending)
+            writer_metrics.set('queue_capacity', writer.max_pending)
+            writer_metrics.set('segments_written', writer.segments_written)
+            writer_metrics.set('write_errors', writer.write_errors)
+            writer_metrics.set('backpressure_events', writer.backpressure_count)
+            writer_metrics.set('dropped_segments', writer.dropped_count)
+        encoder = self.encoder
+        if encoder is not None:
+            writer_metrics.set('encode_queue_depth', encoder.pending)
+            writer_metrics.set('encoded', encoder.encoded_count)
+            writer_metrics.set('encode_errors', encoder.failed_count)
+            
+    def collect_capture_metrics(self):
+        """Publica las métricas de la captura de este grabador, también las que se cuentan por bloque"""
+        metrics = self.metrics
+        stream = self.stream
+        metrics.set('recording', self.is_recording)
+        metrics.set('input_overflows', self.closed_overflows + getattr(stream, 'input_overflows', 0))
+        metrics.set('dropped_blocks', self.closed_dropped_blocks + getattr(stream, 'dropped_blocks', 0))
+        metrics.set('input_underflows', getattr(stream, 'input_underflows', 0))
+        metrics.set('segments_saved', self.recordings_saved_count)
+        metrics.set_counter('chunks_read', self.chunks_read_count)
+        metrics.set_counter('frames_read', self.frames_read_count)
+        # El hilo de captura sigue observando: se publica una copia coherente
+        histogram = self.chunk_processing_histogram.copy()
+        metrics.set_histogram('chunk_processing_ms', histogram)
+        backlog = self.capture_backlog
+        if backlog is not None:
+            metrics.set('capture_backlog_seconds', round(backlog / self.RATE, 3))
+        # Tiempo de análisis por segundo de audio: por encima de 1 no se sigue el tiempo real
+        audio_seconds = self.frames_read_count / self.RATE
+        metrics.set('audio_seconds', round(audio_seconds, 3))
+        if audio_seconds > 0:
+            metrics.set('realtime_load', round(histogram.total / 1000.0 / audio_seconds, 4))
+            
+    def write_queued_segment(self, segment):
+        """Guarda un tramo con el grabador que lo capturó; se ejecuta en el hilo escritor"""
+        (segment.source or self).write_segment(segment)
+        
+    def write_segment(self, segment):
+        """Guarda un tramo encolado; se ejecuta en el hilo escritor"""
+        started = time.perf_counter()
+        if self.retention is not None:
+            # Hacer sitio antes de escribir, en lugar de fallar con el disco lleno
+            self.retention.make_room(segment.nbytes)
+        if segment.partial_file is not None:
+            filepath = self.save_streamed_recording(segment.partial_file, segment.timestamp)
+        else:
+            filepath = self.save_recording(segment.frames, segment.timestamp,
+                                           sample_width=segment.sample_width,
+                                           channels=segment.channels,
+                                           framerate=segment.rate)
+        if filepath and segment.dropped_frames:
+            # Constancia en el propio archivo de que falta audio (o de que se rellenó)
+            try:
+                append_wav_comment(filepath, f"dropped_frames={segment.dropped_frames} "
+                                             f"zero_filled={'yes' if segment.zero_filled else 'no'}")
+            except OSError as e:
+                print(f"No se pudo anotar el audio perdido en {filepath}: {e}")
+        self.metrics.observe('write_latency_ms', (time.perf_counter() - started) * 1000.0)
+        if filepath:
+            self.metrics.increment('bytes_written', os.path.getsize(filepath))
+        else:
+            self.metrics.increment('write_errors')
+        if filepath and self.catalog is not None:
+            self.catalog.add(self.catalog_record(segment, filepath))
+        if filepath and self.retention is not None:
+            # Mientras se codifica no se puede borrar: la retención lo cuenta al terminar
+            self.retention.add(filepath, os.path.getsize(filepath), segment.timestamp.timestamp(),
+                               segment.max_db, hold=self.encoder is not None)
+        # La compresión se hace en el pool de codificación, sin bloquear al escritor
+        if filepath and self.encoder is not None:
+            self.encoder.submit(filepath)
+        
+    def catalog_record(self, segment, filepath):
+        """Fila del catálogo de un tramo recién guardado; se ejecuta en el hilo escritor"""
+        if segment.partial_file is None:
+            # Nivel medio sobre las vistas del tramo, que aún están en memoria. Se mide
+            # por ventanas, como audio_triage, para no decodificar el tramo entero de una
+            # vez; el máximo ya lo midió la captura (segment.max_db)
+            window = self.CHUNK * segment.sample_width * segment.channels * WINDOW_CHUNKS
+            total = 0.0
+            count = 0
+            for frame in segment.frames:
+                frame = memoryview(frame).cast('B')
+                for start in range(0, len(frame), window):
+                    _, window_total, window_count = chunk_power_stats(frame[start:start + window],
+                                                                      segment.sample_width,
+                                                                      segment.channels, self.CHUNK)
+                    total += window_total
+                    count += window_count
+            mean_db = round(power_to_db(total / count if count else 0.0), 2)
+        else:
+            mean_db = analyze_wav(filepath, self.CHUNK)['mean_db']
+        return {
+            'path': os.path.abspath(filepath),
+            'start_time': format_time(segment.timestamp),
+            'duration_seconds': round(segment.nbytes / (segment.sample_width * segment.channels) / segment.rate, 3),
+            'format': 'wav',
+            'sample_rate': segment.rate,
+            'channels': segment.channels,
+            'bits': segment.sample_width * 8,
+            'max_db': round(segment.max_db, 2) if segment.max_db is not None else None,
+            'mean_db': mean_db,
+            'dropped_frames': segment.dropped_frames,
+            'size_bytes': os.path.getsize(filepath),
+            'device': self.selected_device_name or None,
+        }
+        
+    def on_recording_encoded(self, wav_path, output_path):
+        """Se llama desde el pool de codificación al sustituir un WAV por su versión comprimida"""
+        size = os.path.getsize(output_path)
+        if self.catalog is not None:
+            self.catalog.rename(wav_path, output_path, self.config_output_format, size)
+        if self.retention is not None:
+            self.retention.rename(wav_path, output_path, size)
+        
+    def on_recording_encode_failed(self, wav_path):
+        """Se llama desde el pool de codificación si un WAV no se pudo comprimir y se conserva"""
+        if self.retention is not None:
+            self.retention.release(wav_path)
+        
+    def recording_path(self, timestamp):
+        """Ruta del archivo de una grabación según el formato de nombre de config.ini"""
+        if hasattr(self, 'config_filename_format'):
+            filename = timestamp.strftime(self.config_filename_format)
+        else:
+            filename = f"grabacion_{timestamp.strftime('%Y%m%d_%H%M%S')}.wav"
+        return os.path.join(self.output_dir, filename)
+        
+    def open_segment_file(self):
+        """Crea el WAV temporal de un tramo en modo de escritura directa"""
+        return StreamingWavWriter(self.output_dir,
+                                  sample_width=pyaudio.get_sample_size(self.FORMAT),
+                                  channels=self.CHANNELS,
+                                  rate=self.RATE)
+        
+    def save_streamed_recording(self, segment_file, timestamp):
+        """Mueve un tramo ya escrito en disco a su nombre definitivo"""
+        try:
+            filepath = segment_file.commit(self.recording_path(timestamp))
+            if os.path.getsize(filepath) > 44:  # 44 bytes = header WAV mínimo
+                self.recordings_saved_count += 1
+                print(f"Grabación guardada exitosamente: {filepath}")
+                print(f"Tamaño del archivo: {os.path.getsize(filepath)} bytes")
+                return filepath
+            else:
+                print(f"Error: El archivo no se creó correctamente o está vacío")
+        except Exception as e:
+            error_msg = f"Error al guardar la grabación: {str(e)}"
+            print(error_msg)
+            segment_file.discard()
+            self.notify("Error de Guardado", error_msg, "error")
+        
+    def save_recording(self, frames, timestamp=None, sample_width=None, channels=None, framerate=None):
+        """Guarda la grabación en un archivo WAV con validación robusta"""
+        try:
+            # Generar nombre de archivo usando el formato de config.ini
+            if timestamp is None:
+                timestamp = datetime.now()
+            
+            filepath = self.recording_path(timestamp)
+            # Validar que tenemos frames para guardar
+            if not frames or len(frames) == 0:
+                print("No hay datos de audio para guardar")
+                return
+                
+            # Formato con el que se capturó el tramo (por defecto, el actual)
+            if sample_width is None:
+                sample_width = pyaudio.get_sample_size(self.FORMAT)
+            if channels is None:
+                channels = self.CHANNELS
+            if framerate is None:
+                framerate = self.RATE
+            
+            print(f"Guardando audio: {channels} canales, {framerate}Hz, {sample_width} bytes por muestra")
+            
+            # Crear archivo WAV
+            wf = wave.open(filepath, 'wb')
+            wf.setnchannels(channels)
+            wf.setsampwidth(sample_width)
+            wf.setframerate(framerate)
+            
+            # Validar que tenemos datos
+            if sum(len(frame) for frame in frames) == 0:
+                print("Datos de audio vacíos")
+                wf.close()
+                return
+            
+            # Escribir datos directamente desde las vistas del buffer, sin concatenar
+            for frame in frames:
+                wf.writeframes(frame)
+            wf.close()
+            
+            # Verificar que el archivo se creó correctamente
+            if os.path.exists(filepath) and os.path.getsize(filepath) > 44:  # 44 bytes = header WAV mínimo
+                self.recordings_saved_count += 1
+                print(f"Grabación guardada exitosamente: {filepath}")
+                print(f"Tamaño del archivo: {os.path.getsize(filepath)} bytes")
+                return filepath
+            else:
+                print(f"Error: El archivo no se creó correctamente o está vacío")
+                
+        except Exception as e:
+            error_msg = f"Error al guardar la grabación: {str(e)}"
+            print(error_msg)
+            self.notify("Error de Guardado", error_msg, "error")
+            
+            if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+                # Con el disco lleno la configuración básica también fallaría: quitar lo escrito
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
+                self.metrics.increment('disk_full_errors')
+                return
+            
+            # Intentar crear un archivo de prueba con configuración básica
+            try:
+                print("Intentando guardar con configuración básica...")
+                wf = wave.open(filepath, 'wb')
+                wf.setnchannels(1)  # Mono
+                wf.setsampwidth(2)  # 16-bit = 2 bytes
+                wf.setframerate(44100)  # 44.1 kHz
+                
+                # Si los frames están en formato diferente, intentar convertir
+                if frames:
+                    for frame in frames:
+                        wf.writeframes(frame)
+                
+                wf.close()
+                print("Archivo guardado con configuración básica")
+                
+            except Exception as e2:
+                print(f"Error también con configuración básica: {e2}")
+                critical_msg = (f"No se pudo guardar el archivo de audio.\n"
+                                 f"Error original: {str(e)}\n"
+                                 f"Error de respaldo: {str(e2)}")
+                self.notify("Error Crítico", critical_msg, "error")
+            
+    def recording_loop(self):
+        """Bucle principal de grabación"""
+        try:
+            while self.is_recording:
+                if self.config_trigger_enabled:
+                    # Modo por eventos: todo tramo devuelto ya ha superado el umbral
+                    frames, max_volume, timestamp = self.record_triggered_segment()
+                    if frames is None:
+                        break
+                    if frames:
+                        self.submit_segment(frames, timestamp, max_volume)
+                    continue
+                    
+                timestamp = self.capture_time()  # Pasar objeto datetime completo
+                
+                # Grabar con duración configurable
+                duration = self.record_duration
+                self.set_status(f"Grabando ({duration:.0f}s)...")
+                # En modo de escritura directa el tramo va a un WAV temporal mientras se graba
+                segment_file = None
+                if self.config_streaming_write:
+                    try:
+                        segment_file = self.open_segment_file()
+                    except Exception as e:
+                        print(f"No se pudo crear el archivo temporal, grabando en memoria: {e}")
+                frames, max_volume = self.record_audio_chunk(segment_file)
+                
+                if frames is None:
+                    if segment_file is not None:
+                        segment_file.discard()
+                    break
+                    
+                # Verificar si el volumen superó el umbral (por canal según THRESHOLD_POLICY)
+                if self.passes_threshold(max_volume, self.segment_channel_max_db):
+                    self.submit_segment(frames, timestamp, max_volume, segment_file)
+                else:
+                    # Descartar la grabación
+                    if segment_file is not None:
+                        segment_file.discard()
+                    self.recordings_deleted_count += 1
+                    self.metrics.increment('segments_discarded')
+                    self.report_segment_drops()
+                    self.status_text = f"Grabación descartada (Vol: {max_volume:.1f} dB)"
+                    self.on_segment_result(False, max_volume)
+                    
+                # El siguiente tramo empieza inmediatamente sobre el mismo stream; el
+                # resultado se mantiene visible sin detener la captura
+        finally:
+            # Soltar las vistas del último tramo antes de liberar el buffer compartido
+            frames = None
+            self.close_input_stream()
+            
+    def report_segment_drops(self):
+        """Avisa si el tramo recién decidido ha perdido audio"""
+        if not self.segment_dropped_frames:
+            return
+        self.metrics.increment('segments_with_drops')
+        action = "rellenados con silencio" if self.config_zero_fill_drops else "sin rellenar"
+        print(f"Aviso: el tramo ha perdido {self.segment_dropped_frames} frames "
+              f"({self.segment_dropped_frames / self.RATE:.3f} s, {action})")
+        
+    def submit_segment(self, frames, timestamp, max_volume, segment_file=None):
+        """Entrega un tramo que se conserva al hilo escritor y sigue capturando"""
+        segment = Segment(frames, timestamp,
+                          sample_width=pyaudio.get_sample_size(self.FORMAT),
+                          channels=self.CHANNELS,
+                          rate=self.RATE,
+                          max_db=max_volume,
+                          partial_file=segment_file,
+                          source=self,
+                          dropped_frames=self.segment_dropped_frames,
+                          zero_filled=self.config_zero_fill_drops)
+        self.metrics.increment('segments_kept')
+        self.report_segment_drops()
+        if not self.segment_writer.submit(segment):
+            # El escritor no tuvo hueco a tiempo: el tramo se pierde en lugar de detener la captura
+            self.recordings_deleted_count += 1
+            self.metrics.increment('segments_dropped')
+            self.status_text = f"Grabación descartada: el guardado va por detrás (Vol: {max_volume:.1f} dB)"
+            self.on_segment_result(False, max_volume)
+            return
+        self.status_text = f"Grabación guardada (Vol: {max_volume:.1f} dB)"
+        self.on_segment_result(True, max_volume)
+        
+    def start_recording(self, instance=None):
+        """Inicia la grabación en bucle en un hilo propio (uno por dispositivo en modo multidispositivo)"""
+        # PyAudio ya está inicializado desde la enumeración de dispositivos
+        self.audio = self.backend.audio
+        if self.segment_writer is None:
+            self.segment_writer = SegmentWriter(self.write_queued_segment, max_pending=self.WRITER_QUEUE_SEGMENTS,
+                                                submit_timeout=self.WRITER_SUBMIT_TIMEOUT_SECONDS)
+        if self.encoder is None and self.config_output_format != 'wav':
+            self.encoder = RecordingEncoder(self.config_output_format, on_encoded=self.on_recording_encoded,
+                                            on_failed=self.on_recording_encode_failed)
+        if self.metrics_exporter is None:
+            self.metrics_exporter = self.create_metrics_exporter()
+        if self.catalog is None and self.config_catalog_file:
+            self.catalog = self.open_catalog()
+        if self.retention is None and (self.config_retention_max_size_mb or self.config_retention_max_age_days
+                                       or self.config_retention_min_free_mb):
+            self.retention = self.create_retention_manager()
+        if self.config_profiling_enabled and self.profiler is None:
+            self.profiler = RecordingProfiler(self.output_dir, mode=self.config_profiling_mode,
+                                              seconds=self.config_profiling_seconds,
+                                              interval=self.config_profiling_interval_ms / 1000.0,
+                                              on_written=self.on_profile_written).start()
+        self.is_recording = True
+        self.trigger_segmenter = None
+        self.segment_elapsed_seconds = 0
+        self.segment_total_seconds = int(self.record_duration)
+        
+        self.device_pipelines = []
+        if self.config_multi_device_enabled:
+            self.device_pipelines = self.create_device_pipelines()
+            if self.device_pipelines:
+                for pipeline in self.device_pipelines:
+                    pipeline.start_capture()
+                self.set_status(f"Grabando {len(self.device_pipelines)} dispositivos...")
+                return
+            print("Ningún dispositivo de MULTI_DEVICE está disponible, grabando solo el seleccionado")
+        
+        # Iniciar el hilo de grabación
+        target = self.recording_loop if self.profiler is None else self.profiler.profile_thread(self.recording_loop)
+        self.recording_thread = threading.Thread(target=target, daemon=True)
+        self.recording_thread.start()
+        
+    def on_profile_written(self, paths):
+        """Se llama desde el hilo del perfilador al escribir los resultados"""
+        self.notify("Perfil guardado", "\n".join(paths), "info")
+        
+    def create_metrics_exporter(self):
+        """Publica las métricas según [METRICS]; None si no hay archivo ni puerto configurados"""
+        if not self.config_metrics_file and not self.config_metrics_http_port:
+            return None
+        metrics_path = None
+        if self.config_metrics_file:
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            metrics_path = os.path.join(config_dir, self.config_metrics_file)
+        try:
+            return MetricsExporter(self.metrics_registry, metrics_path,
+                                   interval=self.config_metrics_interval,
+                                   http_host=self.config_metrics_http_host,
+                                   http_port=self.config_metrics_http_port)
+        except OSError as e:
+            print(f"No se pudo iniciar el servidor de métricas: {e}")
+            return None
+        
+    def open_catalog(self):
+        """Abre el catálogo de [CATALOG]; None si no se puede abrir"""
+        config_dir = os.path.dirname(os.path.abspath(self.config_file))
+        catalog_path = os.path.join(config_dir, self.config_catalog_file)
+        try:
+            return RecordingCatalog(catalog_path, commit_interval=self.config_catalog_commit_interval)
+        except sqlite3.Error as e:
+            print(f"No se pudo abrir el catálogo {catalog_path}: {e}")
+            return None
+        
+    def create_retention_manager(self):
+        """Aplica los límites de [RETENTION] al directorio de salida"""
+        load_levels = None
+        if self.catalog is not None:
+            # Nivel de las grabaciones ya catalogadas, para la política quietest
+            load_levels = functools.partial(recording_levels, self.catalog.path)
+        return RetentionManager(self.output_dir,
+                                max_bytes=int(self.config_retention_max_size_mb * 1e6),
+                                max_age_seconds=self.config_retention_max_age_days * 86400,
+                                min_free_bytes=int(self.config_retention_min_free_mb * 1e6),
+                                policy=self.config_retention_policy,
+                                check_interval=self.config_retention_check_interval,
+                                chunk_frames=self.CHUNK,
+                                load_levels=load_levels,
+                                on_evicted=self.on_recording_evicted,
+                                metrics=self.metrics_registry.scope('retention'))
+        
+    def on_recording_evicted(self, path):
+        """Se llama desde la retención al borrar una grabación"""
+        if self.catalog is not None:
+            self.catalog.remove(path)
+        
+    def create_device_pipelines(self):
+        """Crea una captura por cada dispositivo de MULTI_DEVICE que esté disponible"""
+        pipelines = []
+        used = set()
+        for position, wanted in enumerate(self.config_multi_devices):
+            device = None
+            for candidate in self.audio_devices:
+                if candidate['index'] is None or candidate['index'] in used:
+                    continue
+                if wanted.isdigit() and candidate['index'] == int(wanted):
+                    device = candidate
+                    break
+                if not wanted.isdigit() and wanted.lower() in candidate['name'].lower():
+                    device = candidate
+                    break
+            if device is None:
+                print(f"Dispositivo '{wanted}' no encontrado o ya en uso, se omite")
+                continue
+            used.add(device['index'])
+            
+            if position < len(self.config_multi_thresholds):
+                threshold = self.config_multi_thresholds[position]
+            else:
+                threshold = self.threshold_db
+            # Cada dispositivo guarda en su propio subdirectorio
+            subdir = re.sub(r'[^\w.-]+', '_', f"{device['index']}_{device['name']}").strip('_')
+            pipelines.append(DevicePipeline(self, device, threshold, os.path.join(self.output_dir, subdir)))
+        return pipelines
+        
+    def recording_alive(self):
+        """True mientras siga vivo algún hilo de captura"""
+        if self.device_pipelines:
+            return any(p.recording_thread is not None and p.recording_thread.is_alive()
+                       for p in self.device_pipelines)
+        return self.recording_thread is not None and self.recording_thread.is_alive()
+        
+    def capture_finished(self):
+        """True si la captura terminó porque el origen de audio se agotó, no por un error"""
+        if self.device_pipelines:
+            return all(pipeline.source_finished for pipeline in self.device_pipelines)
+        return self.source_finished
+        
+    def collect_device_levels(self):
+        """En modo multidispositivo, publica en el grabador principal el nivel más alto de todas las capturas"""
+        if not self.device_pipelines:
+            return
+        peak_db = -60.0
+        for pipeline in self.device_pipelines:
+            peak_db = max(peak_db, pipeline.display_peak_db)
+            pipeline.display_peak_db = -60.0
+        self.display_peak_db = max(self.display_peak_db, peak_db)
+        # Los picos por canal se concatenan en el orden de los dispositivos
+        channel_peaks = [pipeline.display_channel_peak_db for pipeline in self.device_pipelines]
+        for pipeline in self.device_pipelines:
+            pipeline.display_channel_peak_db = None
+        if all(peaks is not None for peaks in channel_peaks):
+            self.display_channel_peak_db = np.concatenate(channel_peaks)
+        self.current_max_volume = max(p.current_max_volume for p in self.device_pipelines)
+        self.segment_elapsed_seconds = max(p.segment_elapsed_seconds for p in self.device_pipelines)
+        self.segment_total_seconds = self.device_pipelines[0].segment_total_seconds
+        
+    def device_stats(self):
+        """Estadísticas de cada captura: tramos, uso de CPU y desbordamientos"""
+        return [pipeline.capture_stats() for pipeline in self.device_pipelines]
+        
+    def on_device_segment_result(self, pipeline, kept, max_volume):
+        """Se llama desde el hilo de una captura multidispositivo al decidir un tramo"""
+        self.on_segment_result(kept, max_volume)
+            
+    def stop_recording(self, instance=None):
+        """Detiene la grabación y espera a que se guarden los tramos pendientes"""
+        self.is_recording = False
+        self.status_text = "Detenido"
+        for pipeline in self.device_pipelines:
+            pipeline.is_recording = False
+        
+        # Esperar a que los hilos terminen el bloque en curso y cierren el stream
+        threads = [self.recording_thread] + [p.recording_thread for p in self.device_pipelines]
+        for thread in threads:
+            if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=self.STOP_TIMEOUT_SECONDS)
+        
+        # Cerrar la ventana de perfilado aunque no haya terminado
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+        
+        # Terminar de escribir los tramos que quedan en cola
+        if self.segment_writer is not None and self.segment_writer.pending:
+            print(f"Guardando {self.segment_writer.pending} tramos pendientes...")
+            self.segment_writer.flush()
+        
+        # PyAudio se mantiene inicializado para la siguiente grabación
+        self.audio = None
+            
+    def on_closing(self):
+        """Maneja el cierre de la aplicación y guarda la configuración"""
+        if self.is_recording:
+            self.stop_recording()
+        # Guardar configuración antes de cerrar
+        self.save_config(show_messages=False)
+        self.shutdown()
+        
+    def shutdown(self):
+        """Vacía el hilo escritor y el pool de codificación y libera PyAudio"""
+        # Vaciar la cola del hilo escritor antes de salir
+        if self.segment_writer is not None:
+            self.segment_writer.close()
+        
+        # Esperar a que terminen las codificaciones en curso
+        if self.encoder is not None:
+            self.encoder.shutdown(wait=True)
+        
+        # Detener la retención antes que el catálogo, que recibe los borrados
+        if self.retention is not None:
+            self.retention.close()
+            self.retention = None
+        
+        # Escribir las últimas filas del catálogo, ya con los nombres de los archivos codificados
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+        
+        # Última instantánea de las métricas, ya con todos los tramos escritos
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+            self.metrics_exporter = None
+        self.segment_writer = None
+        self.encoder = None
+        
+        # Detener los procesos de captura que sigan abiertos (CAPTURE_MODE = process)
+        for pipeline in self.device_pipelines:
+            pipeline.close_input_stream()
+        self.close_input_stream()
+        
+        # Cerrar el origen de audio y PyAudio
+        self.audio = None
+        self.audio_source.close()
+        self.backend.terminate()
+
+
+class DevicePipeline(RecorderCore):
+    """Captura de un dispositivo dentro de la grabación multidispositivo.
+    
+    Tiene su propio stream, buffer circular, medidor, umbral y subdirectorio
+    de salida. La configuración, el backend de PyAudio, el hilo escritor y el
+    pool de codificación son los del grabador principal (parent), al que se
+    reenvían los avisos y los contadores.
+    """
+    # Si el dispositivo falla no se recurre al de por defecto: lo grabaría otra captura
+    allow_default_device_fallback = False
+    
+    def __init__(self, parent, device, threshold_db, output_dir):
+        # No se llama a RecorderCore.__init__: la configuración ya está cargada en parent
+        for name, value in vars(parent).items():
+            if name.startswith('config_'):
+                setattr(self, name, value)
+        self.parent = parent
+        self.config_file = parent.config_file
+        self.CHUNK = parent.CHUNK
+        self.FORMAT = parent.FORMAT
+        self.CHANNELS = min(parent.CHANNELS, device['channels'])
+        self.RATE = parent.RATE
+        self.backend = parent.backend
+        self.audio_source = parent.audio_source
+        self.device_cache = parent.device_cache
+        self.segment_writer = parent.segment_writer
+        self.encoder = parent.encoder
+        self.device_pipelines = []
+        self.stats_lock = parent.stats_lock
+        self.metrics_registry = parent.metrics_registry
+        self.metrics = parent.metrics_registry.scope(device['display_name'])
+        self.profiler = parent.profiler
+        self.catalog = parent.catalog
+        self.retention = parent.retention
+        self.threshold_db = threshold_db
+        self.record_duration = parent.record_duration
+        self.init_capture_state()
+        
+        self.audio_devices = [device]
+        self.selected_device_name = device['display_name']
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        # Uso de CPU del hilo de captura
+        self.started_at = None
+        self.stopped_at = None
+        self.cpu_seconds = 0.0
+        self._cpu_start = 0.0
+        
+    def start_capture(self):
+        self.audio = self.backend.audio
+        self.is_recording = True
+        target = self.recording_loop if self.profiler is None else self.profiler.profile_thread(self.recording_loop)
+        self.recording_thread = threading.Thread(target=target, daemon=True,
+                                                 name=f"Captura-{self.audio_devices[0]['index']}")
+        self.recording_thread.start()
+        
+    def recording_loop(self):
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+        # time.thread_time mide solo la CPU del hilo que lo llama
+        self._cpu_start = time.thread_time()
+        try:
+            super().recording_loop()
+        finally:
+            self.cpu_seconds = time.thread_time() - self._cpu_start
+            self.stopped_at = time.monotonic()
+        
+    def capture_stats(self):
+        """Estadísticas de esta captura; los bloques descartados solo existen en modos callback y process"""
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.stopped_at or time.monotonic()) - self.started_at
+        stream = self.stream
+        overflows = self.closed_overflows + getattr(stream, 'input_overflows', 0)
+        dropped = None
+        if self.config_capture_mode in ('callback', 'process'):
+            dropped = self.closed_dropped_blocks + getattr(stream, 'dropped_blocks', 0)
+        return {
+            'device': self.selected_device_name,
+            'threshold_db': self.threshold_db,
+            'output_dir': self.output_dir,
+            'saved': self.recordings_saved_count,
+            'deleted': self.recordings_deleted_count,
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'cpu_percent': round(100.0 * self.cpu_seconds / elapsed, 1) if elapsed > 0 else 0.0,
+            'input_overflows': overflows,
+            'dropped_blocks': dropped,
+            'dropped_frames': self.metrics.counter('frames_dropped'),
+        }
+        
+    def notify(self, title, message, message_type="info"):
+        self.parent.notify(f"{title} ({self.audio_devices[0]['name']})", message, message_type)
+        
+    def on_segment_result(self, kept, max_volume):
+        # Se ejecuta en el hilo de captura: actualizar aquí su tiempo de CPU
+        self.cpu_seconds = time.thread_time() - self._cpu_start
+        if not kept:
+            with self.stats_lock:
+                self.parent.recordings_deleted_count += 1
+        self.parent.on_device_segment_result(self, kept, max_volume)
+        
+    def write_segment(self, segment):
+        saved_before = self.recordings_saved_count
+        super().write_segment(segment)
+        with self.stats_lock:
+            self.parent.recordings_saved_count += self.recordings_saved_count - saved_before